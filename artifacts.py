@@ -0,0 +1,221 @@
+"""
+Чтение сгенерированных наборов данных.
+
+Результаты хранятся в Parquet: число строк и схема читаются из метаданных,
+превью — из первой порции, а выгрузка идёт по порциям без загрузки всего
+файла в память. Старые результаты в pickle продолжают читаться.
+
+Страницы строк (read_rows) без фильтров читаются только из групп строк
+Parquet, в которые попадает диапазон. Фильтры и выбор колонок передаются
+в pyarrow.dataset: группы строк отсекаются по статистике, лишние колонки
+не читаются.
+"""
+
+import json
+import operator
+import re
+from collections.abc import Iterable, Iterator, Sequence
+from typing import Any
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+DEFAULT_BATCH_ROWS = 50_000
+# порция чтения страницы: строки до offset внутри группы пропускаются ею
+PAGE_BATCH_ROWS = 8192
+
+FILTER_OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">=": operator.ge,
+    "<=": operator.le,
+    ">": operator.gt,
+    "<": operator.lt,
+}
+_FILTER = re.compile(r"^(.+?)(==|!=|>=|<=|>|<)(.*)$")
+
+
+def is_parquet(path: str) -> bool:
+    return path.endswith(".parquet")
+
+
+def open_parquet(path: str) -> pq.ParquetFile:
+    return pq.ParquetFile(path, memory_map=True)
+
+
+def row_count(path: str) -> int:
+    if is_parquet(path):
+        return int(open_parquet(path).metadata.num_rows)
+    return len(pd.read_pickle(path))
+
+
+def schema(path: str) -> dict[str, str]:
+    """Имена колонок и их типы (в терминах Arrow для Parquet)."""
+    if is_parquet(path):
+        arrow_schema = open_parquet(path).schema_arrow
+        return {name: str(arrow_schema.field(name).type) for name in arrow_schema.names}
+    df = pd.read_pickle(path)
+    return {str(col): str(dtype) for col, dtype in df.dtypes.items()}
+
+
+def head(path: str, n: int = 5) -> pd.DataFrame:
+    if is_parquet(path):
+        batch = next(open_parquet(path).iter_batches(batch_size=n), None)
+        if batch is None:
+            return open_parquet(path).schema_arrow.empty_table().to_pandas()
+        return batch.to_pandas().head(n)
+    return pd.read_pickle(path).head(n)
+
+
+def iter_frames(
+    path: str, batch_rows: int = DEFAULT_BATCH_ROWS
+) -> Iterator[pd.DataFrame]:
+    """Порции набора данных как DataFrame. Пустой набор даёт одну пустую порцию."""
+    if is_parquet(path):
+        parquet = open_parquet(path)
+        empty = True
+        for batch in parquet.iter_batches(batch_size=batch_rows):
+            empty = False
+            yield batch.to_pandas()
+        if empty:
+            yield parquet.schema_arrow.empty_table().to_pandas()
+        return
+
+    df = pd.read_pickle(path)
+    if df.empty:
+        yield df
+    for start in range(0, len(df), batch_rows):
+        yield df.iloc[start : start + batch_rows]
+
+
+def load(path: str) -> pd.DataFrame:
+    if is_parquet(path):
+        return pd.read_parquet(path)
+    return pd.read_pickle(path)
+
+
+def _field(arrow_schema: pa.Schema, name: str) -> pa.Field:
+    if name not in arrow_schema.names:
+        raise ValueError(f"Нет колонки {name}")
+    return arrow_schema.field(name)
+
+
+def _columns(arrow_schema: pa.Schema, columns: Sequence[str] | None) -> list[str]:
+    if not columns:
+        return list(arrow_schema.names)
+    return [_field(arrow_schema, name).name for name in columns]
+
+
+def _filter_expression(
+    arrow_schema: pa.Schema, filters: Sequence[str]
+) -> ds.Expression | None:
+    """Условия вида "колонка>=значение", объединённые через И.
+
+    Значение приводится к типу колонки, ошибка приведения — ValueError.
+    """
+    expression = None
+    for text in filters:
+        match = _FILTER.match(text)
+        if match is None:
+            raise ValueError(f"Некорректный фильтр: {text}")
+        name, op, raw = (part.strip() for part in match.groups())
+        value = pa.scalar(raw).cast(_field(arrow_schema, name).type)
+        condition = FILTER_OPERATORS[op](ds.field(name), value)
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def _take(
+    batches: Iterable[pa.RecordBatch], skip: int, limit: int, arrow_schema: pa.Schema
+) -> pa.Table:
+    """Первые limit строк после skip, не дочитывая порции дальше нужных."""
+    taken: list[pa.RecordBatch] = []
+    rows = 0
+    for batch in batches:
+        if skip >= batch.num_rows:
+            skip -= batch.num_rows
+            continue
+        batch = batch.slice(skip, limit - rows)
+        skip = 0
+        taken.append(batch)
+        rows += batch.num_rows
+        if rows >= limit:
+            break
+    if not taken:
+        return arrow_schema.empty_table()
+    return pa.Table.from_batches(taken).cast(arrow_schema)
+
+
+def _parquet_page(
+    path: str, offset: int, limit: int, columns: Sequence[str] | None
+) -> tuple[pa.Table, int]:
+    parquet = open_parquet(path)
+    arrow_schema = parquet.schema_arrow
+    names = _columns(arrow_schema, columns)
+    groups: list[int] = []
+    skip = start = 0
+    for i in range(parquet.num_row_groups):
+        rows = parquet.metadata.row_group(i).num_rows
+        if start + rows > offset and start < offset + limit:
+            if not groups:
+                skip = offset - start
+            groups.append(i)
+        start += rows
+    batches = (
+        parquet.iter_batches(PAGE_BATCH_ROWS, row_groups=groups, columns=names)
+        if groups
+        else []
+    )
+    page_schema = pa.schema([arrow_schema.field(name) for name in names])
+    return _take(batches, skip, limit, page_schema), int(parquet.metadata.num_rows)
+
+
+def read_rows(
+    path: str,
+    offset: int,
+    limit: int,
+    columns: Sequence[str] | None = None,
+    filters: Sequence[str] = (),
+    sort: str | None = None,
+) -> tuple[pa.Table, int]:
+    """Строки [offset, offset + limit) и число строк, прошедших фильтры.
+
+    sort — имя колонки, "-имя" — по убыванию; пропуски идут в конце.
+    """
+    if is_parquet(path) and not filters and not sort:
+        return _parquet_page(path, offset, limit, columns)
+
+    if is_parquet(path):
+        dataset = ds.dataset(path, format="parquet")
+    else:
+        dataset = ds.dataset(pa.Table.from_pandas(pd.read_pickle(path)))
+    arrow_schema = dataset.schema
+    names = _columns(arrow_schema, columns)
+    expression = _filter_expression(arrow_schema, filters)
+    total = dataset.count_rows(filter=expression)
+    page_schema = pa.schema([arrow_schema.field(name) for name in names])
+
+    if not sort:
+        batches = dataset.to_batches(columns=names, filter=expression)
+        return _take(batches, offset, limit, page_schema), total
+
+    key, order = (sort[1:], "descending") if sort[0] == "-" else (sort, "ascending")
+    _field(arrow_schema, key)
+    table = dataset.to_table(
+        columns=list(dict.fromkeys([*names, key])), filter=expression
+    )
+    # устойчивая сортировка: равные значения не переходят между страницами
+    indices = pc.sort_indices(table, sort_keys=[(key, order)])
+    return table.take(indices[offset : offset + limit]).select(names), total
+
+
+def records(table: pa.Table) -> list[dict[str, Any]]:
+    """Строки для JSON: пропуски — null, даты — ISO 8601."""
+    text = table.to_pandas().to_json(
+        orient="records", date_format="iso", force_ascii=False
+    )
+    result: list[dict[str, Any]] = json.loads(text)
+    return result
@@ -1,14 +1,22 @@
+import hashlib
+import json
 import os
+import time
 from datetime import datetime, timedelta
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlmodel import Session, select
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from database import get_session
+from cache import TTLCache
+from database import get_async_session
 from models import APIKey, User
+from task_queue import REDIS_URL
 
 SECRET_KEY = os.getenv("SECRET_KEY", "")
 
@@ -19,6 +27,27 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
+
+API_KEY_PREFIX = "sk-relav-"
+
+# Кэш пользователей по email из JWT и по API-ключу. AUTH_CACHE_REDIS=1 добавляет
+# общий для всех узлов уровень в Redis.
+AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", 60))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", 10_000))
+AUTH_CACHE_REDIS = os.getenv("AUTH_CACHE_REDIS", "0") == "1"
+# Отзыв ключа увеличивает счётчик в Redis, а записи кэша помнят значение
+# счётчика на момент загрузки. Процесс перечитывает счётчик не чаще раза в
+# AUTH_REVOCATION_INTERVAL секунд, поэтому отозванный ключ перестаёт работать во
+# всех процессах не позже чем через этот интервал (без Redis — через
+# AUTH_CACHE_TTL).
+AUTH_REVOCATION_INTERVAL = float(os.getenv("AUTH_REVOCATION_INTERVAL", 1))
+REVOCATION_KEY = "auth:revocations"
+
+_principals = TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL)
+_redis: aioredis.Redis | None = None
+_epoch = 0
+_epoch_checked_at = float("-inf")
 
 
 def verify_password(plain_password, hashed_password):
@@ -37,71 +66,182 @@ def create_access_token(data: dict):
     return encoded_jwt
 
 
+def _email_key(email: str) -> str:
+    return f"user:{email}"
+
+
+def _api_key_key(api_key: str) -> str:
+    return "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+
+def _get_redis() -> aioredis.Redis:
+    global _redis
+    if _redis is None:
+        _redis = aioredis.from_url(REDIS_URL, decode_responses=True)
+    return _redis
+
+
+async def _current_epoch() -> int:
+    """Счётчик отзывов из Redis, перечитывается раз в AUTH_REVOCATION_INTERVAL."""
+    global _epoch, _epoch_checked_at
+    now = time.monotonic()
+    if now - _epoch_checked_at >= AUTH_REVOCATION_INTERVAL:
+        _epoch_checked_at = now
+        try:
+            _epoch = max(_epoch, int(await _get_redis().get(REVOCATION_KEY) or 0))
+        except RedisError:
+            pass
+    return _epoch
+
+
+async def _cache_get(key: str, epoch: int) -> User | None:
+    entry = _principals.get(key)
+    if entry is None and AUTH_CACHE_REDIS:
+        try:
+            raw = await _get_redis().get(f"auth:principal:{key}")
+        except RedisError:
+            raw = None
+        if raw:
+            entry = json.loads(raw)
+            _principals.set(key, entry)
+    if entry is None:
+        return None
+    if entry.get("epoch", -1) < epoch:
+        # запись старше последнего отзыва ключа
+        _principals.delete(key)
+        return None
+    return User(**entry["user"], hashed_password="")
+
+
+async def _cache_set(key: str, user: User, epoch: int) -> None:
+    """epoch — значение счётчика до запроса к БД: отзыв во время запроса
+    сделает запись устаревшей."""
+    entry = {"epoch": epoch, "user": user.model_dump(exclude={"hashed_password"})}
+    _principals.set(key, entry)
+    if AUTH_CACHE_REDIS:
+        try:
+            await _get_redis().set(
+                f"auth:principal:{key}", json.dumps(entry), ex=AUTH_CACHE_TTL
+            )
+        except RedisError:
+            pass
+
+
+async def invalidate_api_key(api_key: str) -> None:
+    """Убирает ключ из кэша и сообщает об отзыве остальным процессам."""
+    global _epoch
+    key = _api_key_key(api_key)
+    _principals.delete(key)
+    try:
+        if AUTH_CACHE_REDIS:
+            await _get_redis().delete(f"auth:principal:{key}")
+        _epoch = max(_epoch, int(await _get_redis().incr(REVOCATION_KEY)))
+    except RedisError:
+        pass
+
+
+def clear_auth_cache() -> None:
+    global _epoch, _epoch_checked_at
+    _principals.clear()
+    _epoch, _epoch_checked_at = 0, float("-inf")
+
+
+def _decode_email(token: str) -> str | None:
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    return payload.get("sub") or None
+
+
+async def resolve_user_by_email(email: str, session: AsyncSession) -> User | None:
+    """Пользователь по email из токена (через кэш)."""
+    key = _email_key(email)
+    epoch = await _current_epoch()
+    user = await _cache_get(key, epoch)
+    if user is None:
+        result = await session.exec(select(User).where(User.email == email))
+        user = result.first()
+        if user is not None:
+            await _cache_set(key, user, epoch)
+    return user
+
+
+async def resolve_user_by_api_key(api_key: str, session: AsyncSession) -> User | None:
+    """Владелец активного API-ключа (через кэш)."""
+    key = _api_key_key(api_key)
+    epoch = await _current_epoch()
+    user = await _cache_get(key, epoch)
+    if user is None:
+        result = await session.exec(
+            select(User)
+            .join(APIKey)
+            .where(APIKey.key == api_key)
+            .where(col(APIKey.is_active))
+        )
+        user = result.first()
+        if user is not None:
+            await _cache_set(key, user, epoch)
+    return user
+
+
 async def get_current_user(
-    token: str = Depends(oauth2_scheme), session: Session = Depends(get_session)
+    token: str = Depends(oauth2_scheme),
+    session: AsyncSession = Depends(get_async_session),
 ):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub") or ""
-        if not email:
-            raise credentials_exception
-    except JWTError as e:
-        raise credentials_exception from e
+    email = _decode_email(token)
+    if not email:
+        raise credentials_exception
 
-    user = session.exec(select(User).where(User.email == email)).first()
+    user = await resolve_user_by_email(email, session)
     if user is None:
         raise credentials_exception
     return user
 
 
 async def get_current_user_optional(
-    token: str = Depends(OAuth2PasswordBearer(tokenUrl="token", auto_error=False)),
-    session: Session = Depends(get_session),
+    token: str = Depends(optional_oauth2_scheme),
+    session: AsyncSession = Depends(get_async_session),
 ) -> User | None:
     if not token:
         return None
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email = payload.get("sub")
-        if not email:
-            return None
-        user = session.exec(select(User).where(User.email == email)).first()
-        return user
-    except JWTError:
+    email = _decode_email(token)
+    if not email:
         return None
+    return await resolve_user_by_email(email, session)
 
 
 async def get_user_by_api_key(
-    api_key_header: str = Depends(
-        OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
-    ),
-    session: Session = Depends(get_session),
+    api_key_header: str = Depends(optional_oauth2_scheme),
+    session: AsyncSession = Depends(get_async_session),
 ) -> User | None:
     if not api_key_header:
         return None
-
-    api_key_obj = session.exec(
-        select(APIKey).where(APIKey.key == api_key_header)
-    ).first()
-
-    if api_key_obj and api_key_obj.is_active:
-        return api_key_obj.user
-    return None
+    return await resolve_user_by_api_key(api_key_header, session)
 
 
 async def get_current_user_or_api_key(
-    jwt_user: User | None = Depends(get_current_user_optional),
-    api_key_user: User | None = Depends(get_user_by_api_key),
+    token: str | None = Depends(optional_oauth2_scheme),
+    session: AsyncSession = Depends(get_async_session),
 ) -> User:
-    if jwt_user:
-        return jwt_user
-    if api_key_user:
-        return api_key_user
+    user = None
+    if token:
+        # API-ключи узнаются по префиксу, JWT проверяется без обращения к БД
+        if token.startswith(API_KEY_PREFIX):
+            user = await resolve_user_by_api_key(token, session)
+        else:
+            email = _decode_email(token)
+            if email:
+                user = await resolve_user_by_email(email, session)
+            if user is None:
+                user = await resolve_user_by_api_key(token, session)
+    if user:
+        return user
 
     raise HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -0,0 +1,118 @@
+"""
+Бенчмарк выгрузки: время и пиковая память экспорта большого набора.
+
+    python benchmarks.py --rows 2000000 --formats csv,json,xlsx,xlsx-pandas
+
+Набор генерируется synthdata и пишется в Parquet порциями во временный
+каталог. Каждый формат кодируется в отдельном свежем процессе тем же путём,
+что и /download, поэтому замеры не влияют друг на друга. Память — прирост
+пикового RSS процесса за время экспорта. xlsx-pandas — прежняя выгрузка через
+df.to_excel для сравнения (только до предела строк листа Excel).
+"""
+
+import argparse
+import os
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Any
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import synthdata as sd
+
+BATCH_ROWS = 100_000
+FORMATS = ["csv", "json", "xlsx"]
+
+
+def make_dataset(path: str, rows: int, seed: int = 0) -> None:
+    """Набор клиентов с транзакциями: строки, числа, даты и флаги."""
+    np.random.seed(seed)
+    writer = None
+    try:
+        for start in range(0, rows, BATCH_ROWS):
+            n = min(BATCH_ROWS, rows - start)
+            names = sd.names(n)
+            frame = pd.DataFrame(
+                {
+                    "id": sd.ids(n, start=start + 1),
+                    "name": names,
+                    "email": sd.emails(n, names=names),
+                    "city": sd.cities(n),
+                    "amount": sd.amounts(n, mean=5000),
+                    "created_at": sd.dates(n, with_time=True),
+                    "active": sd.booleans(n, 0.8),
+                }
+            )
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss в Linux — в килобайтах
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(source: str, fmt: str, target: str) -> dict[str, Any]:
+    """Один замер; вызывается в отдельном процессе."""
+    import artifacts
+    import exports
+
+    baseline = _peak_rss_mb()
+    started = time.perf_counter()
+    if fmt == "xlsx-pandas":
+        artifacts.load(source).to_excel(target, index=False)
+    else:
+        with open(target, "wb") as f:
+            frames = artifacts.iter_frames(source, exports.EXPORT_BATCH_ROWS)
+            for chunk in exports.ENCODERS[fmt](frames):
+                f.write(chunk)
+    return {
+        "format": fmt,
+        "seconds": round(time.perf_counter() - started, 2),
+        "peak_mb": round(_peak_rss_mb() - baseline, 1),
+        "size_mb": round(os.path.getsize(target) / 1024**2, 1),
+    }
+
+
+def run(rows: int, formats: list[str]) -> list[dict[str, Any]]:
+    with tempfile.TemporaryDirectory() as workdir:
+        source = os.path.join(workdir, "dataset.parquet")
+        make_dataset(source, rows)
+        results = []
+        for fmt in formats:
+            target = os.path.join(workdir, f"export.{fmt.split('-')[0]}")
+            with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as pool:
+                result = pool.submit(measure, source, fmt, target).result()
+            results.append({"rows": rows, **result})
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Бенчмарк выгрузки наборов")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--formats", default=",".join(FORMATS))
+    args = parser.parse_args()
+
+    print(
+        f"{'формат':<12}{'строк':>10}{'время, с':>10}{'память, МБ':>12}{'файл, МБ':>10}"
+    )
+    for r in run(args.rows, args.formats.split(",")):
+        print(
+            f"{r['format']:<12}{r['rows']:>10}{r['seconds']:>10}"
+            f"{r['peak_mb']:>12}{r['size_mb']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
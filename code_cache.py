@@ -0,0 +1,76 @@
+"""
+Кэш «промпт → проверенный код».
+
+В кэш попадает только код, который прошёл is_code_safe_and_valid и успешно
+отработал в песочнице. Путь сохранения результата заменяется плейсхолдером,
+чтобы скрипт можно было переиспользовать для любой задачи.
+
+Ключ — промпт и модель, которую выбрал пользователь (в том числе auto), а не
+модель, на которую запрос направил роутер: иначе повтор того же запроса
+промахивался бы мимо кэша при каждой смене маршрута. Модель, написавшая код,
+хранится рядом с ним.
+"""
+
+import hashlib
+import os
+import re
+
+from cache import TTLCache
+
+CODE_CACHE_SIZE = int(os.getenv("CODE_CACHE_SIZE", 1000))
+CODE_CACHE_TTL = int(os.getenv("CODE_CACHE_TTL", 7 * 24 * 3600))
+
+RESULT_PATH_PLACEHOLDER = "__SYNTHGEN_RESULT_PATH__"
+
+_cache = TTLCache(CODE_CACHE_SIZE, CODE_CACHE_TTL)
+
+
+def normalize_prompt(prompt: str) -> str:
+    text = prompt.lower().replace("ё", "е")
+    text = re.sub(r"\s+", " ", text)
+    return text.strip(" .!?,;:")
+
+
+def cache_key(prompt: str, model_name: str) -> str:
+    raw = f"{model_name}\0{normalize_prompt(prompt)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def lookup(prompt: str, model_name: str, result_path: str) -> tuple[str, str] | None:
+    """(код для result_path, модель, которая его написала) или None."""
+    entry = _cache.get(cache_key(prompt, model_name))
+    _log("hit" if entry else "miss")
+    if not entry:
+        return None
+    code = entry["code"].replace(RESULT_PATH_PLACEHOLDER, result_path)
+    return code, entry["model"]
+
+
+def store(
+    prompt: str, model_name: str, result_path: str, code: str, generated_by: str
+) -> None:
+    """model_name — модель из запроса пользователя, generated_by — модель,
+    чей код прошёл проверку."""
+    # без явного пути сохранения скрипт нельзя переиспользовать для другой задачи
+    if result_path not in code:
+        return
+    template = code.replace(result_path, RESULT_PATH_PLACEHOLDER)
+    _cache.set(cache_key(prompt, model_name), {"code": template, "model": generated_by})
+
+
+def invalidate(prompt: str, model_name: str) -> None:
+    _cache.delete(cache_key(prompt, model_name))
+    _log("invalidate")
+
+
+def stats() -> dict[str, int]:
+    return _cache.stats()
+
+
+def clear() -> None:
+    _cache.clear()
+
+
+def _log(event: str) -> None:
+    s = _cache.stats()
+    print(f"[code-cache] {event} (hits={s['hits']}, misses={s['misses']})")
@@ -1,13 +1,28 @@
 import ast
+import asyncio
+import contextlib
+import inspect
+import json
 import os
 import re
 import subprocess
-from typing import Any
+import threading
+import time
+import uuid
+from collections.abc import Awaitable, Callable, Generator
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+from typing import Any, TypeVar
 
-import pandas as pd
 from dotenv import load_dotenv
 from google import genai
 
+import artifacts
+import code_cache
+import dataprofile
+import sharding
+from sandbox import SANDBOX_PROFILE, SANDBOX_TIMEOUT, get_sandbox_backend
+
 load_dotenv()
 
 API_KEY = os.getenv("GEMINI_API_KEY")
@@ -15,9 +30,21 @@ client = genai.Client(api_key=API_KEY)
 # MODEL_ID = os.getenv("GEMINI_MODEL_ID", "gemini-2.5-flash-lite")
 STORAGE_DIR = "storage"
 DEFAULT_MODEL = "gemini-2.5-flash"
+# сколько символов ошибки сохраняется в телеметрии попытки
+ATTEMPT_ERROR_CHARS = 2000
+# сколько черновиков запрашивать параллельно и для каких тарифов (1 — выключено)
+SPECULATIVE_CANDIDATES = int(os.getenv("SPECULATIVE_CANDIDATES", 1))
+SPECULATIVE_TIERS = set(os.getenv("SPECULATIVE_TIERS", "enterprise").split(","))
+SPECULATION_CANCELLED = "Отменён: раньше завершился другой вариант."
+# начало ошибки ускоренной версии, которая отработала, но не заменила исходную
+CANDIDATE_REJECTED = "Не принят: "
+# при профилировании (SANDBOX_PROFILE=1) скрипт дольше бюджета отдаётся на ускорение
+PERF_BUDGET_SECONDS = float(os.getenv("PERF_BUDGET_SECONDS", 30))
 
 os.makedirs(STORAGE_DIR, exist_ok=True)
 
+_T = TypeVar("_T")
+
 
 def is_code_safe_and_valid(code: str) -> tuple[bool, str]:
     try:
@@ -41,216 +68,1189 @@ def is_code_safe_and_valid(code: str) -> tuple[bool, str]:
     return True, "OK"
 
 
-def generate_and_run(
-    user_query: str,
-    task_id: int,
-    previous_code: str | None = None,
-    on_progress: Any = None,
-    model_name: str = DEFAULT_MODEL,
+def _new_attempt(
+    attempts: list[dict[str, Any]], kind: str, model_name: str
 ) -> dict[str, Any]:
+    """Заводит запись телеметрии попытки (см. models.GenerationAttempt)."""
+    stats: dict[str, Any] = {
+        "attempt": len(attempts) + 1,
+        "kind": kind,
+        "model": model_name,
+        "success": False,
+    }
+    attempts.append(stats)
+    return stats
 
-    def log(message: str, percent: int) -> None:
-        if on_progress:
-            on_progress(message, percent)
-        print(f"[{percent}%] {message}")
 
+def _finish_attempt(stats: dict[str, Any], success: bool, error: str | None) -> None:
+    stats["success"] = success
+    if error:
+        stats["error"] = error[:ATTEMPT_ERROR_CHARS]
+
+
+# шаг конвейера: имя действия ввода-вывода и его именованные аргументы
+Step = tuple[str, dict[str, Any]]
+# логика без ввода-вывода: отдаёт шаги, получает их результаты, возвращает итог
+Steps = Generator[Step, Any, _T]
+
+
+def _log(message: str, percent: int) -> Step:
+    return "log", {"message": message, "percent": percent}
+
+
+def _ask(
+    kind: str, contents: str | None, model_name: str, stats: dict[str, Any]
+) -> Step:
+    """Запрос к LLM; contents=None — запрашивать нечего, ответ будет пустым."""
+    return "ask", {
+        "kind": kind,
+        "contents": contents,
+        "model_name": model_name,
+        "stats": stats,
+    }
+
+
+def _pipeline(
+    user_query: str,
+    task_id: int,
+    previous_code: str | None,
+    model_name: str,
+    candidates: int,
+    escalation: list[str] | None,
+    previous_file: str | None,
+    requested_model: str | None,
+) -> Steps[dict[str, Any]]:
+    """Генерация с самоисправлением: решения общие для generate_and_run и
+    agenerate_and_run, ввод-вывод выполняют их драйверы (_drive и _adrive)."""
     max_retries = 3
     current_attempt = 0
     last_error: str | None = None
     bad_code: str | None = None
+    slow_profile: dict[str, Any] | None = None
+    attempts: list[dict[str, Any]] = []
+    # модель каждой следующей попытки: после неудачи — следующая по силе
+    models = [model_name, *(escalation or [])]
+    attempt_model = model_name
+    source = delta_source(previous_code, previous_file)
+    # кэш кода общий для всех маршрутов запроса с этой моделью (и с auto)
+    cache_model = requested_model or model_name
+
+    yield _log("Анализ запроса и подготовка промпта...", 10)
+
+    cached = None
+    if not previous_code:
+        cached = code_cache.lookup(user_query, cache_model, result_path(task_id))
+    if cached and is_code_safe_and_valid(cached[0])[0]:
+        cached_code, cached_model = cached
+        yield _log("Найден готовый код для похожего запроса, запуск в песочнице...", 60)
+        stats = _new_attempt(attempts, "cache", cached_model)
+        success, error_msg = yield "execute", {
+            "code": cached_code,
+            "task_id": task_id,
+            "stats": stats,
+        }
+        _finish_attempt(stats, success, error_msg)
+        stats.pop("profile", None)
+        if success:
+            yield _log("Генерация предпросмотра...", 90)
+            result = yield "collect", {"code": cached_code, "task_id": task_id}
+            yield _log("Данные успешно сгенерированы.", 100)
+            return {**result, "model": cached_model, "attempts": attempts}
+        code_cache.invalidate(user_query, cache_model)
+        yield _log("Код из кэша не сработал, генерация заново...", 20)
+
+    def succeed(code: str, profile: dict[str, Any] | None) -> Steps[dict[str, Any]]:
+        if _is_slow(profile):
+            yield _log("Скрипт работает медленно, поиск более быстрой версии...", 85)
+            code = yield from _optimization(
+                code, task_id, attempt_model, profile or {}, attempts, source
+            )
+        if not previous_code:
+            code_cache.store(
+                user_query, cache_model, result_path(task_id), code, attempt_model
+            )
+        yield _log("Генерация предпросмотра...", 90)
+        result = yield "collect", {"code": code, "task_id": task_id}
+        yield _log("Данные успешно сгенерированы.", 100)
+        return {**result, "model": attempt_model, "attempts": attempts}
 
-    log("Анализ запроса и подготовка промпта...", 10)
+    if not previous_code and candidates > 1:
+        yield _log(f"Генерация {candidates} вариантов кода параллельно...", 30)
+        current_attempt = 1
+        success, bad_code, last_error, profile = yield "speculate", {
+            "user_query": user_query,
+            "task_id": task_id,
+            "model_name": model_name,
+            "candidates": candidates,
+            "attempts": attempts,
+        }
+        if success and bad_code:
+            return (yield from succeed(bad_code, profile))
+        if not bad_code:
+            return {
+                "status": "error",
+                "message": "Gemini вернула пустой ответ.",
+                "attempts": attempts,
+            }
+        yield _log("Ни один вариант не сработал. Попытка анализа...", 80)
+        if profile and profile.get("timed_out") and profile.get("lines"):
+            slow_profile = profile
 
     while current_attempt < max_retries:
         current_attempt += 1
+        attempt_model = models[min(current_attempt - 1, len(models) - 1)]
 
         if current_attempt == 1:
             if previous_code:
-                log("Модификация существующего кода...", 30)
-                code = get_modification_code(
-                    user_query, previous_code, task_id, model_name
+                yield _log("Модификация существующего кода...", 30)
+                stats = _new_attempt(attempts, "modify", attempt_model)
+                code = yield _ask(
+                    "modify",
+                    _modification_prompt(user_query, previous_code, task_id, source),
+                    attempt_model,
+                    stats,
                 )
+                if is_delta(code, source):
+                    stats["kind"] = "delta"
             else:
-                log("Генерация кода с нуля...", 30)
-                code = get_generation_code(user_query, task_id, model_name)
+                yield _log("Генерация кода с нуля...", 30)
+                stats = _new_attempt(attempts, "generate", attempt_model)
+                code = yield _ask(
+                    "generate",
+                    _generation_prompt(user_query, task_id),
+                    attempt_model,
+                    stats,
+                )
+        elif slow_profile is not None:
+            yield _log("Скрипт не уложился во время, ускорение по профилю...", 35)
+            stats = _new_attempt(attempts, "optimize", attempt_model)
+            code = yield _ask(
+                "optimize",
+                (
+                    _optimization_prompt(bad_code, slow_profile, task_id)
+                    if bad_code
+                    else None
+                ),
+                attempt_model,
+                stats,
+            )
         else:
-            log(
-                f"Попытка самоисправления {model_name} {current_attempt-1}/{max_retries-1}...",
+            yield _log(
+                f"Попытка самоисправления {attempt_model} {current_attempt-1}/{max_retries-1}...",
                 35,
             )
-            code = get_fix_from_llm(bad_code, last_error, task_id, model_name)
+            stats = _new_attempt(attempts, "fix", attempt_model)
+            code = yield _ask(
+                "fix",
+                (
+                    _fix_prompt(bad_code, last_error, task_id)
+                    if bad_code and last_error
+                    else None
+                ),
+                attempt_model,
+                stats,
+            )
+        slow_profile = None
 
         if not code:
-            return {"status": "error", "message": "Gemini вернула пустой ответ."}
+            _finish_attempt(stats, False, "Gemini вернула пустой ответ.")
+            return {
+                "status": "error",
+                "message": "Gemini вернула пустой ответ.",
+                "attempts": attempts,
+            }
 
-        log("Проверка безопасности и синтаксиса...", 50)
+        yield _log("Проверка безопасности и синтаксиса...", 50)
         is_safe, msg = is_code_safe_and_valid(code)
         if not is_safe:
             last_error = msg
             bad_code = code
-            log(f"Валидация не пройдена: {msg}", 55)
+            _finish_attempt(stats, False, msg)
+            yield _log(f"Валидация не пройдена: {msg}", 55)
             continue
 
-        log("Запуск кода в Docker-песочнице...", 70)
-        success, error_msg = run_in_sandbox(code, task_id)
+        yield _log("Запуск кода в песочнице...", 70)
+        success, error_msg = yield "execute", {
+            "code": code,
+            "task_id": task_id,
+            "stats": stats,
+            # исправление или ускорение может сменить дельту на полную генерацию
+            "inputs": delta_inputs(code, source),
+        }
+        _finish_attempt(stats, success, error_msg)
+        profile = stats.pop("profile", None)
 
         if success:
-            final_filename = f"{STORAGE_DIR}/result_{task_id}.pkl"
-
-            log("Генерация предпросмотра...", 90)
-            preview = []
-            file_size = 0
-            row_count = 0
-            try:
-                df = pd.read_pickle(final_filename)
-                row_count = len(df)
-                file_size = os.path.getsize(final_filename)
-                df = df.fillna("")
-                preview = df.head(5).astype(str).to_dict(orient="records")
-            except Exception as e:
-                print(f"Ошибка превью: {e}")
-
-            log("Данные успешно сгенерированы.", 100)
-            return {
-                "status": "success",
-                "file": final_filename,
-                "code": code,
-                "preview": preview,
-                "file_size": file_size,
-                "row_count": row_count,
-            }
+            return (yield from succeed(code, profile))
         else:
-            log("Ошибка при исполнении. Попытка анализа...", 80)
+            yield _log("Ошибка при исполнении. Попытка анализа...", 80)
             last_error = error_msg
             bad_code = code
+            if profile and profile.get("timed_out") and profile.get("lines"):
+                slow_profile = profile
 
     return {
         "status": "error",
         "message": f"Не удалось создать данные после {max_retries} попыток. Последняя ошибка: {last_error}",
+        "attempts": attempts,
     }
 
 
-def get_generation_code(prompt: str, task_id: int, model_name: str) -> str | None:
-    file_path_docker = f"{STORAGE_DIR}/result_{task_id}.pkl"
+def _drive(steps: Steps[_T], on_progress: Any = None) -> _T:
+    """Выполняет шаги конвейера синхронно."""
+    actions: dict[str, Callable[..., Any]] = {
+        "ask": _call_llm,
+        "run": run_in_sandbox,
+        "execute": execute,
+        "speculate": speculate,
+        "collect": collect_result,
+        "adopt": _adopt_candidate,
+    }
+    reply: Any = None
+    while True:
+        try:
+            action, kwargs = steps.send(reply)
+        except StopIteration as done:
+            result: _T = done.value
+            return result
+        if action == "log":
+            if on_progress:
+                on_progress(kwargs["message"], kwargs["percent"])
+            print(f"[{kwargs['percent']}%] {kwargs['message']}")
+            reply = None
+        else:
+            reply = actions[action](**kwargs)
 
-    cmd = f"df.to_pickle('{file_path_docker}')"
 
-    instr = f"""Напиши Python код (Pandas + Faker) для генерации данных.
-    ПРАВИЛА:
-    1. Локализация Faker: fake = Faker('ru_RU').
-    2. Создай DataFrame 'df'.
-    3. Сохрани результат командой: {cmd}
-    4. НЕ используй print().
-    5. Выдай ТОЛЬКО чистый код."""
+def _in_thread(func: Callable[..., Any]) -> Callable[..., Awaitable[Any]]:
+    async def call(**kwargs: Any) -> Any:
+        return await asyncio.to_thread(partial(func, **kwargs))
 
-    try:
-        resp = client.models.generate_content(
-            model=model_name, contents=f"{instr}\nЗапрос пользователя: {prompt}"
-        )
-        text_response = resp.text if resp.text else ""
-        code = re.sub(r"```python|```", "", text_response).strip()
-        return code
-    except Exception as e:
-        print(f"Ошибка Gemini API: {e}")
+    return call
+
+
+async def _adrive(steps: Steps[_T], on_progress: Any = None) -> _T:
+    """Выполняет шаги конвейера в цикле событий; работа с файлами — в потоке.
+
+    on_progress может быть как обычной функцией, так и корутиной.
+    """
+    actions: dict[str, Callable[..., Awaitable[Any]]] = {
+        "ask": _acall_llm,
+        "run": arun_in_sandbox,
+        "execute": aexecute,
+        "speculate": aspeculate,
+        "collect": _in_thread(collect_result),
+        "adopt": _in_thread(_adopt_candidate),
+    }
+    reply: Any = None
+    while True:
+        try:
+            action, kwargs = steps.send(reply)
+        except StopIteration as done:
+            result: _T = done.value
+            return result
+        if action == "log":
+            if on_progress:
+                res = on_progress(kwargs["message"], kwargs["percent"])
+                if inspect.isawaitable(res):
+                    await res
+            print(f"[{kwargs['percent']}%] {kwargs['message']}")
+            reply = None
+        else:
+            reply = await actions[action](**kwargs)
+
+
+def generate_and_run(
+    user_query: str,
+    task_id: int,
+    previous_code: str | None = None,
+    on_progress: Any = None,
+    model_name: str = DEFAULT_MODEL,
+    candidates: int = 1,
+    escalation: list[str] | None = None,
+    previous_file: str | None = None,
+    requested_model: str | None = None,
+) -> dict[str, Any]:
+    """requested_model — модель из запроса пользователя до маршрутизации
+    (ключ кэша кода); по умолчанию model_name."""
+    steps = _pipeline(
+        user_query,
+        task_id,
+        previous_code,
+        model_name,
+        candidates,
+        escalation,
+        previous_file,
+        requested_model,
+    )
+    return _drive(steps, on_progress)
+
+
+async def agenerate_and_run(
+    user_query: str,
+    task_id: int,
+    previous_code: str | None = None,
+    on_progress: Any = None,
+    model_name: str = DEFAULT_MODEL,
+    candidates: int = 1,
+    escalation: list[str] | None = None,
+    previous_file: str | None = None,
+    requested_model: str | None = None,
+) -> dict[str, Any]:
+    """Асинхронный вариант generate_and_run с той же логикой самоисправления."""
+    steps = _pipeline(
+        user_query,
+        task_id,
+        previous_code,
+        model_name,
+        candidates,
+        escalation,
+        previous_file,
+        requested_model,
+    )
+    return await _adrive(steps, on_progress)
+
+
+def result_path(task_id: int) -> str:
+    return f"{STORAGE_DIR}/result_{task_id}.parquet"
+
+
+def shard_path(task_id: int, index: int) -> str:
+    return f"{STORAGE_DIR}/result_{task_id}.shard{index}.parquet"
+
+
+def candidate_path(task_id: int) -> str:
+    return f"{STORAGE_DIR}/result_{task_id}.candidate.parquet"
+
+
+def speculative_path(task_id: int, index: int) -> str:
+    return f"{STORAGE_DIR}/result_{task_id}.spec{index}.parquet"
+
+
+def summary_path(path: str) -> str:
+    """Профиль набора (dataprofile), который песочница пишет рядом с файлом."""
+    return f"{path}.summary.json"
+
+
+def _remove_file(path: str) -> None:
+    for name in (path, summary_path(path)):
+        if os.path.exists(name):
+            os.remove(name)
+
+
+def _replace_file(source: str, target: str) -> None:
+    """Переносит результат вместе с профилем; без профиля старый удаляется."""
+    os.replace(source, target)
+    if os.path.exists(summary_path(source)):
+        os.replace(summary_path(source), summary_path(target))
+    elif os.path.exists(summary_path(target)):
+        os.remove(summary_path(target))
+
+
+def delta_source(previous_code: str | None, previous_file: str | None) -> str | None:
+    """Прошлый результат, который модификация может преобразовать на месте."""
+    if not previous_code or not previous_file:
         return None
+    if not artifacts.is_parquet(previous_file) or not os.path.exists(previous_file):
+        return None
+    return previous_file
 
 
-def get_fix_from_llm(
-    bad_code: str | None, error_msg: str | None, task_id: int, model_name: str
-) -> str | None:
-    if not bad_code or not error_msg:
+def is_delta(code: str | None, source: str | None) -> bool:
+    """Код читает прошлый результат, а не генерирует данные заново."""
+    return bool(code and source and source in code)
+
+
+def delta_inputs(code: str | None, source: str | None) -> list[str] | None:
+    """Файлы, доступные скрипту только для чтения: прошлый результат нужен лишь
+    дельта-коду, полная генерация его не видит и шардируется как обычно."""
+    return [source] if source and is_delta(code, source) else None
+
+
+def save_command(task_id: int) -> str:
+    return f"df.to_parquet('{result_path(task_id)}', index=False)"
+
+
+def _read_summary(path: str) -> dict[str, Any] | None:
+    """Профиль из песочницы; файл удаляется — дальше профиль хранится в задаче."""
+    try:
+        with open(summary_path(path), encoding="utf-8") as f:
+            summary = json.load(f)
+    except (OSError, ValueError):
         return None
+    finally:
+        _remove_summary(path)
+    return summary if isinstance(summary, dict) else None
 
-    file_path_docker = f"{STORAGE_DIR}/result_{task_id}.pkl"
 
-    prompt = f"""
+def _remove_summary(path: str) -> None:
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(summary_path(path))
+
+
+def _profile_file(path: str) -> dict[str, Any]:
+    """Профиль набора, посчитанный по файлу порциями."""
+    profiles = [
+        dataprofile.compute(frame)
+        for frame in artifacts.iter_frames(path, artifacts.DEFAULT_BATCH_ROWS)
+    ]
+    return dataprofile.merge(profiles, [0] * len(profiles), [])
+
+
+def collect_result(code: str, task_id: int) -> dict[str, Any]:
+    """Итог задачи. Число строк и превью берутся из профиля песочницы.
+
+    Профиль сверяется с числом строк в метаданных Parquet: скрипт мог изменить
+    df после сохранения. Если профиля нет или он расходится с файлом, профиль
+    считается заново по самому файлу.
+    """
+    final_filename = result_path(task_id)
+    summary = _read_summary(final_filename)
+
+    preview = []
+    file_size = 0
+    row_count = 0
+    try:
+        file_size = os.path.getsize(final_filename)
+        row_count = artifacts.row_count(final_filename)
+        if summary is None or summary["rows"] != row_count:
+            summary = _profile_file(final_filename)
+        preview = summary["preview"]
+    except Exception as e:
+        print(f"Ошибка превью: {e}")
+
+    return {
+        "status": "success",
+        "file": final_filename,
+        "code": code,
+        "preview": preview,
+        "file_size": file_size,
+        "row_count": row_count,
+        "dataset_profile": summary,
+    }
+
+
+def _extract_code(resp: Any) -> str:
+    text_response = resp.text if resp.text else ""
+    return re.sub(r"```python|```", "", text_response).strip()
+
+
+SYNTHDATA_HINT = (
+    "Модуль synthdata (import synthdata as sd) возвращает массивы из n значений: "
+    "sd.ids(n), sd.names(n, gender=None), sd.genders(n), sd.emails(n, names=None), "
+    "sd.phones(n), sd.cities(n), sd.dates(n, start, end, with_time=False), "
+    "sd.amounts(n, mean, sigma, distribution='lognormal', low=None, high=None), "
+    "sd.integers(n, low, high), sd.categorical(n, categories, weights=None), "
+    "sd.booleans(n, true_share), sd.correlated(base, corr, mean, std), "
+    "sd.inject_outliers(values, fraction, factor), "
+    "sd.inject_missing(values, fraction)."
+)
+
+
+def _generation_prompt(prompt: str, task_id: int) -> str:
+    cmd = save_command(task_id)
+
+    instr = f"""Напиши Python код (Pandas + NumPy) для генерации данных.
+    ПРАВИЛА:
+    1. Генерируй колонки целиком, без построчных циклов. {SYNTHDATA_HINT}
+    2. Faker('ru_RU') используй только для того, чего нет в synthdata.
+    3. Создай DataFrame 'df'. Значения в каждой колонке должны быть одного типа.
+    4. Число строк задай в начале кода константой: N_ROWS = <число>.
+    5. Не фиксируй seed генераторов случайных чисел.
+    6. Сохрани результат командой: {cmd}
+    7. НЕ используй print().
+    8. Выдай ТОЛЬКО чистый код."""
+
+    return f"{instr}\nЗапрос пользователя: {prompt}"
+
+
+def _fix_prompt(bad_code: str, error_msg: str, task_id: int) -> str:
+    return f"""
     Исправь ошибку в Python коде. НЕ ИСПОЛЬЗУЙ библиотеку os.
     ОШИБКА: {error_msg}
     ИСХОДНЫЙ КОД:
     {bad_code}
-    ВАЖНО: Результат должен быть сохранен в: {file_path_docker}
+    ВАЖНО: Результат должен быть сохранен командой: {save_command(task_id)}
     Выдай только полный исправленный код без пояснений.
     """
+
+
+def _format_profile(code: str, profile: dict[str, Any]) -> str:
+    """Горячие строки профиля с их текстом и долей выборок."""
+    lines = code.splitlines()
+    samples = profile.get("samples") or 0
+    hot = []
+    for lineno, count in profile.get("lines", []):
+        text = lines[lineno - 1].strip() if 0 < lineno <= len(lines) else ""
+        share = count * 100 / samples if samples else 0
+        hot.append(f"строка {lineno} ({share:.0f}% времени): {text}")
+    return "\n    ".join(hot)
+
+
+def _optimization_prompt(code: str, profile: dict[str, Any], task_id: int) -> str:
+    seconds = profile.get("wall_ms", 0) / 1000
+    verdict = (
+        f"не уложился в {SANDBOX_TIMEOUT} с"
+        if profile.get("timed_out")
+        else f"работает {seconds:.0f} с"
+    )
+    return f"""
+    Ускорь Python код генерации данных: он {verdict}.
+    САМЫЕ ДОЛГИЕ СТРОКИ ПО ДАННЫМ ПРОФИЛИРОВЩИКА:
+    {_format_profile(code, profile)}
+    ИСХОДНЫЙ КОД:
+    {code}
+    ПРАВИЛА:
+    1. Замени построчные циклы, apply и вызовы Faker в этих строках векторными
+       операциями NumPy/pandas. {SYNTHDATA_HINT}
+    2. Сохрани те же колонки, их типы и число строк.
+    3. Результат должен быть сохранен командой: {save_command(task_id)}
+    4. НЕ используй print() и библиотеку os.
+    5. Выдай только полный код без пояснений.
+    """
+
+
+def _delta_rules(source: str) -> str:
+    """Правила дельта-режима: преобразовать готовый набор вместо генерации."""
     try:
-        resp = client.models.generate_content(model=model_name, contents=prompt)
-        text_response = resp.text if resp.text else ""
-        code = re.sub(r"```python|```", "", text_response).strip()
-        return code
+        rows = artifacts.row_count(source)
+        columns = ", ".join(f"{k} ({v})" for k, v in artifacts.schema(source).items())
     except Exception as e:
-        print(f"Ошибка Gemini API при фиксе: {e}")
-        return None
-
+        print(f"Ошибка чтения прошлого результата: {e}")
+        return ""
+    return f"""
+    ТЕКУЩИЙ НАБОР ДАННЫХ (результат старого кода): {source}, {rows} строк.
+    КОЛОНКИ: {columns}
+    РЕЖИМ ПРЕОБРАЗОВАНИЯ: если изменение можно сделать над готовыми данными
+    (добавить, удалить, переименовать или пересчитать колонки, отфильтровать,
+    отсортировать или сократить строки), НЕ генерируй данные заново. Загрузи их
+    командой df = pd.read_parquet('{source}'), допиши только преобразование df
+    (новые значения — векторно, для всех строк сразу) и сохрани результат.
+    Файл {source} доступен только для чтения. Полный код генерации возвращай,
+    только если изменение этого требует: больше строк, другая сущность или
+    распределение, которое нельзя получить из текущих данных.
+    """
 
-def get_modification_code(
-    user_changes: str, old_code: str, task_id: int, model_name: str
-) -> str | None:
 
-    file_path_docker = f"{STORAGE_DIR}/result_{task_id}.pkl"
-    save_cmd = f"df.to_pickle('{file_path_docker}')"
+def _modification_prompt(
+    user_changes: str, old_code: str, task_id: int, source: str | None = None
+) -> str:
+    save_cmd = save_command(task_id)
+    delta = _delta_rules(source) if source else ""
 
-    instr = f"""
+    return f"""
     Ты — Python Data Expert. Твоя задача — изменить существующий код генерации данных.
     СТАРЫЙ КОД:
     {old_code}
     ТРЕБОВАНИЯ К ИЗМЕНЕНИЯМ:
     {user_changes}
+    {delta}
     ПРАВИЛА:
-    1. Используй pandas и faker (ru_RU).
+    1. Используй pandas и векторные функции synthdata вместо построчных циклов
+       Faker. {SYNTHDATA_HINT}
     2. Сохрани итоговый DataFrame 'df' командой: {save_cmd}
     3. НЕ используй print() и библиотеку os.
-    4. Верни ПОЛНЫЙ обновленный код, готовый к запуску (не diff, не куски).
+    4. Верни полный код, готовый к запуску (не diff, не куски).
     5. Выдай ТОЛЬКО код без Markdown разметки.
     """
 
+
+def _usage_int(usage: Any, name: str) -> int | None:
+    value = getattr(usage, name, None)
+    return value if isinstance(value, int) else None
+
+
+def _record_llm(stats: dict[str, Any] | None, started: float, resp: Any) -> None:
+    """Пишет в телеметрию попытки задержку запроса к LLM и число токенов."""
+    if stats is None:
+        return
+    usage = getattr(resp, "usage_metadata", None)
+    stats["llm_latency_ms"] = int((time.monotonic() - started) * 1000)
+    stats["prompt_tokens"] = _usage_int(usage, "prompt_token_count")
+    stats["output_tokens"] = _usage_int(usage, "candidates_token_count")
+
+
+# подпись ошибки API в логе для каждого вида запроса к LLM
+LLM_ERRORS = {
+    "generate": "Ошибка Gemini API",
+    "fix": "Ошибка Gemini API при фиксе",
+    "optimize": "Ошибка Gemini API при оптимизации",
+    "modify": "Ошибка Gemini API (Modification)",
+}
+
+
+def _call_llm(
+    kind: str,
+    contents: str | None,
+    model_name: str,
+    stats: dict[str, Any] | None = None,
+) -> str | None:
+    if not contents:
+        return None
+
     try:
-        resp = client.models.generate_content(model=model_name, contents=instr)
-        text_response = resp.text if resp.text else ""
-        code = re.sub(r"```python|```", "", text_response).strip()
-        return code
+        started = time.monotonic()
+        resp = client.models.generate_content(model=model_name, contents=contents)
+        _record_llm(stats, started, resp)
+        return _extract_code(resp)
     except Exception as e:
-        print(f"Ошибка Gemini API (Modification): {e}")
+        print(f"{LLM_ERRORS[kind]}: {e}")
         return None
 
 
-def run_in_sandbox(code: str, task_id: int) -> tuple[bool, str | None]:
-    script_name = f"temp_script_{task_id}.py"
-    output_name_host = os.path.join(STORAGE_DIR, f"result_{task_id}.pkl")
+async def _acall_llm(
+    kind: str,
+    contents: str | None,
+    model_name: str,
+    stats: dict[str, Any] | None = None,
+) -> str | None:
+    if not contents:
+        return None
+
+    try:
+        started = time.monotonic()
+        resp = await client.aio.models.generate_content(
+            model=model_name, contents=contents
+        )
+        _record_llm(stats, started, resp)
+        return _extract_code(resp)
+    except Exception as e:
+        print(f"{LLM_ERRORS[kind]}: {e}")
+        return None
+
 
-    with open(script_name, "w", encoding="utf-8") as f:
-        f.write(code)
+def _container_name(task_id: int, label: str | None) -> str:
+    return f"synthgen-task-{task_id}-{label or uuid.uuid4().hex[:8]}"
 
+
+def _check_output(output_path: str) -> tuple[bool, str | None]:
+    if not os.path.exists(output_path) or os.path.getsize(output_path) < 10:
+        return False, "Файл не был создан или поврежден."
+    return True, None
+
+
+def _runner_report(stdout: Any) -> dict[str, Any]:
+    """Отчёт sandbox_runner (последняя строка stdout) или {}, если его нет."""
     try:
-        res = subprocess.run(
-            [
-                "docker",
-                "run",
-                "--rm",
-                "-v",
-                f"{os.getcwd()}:/app",
-                "synthgen-env",
-                "python",
-                f"/app/{script_name}",
-            ],
-            capture_output=True,
-            text=True,
-            encoding="utf-8",
-            timeout=120,
+        report = json.loads(stdout.strip().splitlines()[-1])
+    except (AttributeError, IndexError, TypeError, ValueError):
+        return {}
+    return report if isinstance(report, dict) else {}
+
+
+def _record_sandbox(
+    stats: dict[str, Any] | None, started: float, stdout: Any, output_path: str
+) -> None:
+    """Пишет в телеметрию попытки время, CPU, пиковую память и размер файла."""
+    if stats is None:
+        return
+    report = _runner_report(stdout)
+    stats["sandbox_wall_ms"] = int((time.monotonic() - started) * 1000)
+    for key, field in (("cpu_ms", "sandbox_cpu_ms"), ("peak_rss_kb", "peak_rss_kb")):
+        value = report.get(key)
+        stats[field] = value if isinstance(value, int) else None
+    if os.path.exists(output_path):
+        stats["output_bytes"] = os.path.getsize(output_path)
+    profile = report.get("profile")
+    if isinstance(profile, dict):
+        # профиль нужен только циклу генерации и в GenerationAttempt не попадает
+        stats["profile"] = {
+            **profile,
+            "wall_ms": report.get("wall_ms", stats["sandbox_wall_ms"]),
+            "timed_out": bool(report.get("timed_out")),
+        }
+
+
+def _sandbox_job(
+    code: str,
+    task_id: int,
+    shard: int | None,
+    output_path: str | None,
+    label: str | None,
+    inputs: list[str] | None,
+) -> tuple[str, dict[str, Any]]:
+    """Путь результата и параметры запуска бэкенда (общие для run и arun)."""
+    if output_path is None:
+        output_path = (
+            result_path(task_id) if shard is None else shard_path(task_id, shard)
         )
+    # профиль прошлого запуска в этот путь не должен пережить новый
+    _remove_summary(output_path)
+    return output_path, {
+        "timeout": SANDBOX_TIMEOUT,
+        # шарды не профилируются: каждый из них заведомо укладывается в бюджет
+        "profile": SANDBOX_PROFILE and shard is None,
+        "name": _container_name(task_id, label),
+        "readonly": inputs,
+        "summary": summary_path(output_path),
+    }
 
-        if res.returncode != 0:
-            return False, res.stderr
 
-        if (
-            not os.path.exists(output_name_host)
-            or os.path.getsize(output_name_host) < 10
-        ):
-            return False, "Файл не был создан или поврежден."
+def _sandbox_outcome(
+    res: Any, stats: dict[str, Any] | None, started: float, output_path: str
+) -> tuple[bool, str | None]:
+    _record_sandbox(stats, started, res.stdout, output_path)
+    if res.returncode != 0:
+        return False, res.stderr
+    return _check_output(output_path)
 
-        return True, None
-    except subprocess.TimeoutExpired:
-        return False, "Превышено время ожидания исполнения (120 с)."
+
+def _sandbox_timeout(
+    e: subprocess.TimeoutExpired,
+    stats: dict[str, Any] | None,
+    started: float,
+    output_path: str,
+) -> tuple[bool, str | None]:
+    _record_sandbox(stats, started, e.output, output_path)
+    return False, f"Превышено время ожидания исполнения ({SANDBOX_TIMEOUT} с)."
+
+
+def run_in_sandbox(
+    code: str,
+    task_id: int,
+    shard: int | None = None,
+    stats: dict[str, Any] | None = None,
+    output_path: str | None = None,
+    label: str | None = None,
+    inputs: list[str] | None = None,
+) -> tuple[bool, str | None]:
+    """Исполняет код в песочнице; в рабочую директорию ничего не пишется."""
+    output_path, job = _sandbox_job(code, task_id, shard, output_path, label, inputs)
+    started = time.monotonic()
+    try:
+        res = get_sandbox_backend().run(code, **job)
+        return _sandbox_outcome(res, stats, started, output_path)
+    except subprocess.TimeoutExpired as e:
+        return _sandbox_timeout(e, stats, started, output_path)
     except Exception as e:
         return False, str(e)
+
+
+async def arun_in_sandbox(
+    code: str,
+    task_id: int,
+    shard: int | None = None,
+    stats: dict[str, Any] | None = None,
+    output_path: str | None = None,
+    label: str | None = None,
+    inputs: list[str] | None = None,
+) -> tuple[bool, str | None]:
+    """Неблокирующий run_in_sandbox; отмена останавливает прерываемый запуск."""
+    output_path, job = _sandbox_job(code, task_id, shard, output_path, label, inputs)
+    started = time.monotonic()
+    try:
+        res = await get_sandbox_backend().arun(code, **job)
+        return _sandbox_outcome(res, stats, started, output_path)
+    except subprocess.TimeoutExpired as e:
+        return _sandbox_timeout(e, stats, started, output_path)
+    except Exception as e:
+        return False, str(e)
+
+
+def _is_slow(profile: dict[str, Any] | None) -> bool:
+    return bool(
+        profile
+        and profile.get("lines")
+        and profile.get("wall_ms", 0) > PERF_BUDGET_SECONDS * 1000
+    )
+
+
+def _candidate_code(
+    code: str | None, task_id: int, target_path: str
+) -> tuple[str | None, str | None]:
+    """Проверенный код кандидата, пишущий в target_path, или ошибка."""
+    if not code:
+        return None, "Gemini вернула пустой ответ."
+    is_safe, msg = is_code_safe_and_valid(code)
+    if not is_safe:
+        return None, msg
+    if result_path(task_id) not in code:
+        return None, "В коде нет команды сохранения результата."
+    return code.replace(result_path(task_id), target_path), None
+
+
+def _wall_ms(stats: dict[str, Any]) -> int | None:
+    """Время работы самого скрипта по отчёту исполнителя (без старта контейнера)."""
+    profile = stats.pop("profile", None)
+    if profile:
+        return int(profile["wall_ms"])
+    value = stats.get("sandbox_wall_ms")
+    return value if isinstance(value, int) else None
+
+
+def _adopt_candidate(
+    task_id: int, baseline_ms: int, candidate_ms: int | None
+) -> tuple[bool, str | None]:
+    """Заменяет результат кандидатом, если тот быстрее и даёт ту же схему."""
+    target, candidate = result_path(task_id), candidate_path(task_id)
+    try:
+        if candidate_ms is None or candidate_ms >= baseline_ms:
+            return False, "Новая версия не быстрее исходной."
+        if artifacts.schema(candidate) != artifacts.schema(target):
+            return False, "Новая версия изменила схему данных."
+        if artifacts.row_count(candidate) != artifacts.row_count(target):
+            return False, "Новая версия изменила число строк."
+        _replace_file(candidate, target)
+        return True, None
+    except Exception as e:
+        return False, f"Ошибка сравнения результатов: {e}"
+    finally:
+        _remove_file(candidate)
+
+
+def _optimization(
+    code: str,
+    task_id: int,
+    model_name: str,
+    profile: dict[str, Any],
+    attempts: list[dict[str, Any]],
+    source: str | None = None,
+) -> Steps[str]:
+    """Просит LLM ускорить горячие строки и возвращает код, который оставляем."""
+    stats = _new_attempt(attempts, "optimize", model_name)
+    optimized = yield _ask(
+        "optimize", _optimization_prompt(code, profile, task_id), model_name, stats
+    )
+    candidate, error_msg = _candidate_code(optimized, task_id, candidate_path(task_id))
+    if candidate is None:
+        _finish_attempt(stats, False, error_msg)
+        return code
+
+    success, error_msg = yield "run", {
+        "code": candidate,
+        "task_id": task_id,
+        "stats": stats,
+        "output_path": candidate_path(task_id),
+        "inputs": delta_inputs(optimized, source),
+    }
+    candidate_ms = _wall_ms(stats)
+    if success:
+        success, error_msg = yield "adopt", {
+            "task_id": task_id,
+            "baseline_ms": profile["wall_ms"],
+            "candidate_ms": candidate_ms,
+        }
+        if not success:
+            error_msg = CANDIDATE_REJECTED + (error_msg or "")
+    else:
+        _remove_file(candidate_path(task_id))
+    _finish_attempt(stats, success, error_msg)
+    return optimized if success and optimized else code
+
+
+def speculative_candidates(tier: str) -> int:
+    """Сколько черновиков запрашивать параллельно для тарифа пользователя."""
+    return SPECULATIVE_CANDIDATES if tier in SPECULATIVE_TIERS else 1
+
+
+def _speculative_slots(
+    task_id: int, model_name: str, candidates: int, attempts: list[dict[str, Any]]
+) -> list[dict[str, Any]]:
+    token = uuid.uuid4().hex[:8]
+    return [
+        {
+            "label": f"spec{i}-{token}",
+            "path": speculative_path(task_id, i),
+            "stats": _new_attempt(attempts, "speculate", model_name),
+            "code": None,
+        }
+        for i in range(candidates)
+    ]
+
+
+def _remove_when_done(path: str, future: Any) -> None:
+    _remove_file(path)
+
+
+def _speculative_attempt(
+    slot: dict[str, Any],
+    user_query: str,
+    task_id: int,
+    model_name: str,
+    cancelled: Callable[[], bool],
+) -> Steps[bool]:
+    """Один черновик: запрос к LLM и запуск, если никто ещё не победил."""
+    stats = slot["stats"]
+    slot["code"] = yield _ask(
+        "generate", _generation_prompt(user_query, task_id), model_name, stats
+    )
+    candidate, error_msg = _candidate_code(slot["code"], task_id, slot["path"])
+    success = False
+    if candidate is not None and cancelled():
+        error_msg = SPECULATION_CANCELLED
+    elif candidate is not None:
+        success, error_msg = yield "run", {
+            "code": candidate,
+            "task_id": task_id,
+            "stats": stats,
+            "output_path": slot["path"],
+            "label": slot["label"],
+        }
+    _finish_attempt(stats, success, error_msg)
+    return success
+
+
+def _finish_speculation(
+    task_id: int,
+    slots: list[dict[str, Any]],
+    winner: dict[str, Any] | None,
+    unfinished: list[dict[str, Any]],
+    attempts: list[dict[str, Any]],
+) -> tuple[bool, str | None, str | None, dict[str, Any] | None]:
+    """Итог спекуляции: (успех, код, ошибка, профиль).
+
+    Недоработавшие варианты записываются в телеметрию как отменённые, их
+    файлы удаляются по завершении. При неудаче возвращается первый непустой
+    вариант с его ошибкой — его исправляет следующая попытка.
+    """
+    for slot in unfinished:
+        snapshot = {**slot["stats"], "success": False, "error": SPECULATION_CANCELLED}
+        snapshot.pop("profile", None)
+        attempts[slot["stats"]["attempt"] - 1] = snapshot
+
+    finished = [slot for slot in slots if slot not in unfinished]
+    profiles = {slot["label"]: slot["stats"].pop("profile", None) for slot in finished}
+    for slot in finished:
+        if slot is not winner:
+            _remove_file(slot["path"])
+
+    if winner is not None:
+        _replace_file(winner["path"], result_path(task_id))
+        return True, winner["code"], None, profiles[winner["label"]]
+
+    for slot in finished:
+        if slot["code"]:
+            error = slot["stats"].get("error")
+            return False, slot["code"], error, profiles[slot["label"]]
+    return False, None, "Gemini вернула пустой ответ.", None
+
+
+def speculate(
+    user_query: str,
+    task_id: int,
+    model_name: str,
+    candidates: int,
+    attempts: list[dict[str, Any]],
+) -> tuple[bool, str | None, str | None, dict[str, Any] | None]:
+    """Запрашивает несколько черновиков сразу и исполняет их параллельно.
+
+    Побеждает первый успешно исполненный вариант. Контейнеры остальных
+    удаляются; в пуле они дорабатывают в фоне, а их файлы затем удаляются.
+    """
+    slots = _speculative_slots(task_id, model_name, candidates, attempts)
+    backend = get_sandbox_backend()
+    won = threading.Event()
+
+    def attempt(slot: dict[str, Any]) -> bool:
+        return _drive(
+            _speculative_attempt(slot, user_query, task_id, model_name, won.is_set)
+        )
+
+    executor = ThreadPoolExecutor(max_workers=candidates)
+    futures = {executor.submit(attempt, slot): slot for slot in slots}
+    winner = None
+    for future in as_completed(futures):
+        if future.result():
+            winner = futures[future]
+            won.set()
+            break
+
+    unfinished = []
+    for future, slot in futures.items():
+        if future.done():
+            continue
+        unfinished.append(slot)
+        if backend.interruptible:
+            backend.cancel(_container_name(task_id, slot["label"]))
+        future.add_done_callback(partial(_remove_when_done, slot["path"]))
+    executor.shutdown(wait=False)
+    return _finish_speculation(task_id, slots, winner, unfinished, attempts)
+
+
+async def aspeculate(
+    user_query: str,
+    task_id: int,
+    model_name: str,
+    candidates: int,
+    attempts: list[dict[str, Any]],
+) -> tuple[bool, str | None, str | None, dict[str, Any] | None]:
+    """Асинхронный speculate: проигравшие варианты отменяются."""
+    slots = _speculative_slots(task_id, model_name, candidates, attempts)
+    backend = get_sandbox_backend()
+
+    async def attempt(slot: dict[str, Any]) -> bool:
+        # проигравшие отменяются, поэтому проверять победителя не нужно
+        steps = _speculative_attempt(
+            slot, user_query, task_id, model_name, lambda: False
+        )
+        return await _adrive(steps)
+
+    tasks = {asyncio.create_task(attempt(slot)): slot for slot in slots}
+    winner = None
+    pending: set[asyncio.Task[bool]] = set(tasks)
+    while pending and winner is None:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        winner = next((tasks[task] for task in done if task.result()), None)
+
+    unfinished = [tasks[task] for task in pending]
+    for task in pending:
+        task.add_done_callback(partial(_remove_when_done, tasks[task]["path"]))
+        # запуск в пуле идёт в потоке и не прерывается, поэтому доработает в фоне
+        if backend.interruptible:
+            task.cancel()
+    if backend.interruptible:
+        await asyncio.gather(*pending, return_exceptions=True)
+    return _finish_speculation(task_id, slots, winner, unfinished, attempts)
+
+
+def _shard_plan(code: str) -> list[tuple[int, int]] | None:
+    total_rows = sharding.requested_rows(code)
+    if total_rows is None:
+        return None
+    shards = sharding.plan(total_rows)
+    return shards if len(shards) > 1 else None
+
+
+def _shard_codes(code: str, task_id: int, shards: list[tuple[int, int]]) -> list[str]:
+    return [
+        sharding.shard_code(
+            code,
+            i,
+            offset,
+            rows,
+            sharding.shard_seed(task_id, i),
+            result_path(task_id),
+            shard_path(task_id, i),
+        )
+        for i, (offset, rows) in enumerate(shards)
+    ]
+
+
+def _shard_workers(count: int) -> int:
+    """Сколько шардов запускать одновременно: не больше мест в пуле песочниц.
+
+    Лишний шард ждал бы свободный исполнитель до SANDBOX_TIMEOUT и ронял всю
+    задачу, поэтому остальные шарды идут по мере освобождения мест.
+    """
+    capacity = get_sandbox_backend().capacity
+    return max(1, min(count, capacity)) if capacity else count
+
+
+def _merge_shards(
+    task_id: int,
+    shards: list[tuple[int, int]],
+    results: list[tuple[bool, str | None]],
+) -> tuple[bool, str | None]:
+    paths = [shard_path(task_id, i) for i in range(len(shards))]
+    try:
+        for i, (success, error_msg) in enumerate(results):
+            if not success:
+                return False, f"Шард {i + 1}/{len(shards)}: {error_msg}"
+        offsets = [offset for offset, _ in shards]
+        id_columns = sharding.merge(paths, offsets, result_path(task_id))
+        _merge_summaries(paths, offsets, id_columns, result_path(task_id))
+        return _check_output(result_path(task_id))
+    except Exception as e:
+        return False, f"Ошибка склейки шардов: {e}"
     finally:
-        if os.path.exists(script_name):
-            os.remove(script_name)
+        for path in paths:
+            _remove_file(path)
+
+
+def _merge_summaries(
+    paths: list[str], offsets: list[int], id_columns: list[str], target: str
+) -> None:
+    """Профиль склеенного набора из профилей шардов (если они есть у всех)."""
+    profiles = []
+    for path in paths:
+        try:
+            with open(summary_path(path), encoding="utf-8") as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            _remove_summary(target)
+            return
+    with open(summary_path(target), "w", encoding="utf-8") as f:
+        json.dump(dataprofile.merge(profiles, offsets, id_columns), f)
+
+
+def _record_shards(
+    stats: dict[str, Any] | None,
+    started: float,
+    shard_stats: list[dict[str, Any]],
+    task_id: int,
+) -> None:
+    """Сводная телеметрия шардов: CPU суммируется, память — максимум по шардам."""
+    if stats is None:
+        return
+    cpu = [s["sandbox_cpu_ms"] for s in shard_stats if s.get("sandbox_cpu_ms")]
+    rss = [s["peak_rss_kb"] for s in shard_stats if s.get("peak_rss_kb")]
+    stats["sandbox_wall_ms"] = int((time.monotonic() - started) * 1000)
+    stats["sandbox_cpu_ms"] = sum(cpu) if cpu else None
+    stats["peak_rss_kb"] = max(rss) if rss else None
+    stats["shards"] = len(shard_stats)
+    if os.path.exists(result_path(task_id)):
+        stats["output_bytes"] = os.path.getsize(result_path(task_id))
+
+
+def execute(
+    code: str,
+    task_id: int,
+    stats: dict[str, Any] | None = None,
+    inputs: list[str] | None = None,
+) -> tuple[bool, str | None]:
+    """Запускает код в песочнице, большие наборы — параллельными шардами
+    (одновременно не больше, чем мест в пуле песочниц).
+
+    inputs — файлы прошлых результатов, доступные скрипту только для чтения
+    (см. delta_inputs); такой код преобразует готовые данные и не шардируется.
+    """
+    shards = None if inputs else _shard_plan(code)
+    if shards is None:
+        return run_in_sandbox(code, task_id, stats=stats, inputs=inputs)
+
+    print(f"Шардированный запуск: {len(shards)} шардов")
+    codes = _shard_codes(code, task_id, shards)
+    shard_stats: list[dict[str, Any]] = [{} for _ in shards]
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=_shard_workers(len(shards))) as executor:
+        results = list(
+            executor.map(
+                lambda i: run_in_sandbox(
+                    codes[i], task_id, shard=i, stats=shard_stats[i]
+                ),
+                range(len(shards)),
+            )
+        )
+    outcome = _merge_shards(task_id, shards, results)
+    _record_shards(stats, started, shard_stats, task_id)
+    return outcome
+
+
+async def aexecute(
+    code: str,
+    task_id: int,
+    stats: dict[str, Any] | None = None,
+    inputs: list[str] | None = None,
+) -> tuple[bool, str | None]:
+    """Асинхронный execute: шарды запускаются одновременно через asyncio
+    (не больше, чем мест в пуле песочниц)."""
+    shards = None if inputs else _shard_plan(code)
+    if shards is None:
+        return await arun_in_sandbox(code, task_id, stats=stats, inputs=inputs)
+
+    print(f"Шардированный запуск: {len(shards)} шардов")
+    codes = _shard_codes(code, task_id, shards)
+    shard_stats: list[dict[str, Any]] = [{} for _ in shards]
+    started = time.monotonic()
+    slots = asyncio.Semaphore(_shard_workers(len(shards)))
+
+    async def run_shard(i: int) -> tuple[bool, str | None]:
+        async with slots:
+            return await arun_in_sandbox(
+                codes[i], task_id, shard=i, stats=shard_stats[i]
+            )
+
+    results = await asyncio.gather(*(run_shard(i) for i in range(len(codes))))
+    outcome = await asyncio.to_thread(_merge_shards, task_id, shards, list(results))
+    _record_shards(stats, started, shard_stats, task_id)
+    return outcome
@@ -1,21 +1,125 @@
 import os
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, Generator
+from typing import Any
 
 from dotenv import load_dotenv
+from sqlalchemy import Engine, inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 load_dotenv()
 
 database_url = os.getenv("DATABASE_URL")
 if database_url is None:
     raise ValueError("DATABASE_URL is not set in .env file")
-engine = create_engine(database_url)
+
+# Пул соединений (для SQLite не применяется)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+
+_ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def async_database_url(url: str) -> str:
+    """URL с асинхронным драйвером: asyncpg для PostgreSQL, aiosqlite для SQLite."""
+    scheme, sep, rest = url.partition("://")
+    return _ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+
+def pool_options(url: str) -> dict[str, Any]:
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+# Синхронный движок — для воркеров и синхронных эндпоинтов (они идут в threadpool)
+engine = create_engine(database_url, **pool_options(database_url))
+# Асинхронный — для async-эндпоинтов и зависимостей авторизации
+async_engine = create_async_engine(
+    async_database_url(database_url), **pool_options(database_url)
+)
+
+
+def add_missing_columns(bind: Engine) -> list[str]:
+    """Добавляет в существующие таблицы новые nullable-колонки моделей.
+
+    create_all создаёт только отсутствующие таблицы, а миграций в проекте нет,
+    поэтому колонки вроде generationtask.data_profile в старой БД появляются
+    здесь через ALTER TABLE. Возвращает добавленные колонки (table.column).
+    """
+    existing_tables = set(inspect(bind).get_table_names())
+    preparer = bind.dialect.identifier_preparer
+    added = []
+    with bind.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            present = {c["name"] for c in inspect(conn).get_columns(table.name)}
+            for column in table.columns:
+                if column.name in present or not column.nullable:
+                    continue
+                conn.execute(
+                    text(
+                        f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN "
+                        f"{preparer.format_column(column)} "
+                        f"{column.type.compile(dialect=bind.dialect)}"
+                    )
+                )
+                added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def add_missing_indexes(bind: Engine) -> list[str]:
+    """Создаёт в существующих таблицах индексы моделей, которых там нет.
+
+    create_all не трогает уже созданные таблицы, а keyset-пагинация и выборки
+    задач пользователя и диалога опираются на составные индексы вроде
+    ix_generationtask_conversation_created. Возвращает имена созданных
+    индексов.
+    """
+    existing_tables = set(inspect(bind).get_table_names())
+    added = []
+    with bind.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            present = {i["name"] for i in inspect(conn).get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in present:
+                    continue
+                index.create(conn)
+                added.append(str(index.name))
+    return added
 
 
 def create_db_and_tables() -> None:
     SQLModel.metadata.create_all(engine)
+    for column in add_missing_columns(engine):
+        print(f"В таблицу добавлена колонка {column}")
+    for index in add_missing_indexes(engine):
+        print(f"Создан индекс {index}")
 
 
 def get_session() -> Generator[Session, None, None]:
     with Session(engine) as session:
         yield session
+
+
+async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+    # без expire_on_commit объекты после commit читаются без ленивых запросов
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
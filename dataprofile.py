@@ -0,0 +1,173 @@
+"""
+Профиль набора данных: типы, пропуски, диапазоны, частые значения и гистограммы.
+
+Профиль считается в песочнице сразу после скрипта, пока DataFrame ещё в
+памяти, и сохраняется в задаче, поэтому API не перечитывает набор. Модуль
+предустановлен в образе synthgen-env рядом с sandbox_runner.py. Профили
+шардов объединяются в один: счётчики складываются, среднее взвешивается,
+гистограммы перераспределяются по общему диапазону.
+"""
+
+import math
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+HISTOGRAM_BINS = 10
+TOP_VALUES = 5
+PREVIEW_ROWS = 5
+
+
+def _scalar(value: Any) -> Any:
+    """Значение, пригодное для JSON: без numpy-типов, NaN и Timestamp."""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, pd.Timestamp | np.datetime64):
+        return pd.Timestamp(value).isoformat()
+    if isinstance(value, float):
+        return round(value, 6) if math.isfinite(value) else None
+    if value is None or isinstance(value, bool | int | str):
+        return value
+    return str(value)
+
+
+def _is_numeric(series: pd.Series) -> bool:
+    return pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(
+        series
+    )
+
+
+def _column(series: pd.Series) -> dict[str, Any]:
+    values = series.dropna()
+    column: dict[str, Any] = {
+        "name": str(series.name),
+        "dtype": str(series.dtype),
+        "nulls": int(len(series) - len(values)),
+    }
+    if values.empty:
+        return column
+
+    if _is_numeric(series):
+        numbers = values.to_numpy(dtype=float)
+        numbers = numbers[np.isfinite(numbers)]
+        if len(numbers):
+            counts, edges = np.histogram(numbers, bins=HISTOGRAM_BINS)
+            column.update(
+                min=_scalar(numbers.min()),
+                max=_scalar(numbers.max()),
+                mean=_scalar(numbers.mean()),
+                histogram={
+                    "edges": [_scalar(edge) for edge in edges],
+                    "counts": counts.tolist(),
+                },
+            )
+    elif pd.api.types.is_datetime64_any_dtype(series):
+        column.update(min=_scalar(values.min()), max=_scalar(values.max()))
+    else:
+        counts = values.astype(str).value_counts()
+        column["unique"] = int(len(counts))
+        column["top"] = [
+            [value, int(count)] for value, count in counts.head(TOP_VALUES).items()
+        ]
+    return column
+
+
+def compute(df: pd.DataFrame) -> dict[str, Any]:
+    head = df.head(PREVIEW_ROWS).fillna("").astype(str)
+    return {
+        "rows": int(len(df)),
+        "columns": [_column(df[name]) for name in df.columns],
+        "preview": head.to_dict(orient="records"),
+    }
+
+
+def _shift(column: dict[str, Any], offset: int) -> dict[str, Any]:
+    """Профиль ID-колонки шарда после сдвига значений на offset."""
+    if not offset or "mean" not in column:
+        return column
+    shifted = {
+        **column,
+        "min": column["min"] + offset,
+        "max": column["max"] + offset,
+        "mean": column["mean"] + offset,
+    }
+    histogram = column["histogram"]
+    shifted["histogram"] = {
+        "edges": [edge + offset for edge in histogram["edges"]],
+        "counts": histogram["counts"],
+    }
+    return shifted
+
+
+def _merge_histograms(parts: list[dict[str, Any]], low: float, high: float):
+    edges = np.linspace(low, high, HISTOGRAM_BINS + 1)
+    counts = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+    for part in parts:
+        part_edges = np.asarray(part["edges"], dtype=float)
+        centers = (part_edges[:-1] + part_edges[1:]) / 2
+        index = np.clip(
+            np.searchsorted(edges, centers, side="right") - 1, 0, HISTOGRAM_BINS - 1
+        )
+        np.add.at(counts, index, part["counts"])
+    return {"edges": [_scalar(edge) for edge in edges], "counts": counts.tolist()}
+
+
+def _merge_column(parts: list[dict[str, Any]], rows: list[int]) -> dict[str, Any]:
+    merged: dict[str, Any] = {
+        "name": parts[0]["name"],
+        "dtype": parts[0]["dtype"],
+        "nulls": sum(part["nulls"] for part in parts),
+    }
+    filled = [part for part in parts if "min" in part]
+    if filled:
+        merged["min"] = min(part["min"] for part in filled)
+        merged["max"] = max(part["max"] for part in filled)
+    with_mean = [
+        (part, n - part["nulls"])
+        for part, n in zip(parts, rows, strict=True)
+        if "mean" in part
+    ]
+    weight = sum(n for _, n in with_mean)
+    if with_mean and weight:
+        merged["mean"] = _scalar(sum(p["mean"] * n for p, n in with_mean) / weight)
+        merged["histogram"] = _merge_histograms(
+            [part["histogram"] for part, _ in with_mean], merged["min"], merged["max"]
+        )
+    if any("top" in part for part in parts):
+        totals: dict[str, int] = {}
+        for part in parts:
+            for value, count in part.get("top", []):
+                totals[value] = totals.get(value, 0) + count
+        top = sorted(totals.items(), key=lambda item: -item[1])[:TOP_VALUES]
+        merged["top"] = [[value, count] for value, count in top]
+    if any("unique" in part for part in parts):
+        # одно значение может встречаться в нескольких шардах: точное число
+        # неизвестно, но оно не меньше максимума по шардам
+        merged["unique"] = max(part.get("unique", 0) for part in parts)
+    return merged
+
+
+def merge(
+    profiles: list[dict[str, Any]],
+    offsets: list[int],
+    shifted_columns: list[str],
+) -> dict[str, Any]:
+    """Профиль склеенного набора по профилям шардов.
+
+    shifted_columns — ID-колонки, сдвинутые при склейке на смещение шарда.
+    Частые значения приблизительны: у каждого шарда есть только его топ.
+    Число уникальных значений — нижняя граница (максимум по шардам).
+    """
+    columns = []
+    for i, first in enumerate(profiles[0]["columns"]):
+        parts = [
+            _shift(p["columns"][i], offset if first["name"] in shifted_columns else 0)
+            for p, offset in zip(profiles, offsets, strict=True)
+        ]
+        columns.append(_merge_column(parts, [p["rows"] for p in profiles]))
+    return {
+        "rows": sum(p["rows"] for p in profiles),
+        "columns": columns,
+        "preview": profiles[0]["preview"],
+    }
@@ -0,0 +1,211 @@
+"""
+Кэш сконвертированных файлов для /download.
+
+Готовый CSV/JSON/XLSX кладётся рядом с result_{id}.parquet и при следующих
+скачиваниях отдаётся прямо с диска. Общий объём ограничен
+EXPORT_CACHE_MAX_BYTES, при превышении удаляются давно не использованные файлы.
+
+Все форматы кодируются порциями по EXPORT_BATCH_ROWS строк, которые читаются
+из Parquet по очереди: при первом скачивании файл отдаётся клиенту по мере
+кодирования и параллельно записывается в кэш. XLSX пишет xlsxstream, длинные
+наборы делятся на листы по пределу строк Excel.
+
+Кодирование детерминировано, поэтому ETag выгрузки считается по исходному
+файлу и формату: он известен до конвертации и не меняется, когда файл кэша
+пересобирается.
+"""
+
+import codecs
+import glob
+import hashlib
+import itertools
+import os
+import re
+import threading
+import uuid
+from collections.abc import Callable, Iterable, Iterator
+
+import pandas as pd
+
+import artifacts
+from core import STORAGE_DIR
+from xlsxstream import iter_xlsx
+
+EXPORT_CACHE_MAX_BYTES = int(os.getenv("EXPORT_CACHE_MAX_BYTES", 1024**3))
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", 50_000))
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "json": "application/json",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+_quota_lock = threading.Lock()
+# имя файла кэша выгрузки, см. export_path
+_EXPORT_NAME = re.compile(rf"result_\d+\.({'|'.join(MEDIA_TYPES)})")
+
+
+def export_path(task_id: int, fmt: str) -> str:
+    return os.path.join(STORAGE_DIR, f"result_{task_id}.{fmt}")
+
+
+def etag(source_path: str, fmt: str) -> str:
+    """Сильный ETag выгрузки: путь, размер и mtime исходного файла и формат."""
+    stat = os.stat(source_path)
+    base = f"{source_path}:{stat.st_size}:{stat.st_mtime_ns}:{fmt}"
+    return f'"{hashlib.sha256(base.encode()).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: str | None, current: str) -> bool:
+    """Совпадает ли If-None-Match с ETag (слабое сравнение, как в RFC 9110)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return current in tags
+
+
+def _tmp_path(task_id: int, fmt: str) -> str:
+    return os.path.join(STORAGE_DIR, f".tmp_{task_id}_{uuid.uuid4().hex}.{fmt}")
+
+
+def iter_csv(frames: Iterable[pd.DataFrame]) -> Iterator[bytes]:
+    for i, frame in enumerate(frames):
+        chunk = frame.to_csv(index=False, header=i == 0).encode("utf-8")
+        yield codecs.BOM_UTF8 + chunk if i == 0 else chunk
+
+
+def iter_json(frames: Iterable[pd.DataFrame]) -> Iterator[bytes]:
+    """JSON-массив записей в том же виде, что и to_json(orient="records", indent=4)."""
+    first = True
+    for frame in frames:
+        if frame.empty:
+            continue
+        text = frame.to_json(orient="records", force_ascii=False, indent=4)
+        body = text[1:-1].strip("\n")
+        yield ("[\n" + body if first else ",\n" + body).encode("utf-8")
+        first = False
+    yield b"[]" if first else b"\n]"
+
+
+ENCODERS: dict[str, Callable[[Iterable[pd.DataFrame]], Iterator[bytes]]] = {
+    "csv": iter_csv,
+    "json": iter_json,
+    "xlsx": iter_xlsx,
+}
+
+
+def _write(source_path: str, target_path: str, fmt: str) -> None:
+    with open(target_path, "wb") as f:
+        for chunk in ENCODERS[fmt](
+            artifacts.iter_frames(source_path, EXPORT_BATCH_ROWS)
+        ):
+            f.write(chunk)
+
+
+def cached_export(task_id: int, source_path: str, fmt: str) -> str | None:
+    """Путь к актуальному файлу из кэша или None."""
+    path = export_path(task_id, fmt)
+    try:
+        if os.path.getmtime(path) < os.path.getmtime(source_path):
+            return None
+        # mtime служит отметкой последнего использования для LRU
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+
+def get_export(task_id: int, source_path: str, fmt: str) -> str:
+    """Возвращает путь к файлу в формате fmt, при необходимости создаёт его."""
+    if fmt not in MEDIA_TYPES:
+        raise ValueError(f"Unsupported format: {fmt}")
+
+    path = cached_export(task_id, source_path, fmt)
+    if path:
+        return path
+
+    path = export_path(task_id, fmt)
+    tmp_path = _tmp_path(task_id, fmt)
+    try:
+        _write(source_path, tmp_path, fmt)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    enforce_quota(keep=path)
+    return path
+
+
+def stream_export(task_id: int, source_path: str, fmt: str) -> Iterator[bytes]:
+    """Отдаёт файл порциями и одновременно сохраняет его в кэш.
+
+    Если клиент оборвал скачивание, недописанный файл в кэш не попадает.
+    """
+    path = export_path(task_id, fmt)
+    tmp_path = _tmp_path(task_id, fmt)
+    frames = artifacts.iter_frames(source_path, EXPORT_BATCH_ROWS)
+    try:
+        with open(tmp_path, "wb") as f:
+            for chunk in ENCODERS[fmt](frames):
+                f.write(chunk)
+                yield chunk
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    enforce_quota(keep=path)
+
+
+def open_stream(task_id: int, source_path: str, fmt: str) -> Iterator[bytes]:
+    """Готовит stream_export, сразу читая первую порцию.
+
+    Так ошибки чтения файла всплывают до отправки заголовков ответа.
+    """
+    stream = stream_export(task_id, source_path, fmt)
+    first = next(stream)
+    return itertools.chain([first], stream)
+
+
+def _cached_files() -> list[str]:
+    """Только файлы вида result_{id}.{fmt}: под тот же glob попадают профили
+    наборов (result_{id}.parquet.summary.json), которые вытеснять нельзя."""
+    files: list[str] = []
+    for fmt in MEDIA_TYPES:
+        for path in glob.glob(os.path.join(STORAGE_DIR, f"result_*.{fmt}")):
+            if _EXPORT_NAME.fullmatch(os.path.basename(path)):
+                files.append(path)
+    return files
+
+
+def enforce_quota(keep: str | None = None) -> None:
+    with _quota_lock:
+        entries = []
+        for path in _cached_files():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= EXPORT_CACHE_MAX_BYTES:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def invalidate(task_id: int) -> None:
+    for fmt in MEDIA_TYPES:
+        try:
+            os.remove(export_path(task_id, fmt))
+        except FileNotFoundError:
+            pass
@@ -1,30 +1,58 @@
-import io
+import asyncio
 import os
 import secrets
-from datetime import datetime, timedelta
 from typing import Any
 
-import pandas as pd
 import redis.asyncio as redis
-from fastapi import BackgroundTasks, Depends, FastAPI, HTTPException, status
+from fastapi import (
+    BackgroundTasks,
+    Depends,
+    FastAPI,
+    Header,
+    HTTPException,
+    Query,
+    status,
+)
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi_limiter import FastAPILimiter
 from fastapi_limiter.depends import RateLimiter
-from sqlalchemy import func
-from sqlmodel import Session, desc, select
-
+from redis.exceptions import RedisError
+from sqlmodel import Session, col, desc, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import artifacts
+import exports
+import pagination
+import progress
+import quota
+import routing
 from auth import (
+    API_KEY_PREFIX,
     create_access_token,
     get_current_user,
     get_current_user_or_api_key,
     get_password_hash,
+    invalidate_api_key,
     verify_password,
 )
-from core import generate_and_run
-from database import create_db_and_tables, engine, get_session
-from models import APIKey, Conversation, GenerateRequest, GenerationTask, User
+from core import speculative_candidates
+from database import create_db_and_tables, get_async_session, get_session
+from models import (
+    APIKey,
+    Conversation,
+    GenerateRequest,
+    GenerationAttempt,
+    GenerationTask,
+    TaskSummary,
+    User,
+)
+from task_queue import REDIS_URL, enqueue
+from worker import run_generation_wrapper
+
+# redis — очередь для воркеров (worker.py), background — выполнение в процессе API
+TASK_QUEUE = os.getenv("TASK_QUEUE", "redis")
 
 app = FastAPI(title="AIrelav API")
 
@@ -34,6 +62,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[pagination.NEXT_CURSOR_HEADER, "ETag", "Content-Range"],
 )
 
 
@@ -41,15 +70,10 @@ async def get_user_tier_limit(
     current_user: User = Depends(get_current_user_or_api_key),
 ) -> tuple[int, int]:
     """
-    Возвращает (количество_запросов, секунд).
-    Например: (5, 60) = 5 запросов в минуту.
+    Возвращает (количество_запросов, секунд) для самого короткого окна тарифа.
+    Например: (5, 60) = 5 запросов в минуту. Все окна см. в quota.TIER_QUOTAS.
     """
-    if current_user.tier == "pro":
-        return 50, 60  # Pro: 50 запросов в минуту
-    elif current_user.tier == "enterprise":
-        return 1000, 60  # Enterprise: почти безлимит
-    else:
-        return 10, 60  # Free: 10 запросов в минуту
+    return min(quota.tier_quotas(current_user.tier), key=lambda q: q[1])
 
 
 @app.on_event("startup")
@@ -57,8 +81,9 @@ async def on_startup() -> None:
     create_db_and_tables()
 
     redis_connection = redis.from_url(
-        "redis://localhost:6379", encoding="utf-8", decode_responses=True
+        REDIS_URL, encoding="utf-8", decode_responses=True
     )
+    app.state.redis = redis_connection
     await FastAPILimiter.init(redis_connection)
 
 
@@ -96,129 +121,170 @@ def login(
 
 @app.get("/conversations")
 async def get_conversations(
-    offset: int = 0,
-    limit: int = 20,
+    response: Response,
+    cursor: str | None = None,
+    limit: int = Query(20, ge=1, le=100),
     current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ) -> Any:
-    return session.exec(
-        select(Conversation)
-        .where(Conversation.user_id == current_user.id)
-        .order_by(desc(Conversation.created_at))
-        .offset(offset)
-        .limit(limit)
-    ).all()
+    """Диалоги от новых к старым. Курсор следующей страницы — в X-Next-Cursor"""
+    query = select(Conversation).where(Conversation.user_id == current_user.id)
+    result = await session.exec(
+        pagination.paginate(
+            query, Conversation.created_at, Conversation.id, cursor, limit
+        )
+    )
+    return pagination.page(result.all(), limit, response)
 
 
-@app.get("/conversations/{conversation_id}")
+@app.get("/conversations/{conversation_id}", response_model=list[TaskSummary])
 async def get_conversation_history(
     conversation_id: int,
+    response: Response,
+    cursor: str | None = None,
+    limit: int = Query(50, ge=1, le=200),
     current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ) -> Any:
-    chat = session.get(Conversation, conversation_id)
+    """Краткая история задач диалога. Код и превью — в /tasks/{id} и /tasks/{id}/code"""
+    chat = await session.get(Conversation, conversation_id)
     if not chat or chat.user_id != current_user.id:
         raise HTTPException(status_code=404, detail="Chat not found")
 
-    tasks = session.exec(
-        select(GenerationTask)
-        .where(GenerationTask.conversation_id == conversation_id)
-        .order_by(desc(GenerationTask.created_at))
-    ).all()
-    return tasks
+    columns = [getattr(GenerationTask, name) for name in TaskSummary.model_fields]
+    query = select(*columns).where(GenerationTask.conversation_id == conversation_id)
+    result = await session.exec(
+        pagination.paginate(
+            query, GenerationTask.created_at, GenerationTask.id, cursor, limit
+        )
+    )
+    return [row._asdict() for row in pagination.page(result.all(), limit, response)]
 
 
 @app.delete("/history/{conversation_id}")
 async def delete_conversation(
     conversation_id: int,
     current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ) -> dict[str, Any]:
-    chat = session.get(Conversation, conversation_id)
+    chat = await session.get(Conversation, conversation_id)
     if not chat or chat.user_id != current_user.id:
         raise HTTPException(status_code=404, detail="Chat not found")
 
-    tasks = session.exec(
+    result = await session.exec(
         select(GenerationTask).where(GenerationTask.conversation_id == conversation_id)
-    ).all()
-    for task in tasks:
+    )
+    for task in result.all():
         if task.file_path and os.path.exists(task.file_path):
             try:
                 os.remove(task.file_path)
             except OSError:
                 pass
+        if task.id is not None:
+            exports.invalidate(task.id)
 
-    session.delete(chat)
-    session.commit()
+    await session.delete(chat)
+    await session.commit()
     return {"message": "Conversation deleted"}
 
 
+async def acquire_quota(user: User, session: AsyncSession) -> str | None:
+    """Списывает генерацию из квоты тарифа или отвечает 429.
+
+    Если Redis недоступен, суточный лимит проверяется по БД.
+    """
+    try:
+        try:
+            return await quota.acquire(app.state.redis, user, session)
+        except RedisError:
+            await quota.check_in_db(user, session)
+            return None
+    except quota.QuotaExceededError as e:
+        raise HTTPException(status_code=429, detail=str(e)) from e
+
+
 @app.post("/generate", dependencies=[Depends(RateLimiter(times=20, seconds=60))])
 async def start_generation(
     request: GenerateRequest,
     background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user_or_api_key),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ) -> dict[str, Any]:
 
-    if current_user.tier == "free":
-        one_day_ago = datetime.utcnow() - timedelta(days=1)
-        count: int = session.exec(
-            select(func.count())
-            .select_from(GenerationTask)
-            .where(GenerationTask.user_id == current_user.id)
-            .where(GenerationTask.created_at > one_day_ago)
-        ).one()
-
-        if count >= 10:
-            raise HTTPException(
-                status_code=429,
-                detail="Лимит тарифа Free исчерпан (10 генераций в сутки).",
-            )
-
     previous_code = None
+    previous_file = None
 
     prompt = request.prompt
     model = request.model
     conversation_id = request.conversation_id
 
-    if not conversation_id:
-        title = prompt[:40] + "..." if len(prompt) > 40 else prompt
-        new_chat = Conversation(title=title, user_id=current_user.id)
-        session.add(new_chat)
-        session.commit()
-        session.refresh(new_chat)
-        conversation_id = new_chat.id
-    else:
-        chat = session.get(Conversation, conversation_id)
+    if conversation_id:
+        chat = await session.get(Conversation, conversation_id)
         if not chat or chat.user_id != current_user.id:
             raise HTTPException(status_code=404, detail="Conversation not found")
 
-        last_task = session.exec(
-            select(GenerationTask)
-            .where(GenerationTask.conversation_id == conversation_id)
-            .where(GenerationTask.status == "completed")
-            .order_by(desc(GenerationTask.created_at))
-        ).first()
-
-        if last_task:
-            previous_code = last_task.generated_code
-
-    task = GenerationTask(
-        prompt=prompt,
-        file_format="pkl",
-        user_id=current_user.id,
-        conversation_id=conversation_id,
-        ai_model=model,
-    )
-    session.add(task)
-    session.commit()
-    session.refresh(task)
+    quota_member = await acquire_quota(current_user, session)
+    try:
+        if not conversation_id:
+            title = prompt[:40] + "..." if len(prompt) > 40 else prompt
+            new_chat = Conversation(title=title, user_id=current_user.id)
+            session.add(new_chat)
+            await session.commit()
+            await session.refresh(new_chat)
+            conversation_id = new_chat.id
+        else:
+            result = await session.exec(
+                select(GenerationTask)
+                .where(GenerationTask.conversation_id == conversation_id)
+                .where(GenerationTask.status == "completed")
+                .order_by(desc(GenerationTask.created_at))
+            )
+            last_task = result.first()
+
+            if last_task:
+                previous_code = last_task.generated_code
+                previous_file = last_task.file_path
+
+        task = GenerationTask(
+            prompt=prompt,
+            file_format="parquet",
+            user_id=current_user.id,
+            conversation_id=conversation_id,
+            ai_model=model,
+        )
+        session.add(task)
+        await session.commit()
+        await session.refresh(task)
+    except Exception:
+        if quota_member:
+            await quota.release(app.state.redis, current_user, quota_member)
+        raise
 
     if task.id is None:
         raise HTTPException(status_code=500, detail="Database error: Task ID missing")
 
-    background_tasks.add_task(run_generation_wrapper, task.id, previous_code, model)
+    candidates = speculative_candidates(current_user.tier)
+
+    if TASK_QUEUE == "redis":
+        await enqueue(
+            app.state.redis,
+            task.id,
+            {
+                "previous_code": previous_code,
+                "previous_file": previous_file,
+                "model_name": model,
+                "candidates": candidates,
+            },
+        )
+    else:
+        background_tasks.add_task(
+            run_generation_wrapper,
+            task.id,
+            previous_code,
+            model,
+            candidates,
+            previous_file,
+        )
 
     return {
         "task_id": task.id,
@@ -231,7 +297,7 @@ async def start_generation(
 def get_api_keys(
     user: User = Depends(get_current_user), session: Session = Depends(get_session)
 ):
-    return user.api_keys
+    return session.exec(select(APIKey).where(APIKey.user_id == user.id)).all()
 
 
 @app.post("/api-keys")
@@ -241,7 +307,7 @@ def create_api_key(
     session: Session = Depends(get_session),
 ):
     random_part = secrets.token_urlsafe(16)
-    new_key_str = f"sk-relav-{random_part}"
+    new_key_str = f"{API_KEY_PREFIX}{random_part}"
 
     key_obj = APIKey(name=name, key=new_key_str, user_id=user.id)
     session.add(key_obj)
@@ -251,17 +317,18 @@ def create_api_key(
 
 
 @app.delete("/api-keys/{key_id}")
-def delete_api_key(
+async def delete_api_key(
     key_id: int,
     user: User = Depends(get_current_user),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
-    key = session.get(APIKey, key_id)
+    key = await session.get(APIKey, key_id)
     if not key or key.user_id != user.id:
         raise HTTPException(status_code=404, detail="Key not found")
 
-    session.delete(key)
-    session.commit()
+    await session.delete(key)
+    await session.commit()
+    await invalidate_api_key(key.key)
     return {"message": "Key deleted"}
 
 
@@ -282,11 +349,18 @@ def delete_api_key(
 async def download_file(
     task_id: int,
     format: str = "csv",
+    if_none_match: str | None = Header(None),
+    range_header: str | None = Header(None, alias="range"),
     current_user: User = Depends(get_current_user_or_api_key),
-    session: Session = Depends(get_session),
-) -> StreamingResponse:
-    """Скачивание файла с конвертацией (Только для владельца)"""
-    task = session.get(GenerationTask, task_id)
+    session: AsyncSession = Depends(get_async_session),
+) -> Response:
+    """Скачивание файла с конвертацией (Только для владельца).
+
+    ETag зависит от набора и формата: при совпадении If-None-Match отдаётся 304.
+    Range (и If-Range) обслуживается по готовому файлу: при докачке без кэша
+    файл сначала собирается целиком.
+    """
+    task = await session.get(GenerationTask, task_id)
 
     if not task or not task.file_path or not os.path.exists(task.file_path):
         raise HTTPException(status_code=404, detail="Файл данных не найден")
@@ -294,104 +368,58 @@ async def download_file(
     if task.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Нет доступа к этому файлу")
 
+    if format not in exports.MEDIA_TYPES:
+        raise HTTPException(
+            status_code=400, detail="Unsupported format: use csv, json, or xlsx"
+        )
+
+    media_type = exports.MEDIA_TYPES[format]
+    filename = f"dataset_{task_id}.{format}"
+    # соединение возвращается в пул до отдачи файла, а не после
+    await session.close()
+
+    etag = exports.etag(task.file_path, format)
+    if exports.etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    path = exports.cached_export(task_id, task.file_path, format)
     try:
-        df = pd.read_pickle(task.file_path)
-        stream = io.BytesIO()
-
-        if format == "csv":
-            df.to_csv(stream, index=False, encoding="utf-8-sig")
-            media_type = "text/csv"
-            filename = f"dataset_{task_id}.csv"
-        elif format == "json":
-            df.to_json(stream, orient="records", force_ascii=False, indent=4)
-            media_type = "application/json"
-            filename = f"dataset_{task_id}.json"
-        elif format == "xlsx":
-            df.to_excel(stream, index=False)
-            media_type = (
-                "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        if path is None and range_header:
+            path = await asyncio.to_thread(
+                exports.get_export, task_id, task.file_path, format
             )
-            filename = f"dataset_{task_id}.xlsx"
-        else:
-            raise HTTPException(
-                status_code=400, detail="Unsupported format: use csv, json, or xlsx"
+        if path is None:
+            stream = await asyncio.to_thread(
+                exports.open_stream, task_id, task.file_path, format
             )
-
-        stream.seek(0)
-        return StreamingResponse(
-            stream,
-            media_type=media_type,
-            headers={"Content-Disposition": f"attachment; filename={filename}"},
-        )
-
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Ошибка конвертации: {str(e)}"
         ) from e
 
-
-def run_generation_wrapper(
-    task_id: int, previous_code: str | None = None, model_name: str = "gemini-2.5-flash"
-) -> None:
-    with Session(engine) as session:
-        task = session.get(GenerationTask, task_id)
-        if not task:
-            return
-
-        task_local: GenerationTask = task
-
-        def update_progress(msg: str, percent: int) -> None:
-            task_local.status_message = msg
-            task_local.progress = percent
-            session.add(task_local)
-            session.commit()
-
-        try:
-            task.status = "processing"
-            session.add(task)
-            session.commit()
-
-            result = generate_and_run(
-                user_query=task.prompt,
-                task_id=task_id,
-                previous_code=previous_code,
-                on_progress=update_progress,
-                model_name=model_name,
-            )
-
-            if result["status"] == "success":
-                task.status = "completed"
-                task.file_path = result["file"]
-                task.generated_code = result["code"]
-                task.preview_data = result.get("preview")
-                task.file_size = result.get("file_size")
-                task.row_count = result.get("row_count")
-                task.progress = 100
-            else:
-                task.status = "failed"
-                task.error_log = result["message"]
-
-            session.add(task)
-            session.commit()
-
-        except Exception as e:
-            session.rollback()
-            task = session.get(GenerationTask, task_id)
-            if task:
-                task.status = "failed"
-                task.error_log = f"Critical Error: {str(e)}"
-                session.add(task)
-                session.commit()
+    if path:
+        # FileResponse сам выставляет Content-Length и обрабатывает Range
+        return FileResponse(
+            path, media_type=media_type, filename=filename, headers={"ETag": etag}
+        )
+    return StreamingResponse(
+        stream,
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            "ETag": etag,
+        },
+    )
 
 
 @app.get("/tasks/{task_id}")
-def get_task_status(
+async def get_task_status(
     task_id: int,
     current_user: User = Depends(get_current_user_or_api_key),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ) -> Any:
     """Проверка статуса конкретной задачи"""
-    task = session.get(GenerationTask, task_id)
+    task = await session.get(GenerationTask, task_id)
 
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
@@ -399,11 +427,214 @@ def get_task_status(
     if task.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to view this task")
 
+    task_progress, status_message = task.progress, task.status_message
+    if task.status == "processing":
+        snapshot = (await progress.alatest(app.state.redis, [task_id])).get(task_id)
+        if snapshot and snapshot["status"] == "processing":
+            task_progress, status_message = snapshot["progress"], snapshot["message"]
+
     return {
         "id": task.id,
         "status": task.status,
-        "progress": task.progress,
-        "status_message": task.status_message,
+        "progress": task_progress,
+        "status_message": status_message,
         "preview_data": task.preview_data,
+        "file_size": task.file_size,
+        "row_count": task.row_count,
         "error_log": task.error_log,
     }
+
+
+@app.get("/tasks/{task_id}/code")
+async def get_task_code(
+    task_id: int,
+    current_user: User = Depends(get_current_user_or_api_key),
+    session: AsyncSession = Depends(get_async_session),
+) -> dict[str, Any]:
+    """Сгенерированный код задачи (загружается по запросу, а не в истории)"""
+    result = await session.exec(
+        select(GenerationTask.user_id, GenerationTask.generated_code).where(
+            GenerationTask.id == task_id
+        )
+    )
+    row = result.first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    owner_id, code = row
+    if owner_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to view this task")
+    return {"id": task_id, "generated_code": code}
+
+
+@app.get("/tasks/{task_id}/profile")
+async def get_task_profile(
+    task_id: int,
+    current_user: User = Depends(get_current_user_or_api_key),
+    session: AsyncSession = Depends(get_async_session),
+) -> dict[str, Any]:
+    """Профиль набора, посчитанный в песочнице при генерации"""
+    result = await session.exec(
+        select(GenerationTask.user_id, GenerationTask.data_profile).where(
+            GenerationTask.id == task_id
+        )
+    )
+    row = result.first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    owner_id, profile = row
+    if owner_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to view this task")
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Профиль набора не найден")
+    return {"id": task_id, **profile}
+
+
+@app.get("/tasks/{task_id}/rows")
+async def get_task_rows(
+    task_id: int,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    columns: str | None = None,
+    filters: list[str] = Query([], alias="filter"),
+    sort: str | None = None,
+    current_user: User = Depends(get_current_user_or_api_key),
+    session: AsyncSession = Depends(get_async_session),
+) -> dict[str, Any]:
+    """Страница строк набора: columns=a,b, filter=age>=30 (повторяемый), sort=-age"""
+    task = await session.get(GenerationTask, task_id)
+
+    if not task or not task.file_path or not os.path.exists(task.file_path):
+        raise HTTPException(status_code=404, detail="Файл данных не найден")
+
+    if task.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Нет доступа к этому файлу")
+
+    file_path = task.file_path
+    await session.close()
+
+    names = [name.strip() for name in columns.split(",")] if columns else None
+    try:
+        page, total = await asyncio.to_thread(
+            artifacts.read_rows, file_path, offset, limit, names, filters, sort
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+    return {
+        "id": task_id,
+        "offset": offset,
+        "limit": limit,
+        "total": total,
+        "columns": page.column_names,
+        "rows": artifacts.records(page),
+    }
+
+
+@app.get("/tasks/{task_id}/attempts")
+async def get_task_attempts(
+    task_id: int,
+    current_user: User = Depends(get_current_user_or_api_key),
+    session: AsyncSession = Depends(get_async_session),
+) -> Any:
+    """Телеметрия попыток: задержка и токены LLM, время, CPU и память песочницы"""
+    task = await session.get(GenerationTask, task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if task.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to view this task")
+
+    result = await session.exec(
+        select(GenerationAttempt)
+        .where(GenerationAttempt.task_id == task_id)
+        .order_by(col(GenerationAttempt.attempt))
+    )
+    return result.all()
+
+
+@app.get("/models/stats")
+def get_model_stats(
+    current_user: User = Depends(get_current_user_or_api_key),
+) -> dict[str, Any]:
+    """Скользящая статистика каскада моделей по категориям промптов"""
+    categories = [*routing.CATEGORIES, "general"]
+    return {
+        "cascade": routing.MODEL_CASCADE,
+        "categories": {name: routing.model_stats(name) for name in categories},
+    }
+
+
+def task_event(task: GenerationTask) -> dict[str, Any]:
+    return {
+        "task_id": task.id,
+        "conversation_id": task.conversation_id,
+        "status": task.status,
+        "progress": task.progress,
+        "message": task.error_log if task.status == "failed" else task.status_message,
+    }
+
+
+@app.get("/tasks/{task_id}/events")
+async def task_events(
+    task_id: int,
+    current_user: User = Depends(get_current_user_or_api_key),
+    session: AsyncSession = Depends(get_async_session),
+) -> StreamingResponse:
+    """Поток прогресса задачи (Server-Sent Events), закрывается по завершении"""
+    task = await session.get(GenerationTask, task_id)
+
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    if task.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to view this task")
+
+    # подписка до чтения снимка, чтобы не пропустить событие между ними
+    pubsub = await progress.subscribe(app.state.redis, progress.task_channel(task_id))
+    event = task_event(task)
+    if task.status == "processing":
+        snapshots = await progress.alatest(app.state.redis, [task_id])
+        event = snapshots.get(task_id, event)
+    # поток может идти минутами, соединение с БД ему не нужно
+    await session.close()
+
+    return StreamingResponse(
+        progress.sse_stream(pubsub, [event], until_final=True),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+@app.get("/conversations/{conversation_id}/events")
+async def conversation_events(
+    conversation_id: int,
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session),
+) -> StreamingResponse:
+    """Поток прогресса всех задач диалога (Server-Sent Events)"""
+    chat = await session.get(Conversation, conversation_id)
+    if not chat or chat.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Chat not found")
+
+    pubsub = await progress.subscribe(
+        app.state.redis, progress.conversation_channel(conversation_id)
+    )
+    result = await session.exec(
+        select(GenerationTask)
+        .where(GenerationTask.conversation_id == conversation_id)
+        .where(col(GenerationTask.status).in_(["pending", "processing"]))
+    )
+    tasks = result.all()
+    # снимки всех активных задач диалога — одним запросом к Redis
+    snapshots = await progress.alatest(
+        app.state.redis, [t.id for t in tasks if t.id is not None]
+    )
+    initial = [
+        snapshots.get(t.id, task_event(t)) if t.id else task_event(t) for t in tasks
+    ]
+    await session.close()
+
+    return StreamingResponse(
+        progress.sse_stream(pubsub, initial, until_final=False),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
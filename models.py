@@ -2,17 +2,33 @@ from datetime import datetime
 from typing import Any
 
 from pydantic import BaseModel
-from sqlalchemy import JSON, Column
+from sqlalchemy import JSON, Column, Index
 from sqlmodel import Field, Relationship, SQLModel
 
 
 class GenerateRequest(BaseModel):
     prompt: str
-    model: str = "gemini-2.0-flash"
+    # auto — модель выбирает каскад (routing.py)
+    model: str = "auto"
     conversation_id: int | None = None
     parent_task_id: int | None = None
 
 
+class TaskSummary(BaseModel):
+    """Задача в истории диалога без кода, превью и лога ошибки."""
+
+    id: int
+    prompt: str
+    status: str
+    progress: int
+    status_message: str
+    file_size: int | None = None
+    row_count: int | None = None
+    ai_model: str
+    created_at: datetime
+    conversation_id: int | None = None
+
+
 class User(SQLModel, table=True):
     id: int | None = Field(default=None, primary_key=True)
     email: str = Field(unique=True, index=True)
@@ -27,6 +43,10 @@ class User(SQLModel, table=True):
 
 
 class Conversation(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_conversation_user_created", "user_id", "created_at", "id"),
+    )
+
     id: int | None = Field(default=None, primary_key=True)
     title: str
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -38,6 +58,16 @@ class Conversation(SQLModel, table=True):
 
 
 class GenerationTask(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_generationtask_user_created", "user_id", "created_at"),
+        Index(
+            "ix_generationtask_conversation_created",
+            "conversation_id",
+            "created_at",
+            "id",
+        ),
+    )
+
     id: int | None = Field(default=None, primary_key=True)
     prompt: str
     file_format: str
@@ -52,6 +82,8 @@ class GenerationTask(SQLModel, table=True):
     preview_data: list[dict[str, Any]] | None = Field(
         default=None, sa_column=Column(JSON)
     )
+    # профиль набора (dataprofile): типы, пропуски, диапазоны, гистограммы
+    data_profile: dict[str, Any] | None = Field(default=None, sa_column=Column(JSON))
 
     file_size: int | None = None
     row_count: int | None = None
@@ -76,3 +108,27 @@ class APIKey(SQLModel, table=True):
 
     user_id: int | None = Field(default=None, foreign_key="user.id")
     user: User | None = Relationship(back_populates="api_keys")
+
+
+class GenerationAttempt(SQLModel, table=True):
+    """Телеметрия одной попытки генерации: запрос к LLM и запуск в песочнице."""
+
+    id: int | None = Field(default=None, primary_key=True)
+    task_id: int = Field(foreign_key="generationtask.id", index=True)
+    attempt: int
+    kind: str  # cache, generate, speculate, modify, delta, fix, optimize
+    model: str
+    success: bool = False
+    error: str | None = None
+
+    llm_latency_ms: int | None = None
+    prompt_tokens: int | None = None
+    output_tokens: int | None = None
+
+    sandbox_wall_ms: int | None = None
+    sandbox_cpu_ms: int | None = None
+    peak_rss_kb: int | None = None
+    output_bytes: int | None = None
+    shards: int | None = None
+
+    created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,55 @@
+"""
+Keyset-пагинация по (created_at, id) от новых к старым.
+
+Курсор — непрозрачная строка с created_at и id последней записи страницы.
+Следующая страница выбирается условием (created_at, id) < курсора, поэтому
+запрос идёт по составному индексу и не зависит от глубины страницы, в
+отличие от OFFSET.
+"""
+
+import base64
+import binascii
+from collections.abc import Sequence
+from datetime import datetime
+from typing import Any
+
+from fastapi import HTTPException, Response
+from sqlalchemy import literal, tuple_
+from sqlmodel import col
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.split("|")
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from e
+
+
+def paginate(query: Any, created_at: Any, row_id: Any, cursor: str | None, limit: int):
+    """Добавляет к запросу условие курсора, сортировку и лимит."""
+    if cursor:
+        last_created_at, last_id = decode_cursor(cursor)
+        query = query.where(
+            tuple_(col(created_at), col(row_id))
+            < tuple_(literal(last_created_at), literal(last_id))
+        )
+    # одна лишняя запись показывает, есть ли следующая страница
+    return query.order_by(col(created_at).desc(), col(row_id).desc()).limit(limit + 1)
+
+
+def page(rows: Sequence[Any], limit: int, response: Response) -> list[Any]:
+    """Обрезает лишнюю запись и выставляет курсор следующей страницы."""
+    items = list(rows[:limit])
+    if len(rows) > limit:
+        last = items[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.created_at, last.id)
+    return items
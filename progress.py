@@ -0,0 +1,124 @@
+"""
+События прогресса генерации через Redis pub/sub.
+
+Воркер публикует каждое обновление в каналы задачи и диалога и хранит
+последний снимок в Redis, а в БД пишет только смену статуса. API отдаёт
+события клиентам как Server-Sent Events.
+"""
+
+import json
+from collections.abc import AsyncIterator
+from typing import Any
+
+import redis
+import redis.asyncio as aioredis
+
+from task_queue import REDIS_URL
+
+FINAL_STATUSES = ("completed", "failed")
+HEARTBEAT_INTERVAL = 15
+SNAPSHOT_TTL = 24 * 3600
+
+_client: redis.Redis | None = None
+
+
+def task_channel(task_id: int) -> str:
+    return f"progress:task:{task_id}"
+
+
+def conversation_channel(conversation_id: int) -> str:
+    return f"progress:conversation:{conversation_id}"
+
+
+def _snapshot_key(task_id: int) -> str:
+    return f"progress:last:{task_id}"
+
+
+def _get_client() -> redis.Redis:
+    global _client
+    if _client is None:
+        _client = redis.from_url(REDIS_URL, decode_responses=True)
+    return _client
+
+
+def publish(
+    task_id: int,
+    conversation_id: int | None,
+    status: str,
+    progress: int,
+    message: str,
+) -> None:
+    event = {
+        "task_id": task_id,
+        "conversation_id": conversation_id,
+        "status": status,
+        "progress": progress,
+        "message": message,
+    }
+    data = json.dumps(event, ensure_ascii=False)
+    try:
+        with _get_client().pipeline(transaction=False) as pipe:
+            pipe.set(_snapshot_key(task_id), data, ex=SNAPSHOT_TTL)
+            pipe.publish(task_channel(task_id), data)
+            if conversation_id is not None:
+                pipe.publish(conversation_channel(conversation_id), data)
+            pipe.execute()
+    except redis.RedisError as e:
+        # прогресс — не критичная информация, генерация продолжается
+        print(f"Ошибка публикации прогресса: {e}")
+
+
+async def alatest(
+    client: aioredis.Redis, task_ids: list[int]
+) -> dict[int, dict[str, Any]]:
+    """Последние снимки задач одним MGET; задач без снимка в ответе нет."""
+    if not task_ids:
+        return {}
+    try:
+        values = await client.mget([_snapshot_key(task_id) for task_id in task_ids])
+    except redis.RedisError:
+        return {}
+    return {
+        task_id: json.loads(data)
+        for task_id, data in zip(task_ids, values, strict=True)
+        if data
+    }
+
+
+async def subscribe(client: aioredis.Redis, channel: str) -> Any:
+    pubsub = client.pubsub()
+    await pubsub.subscribe(channel)
+    return pubsub
+
+
+def format_sse(event: dict[str, Any]) -> str:
+    return f"event: progress\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+async def sse_stream(
+    pubsub: Any, initial: list[dict[str, Any]], until_final: bool
+) -> AsyncIterator[str]:
+    """SSE-поток: сначала текущие снимки, затем события из pub/sub.
+
+    При until_final поток закрывается после завершения задачи.
+    """
+    try:
+        for event in initial:
+            yield format_sse(event)
+            if until_final and event["status"] in FINAL_STATUSES:
+                return
+
+        while True:
+            message = await pubsub.get_message(
+                ignore_subscribe_messages=True, timeout=HEARTBEAT_INTERVAL
+            )
+            if message is None:
+                yield ": ping\n\n"
+                continue
+            event = json.loads(message["data"])
+            yield format_sse(event)
+            if until_final and event["status"] in FINAL_STATUSES:
+                return
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.aclose()
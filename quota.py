@@ -0,0 +1,176 @@
+"""
+Квоты генераций по тарифам на скользящих окнах в Redis.
+
+Для каждого окна пользователя хранится sorted set с отметками времени
+запусков. Проверка всех окон и запись новой генерации выполняются одним
+Lua-скриптом, поэтому параллельные запросы не превышают лимит. При первом
+обращении (или после истечения ключей) окна восстанавливаются из БД тоже
+Lua-скриптом: только первый из одновременных запросов заменяет окна снимком.
+"""
+
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from redis import asyncio as aioredis
+from sqlalchemy import func
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models import GenerationTask, User
+
+# (лимит, окно в секундах) для каждого тарифа
+TIER_QUOTAS: dict[str, list[tuple[int, int]]] = {
+    "free": [(10, 60), (10, 24 * 3600)],
+    "pro": [(50, 60)],
+    "enterprise": [(1000, 60)],
+}
+
+_ACQUIRE_LUA = """
+local now = tonumber(ARGV[1])
+local member = ARGV[2]
+local n = #KEYS
+for i = 1, n do
+    local limit = tonumber(ARGV[2 + i * 2 - 1])
+    local window = tonumber(ARGV[2 + i * 2])
+    redis.call('ZREMRANGEBYSCORE', KEYS[i], '-inf', now - window)
+    if redis.call('ZCARD', KEYS[i]) >= limit then
+        return i
+    end
+end
+for i = 1, n do
+    local window = tonumber(ARGV[2 + i * 2])
+    redis.call('ZADD', KEYS[i], now, member)
+    redis.call('PEXPIRE', KEYS[i], window)
+end
+return 0
+"""
+
+# восстановление окон из снимка БД; метка synced проверяется внутри скрипта,
+# поэтому поздний снимок не затирает запуски, записанные после первого
+_RECONCILE_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+local now = tonumber(ARGV[1])
+local n = #KEYS - 1
+local longest = 0
+for i = 1, n do
+    local key = KEYS[1 + i]
+    local window = tonumber(ARGV[1 + i])
+    redis.call('DEL', key)
+    for j = 2 + n, #ARGV, 2 do
+        local score = tonumber(ARGV[j + 1])
+        if score > now - window then
+            redis.call('ZADD', key, score, ARGV[j])
+        end
+    end
+    redis.call('PEXPIRE', key, window)
+    longest = math.max(longest, window)
+end
+redis.call('SET', KEYS[1], 1, 'PX', longest)
+return 1
+"""
+
+
+class QuotaExceededError(Exception):
+    def __init__(self, tier: str, limit: int, window: int) -> None:
+        self.tier = tier
+        self.limit = limit
+        self.window = window
+        period = "в сутки" if window >= 24 * 3600 else f"за {window // 60} мин."
+        super().__init__(
+            f"Лимит тарифа {tier.capitalize()} исчерпан ({limit} генераций {period})."
+        )
+
+
+def tier_quotas(tier: str) -> list[tuple[int, int]]:
+    return TIER_QUOTAS.get(tier, TIER_QUOTAS["free"])
+
+
+def _window_key(user_id: int, window: int) -> str:
+    return f"quota:{user_id}:{window}"
+
+
+def _synced_key(user_id: int) -> str:
+    return f"quota:{user_id}:synced"
+
+
+async def _reconcile(
+    client: aioredis.Redis, user: User, session: AsyncSession, now_ms: int
+) -> None:
+    """Заполняет окна запусками из БД, если в Redis о пользователе ничего нет."""
+    assert user.id is not None
+    # быстрый путь без запроса к БД; окончательно решает _RECONCILE_LUA
+    if await client.exists(_synced_key(user.id)):
+        return
+
+    quotas = tier_quotas(user.tier)
+    longest = max(window for _, window in quotas)
+    since = datetime.utcnow() - timedelta(seconds=longest)
+    result = await session.exec(
+        select(GenerationTask.id, GenerationTask.created_at)
+        .where(GenerationTask.user_id == user.id)
+        .where(col(GenerationTask.created_at) > since)
+    )
+    rows = result.all()
+
+    args: list[int | str] = [now_ms, *(window * 1000 for _, window in quotas)]
+    for task_id, created_at in rows:
+        age_ms = int((datetime.utcnow() - created_at).total_seconds() * 1000)
+        args.extend([f"db:{task_id}", now_ms - age_ms])
+    keys = [_synced_key(user.id)]
+    keys.extend(_window_key(user.id, window) for _, window in quotas)
+    script = client.register_script(_RECONCILE_LUA)
+    await script(keys=keys, args=args)
+
+
+async def acquire(client: aioredis.Redis, user: User, session: AsyncSession) -> str:
+    """Списывает одну генерацию из квоты тарифа и возвращает id записи.
+
+    Бросает QuotaExceededError, если хотя бы одно окно исчерпано.
+    """
+    assert user.id is not None
+    quotas = tier_quotas(user.tier)
+    now_ms = int(time.time() * 1000)
+    member = uuid.uuid4().hex
+
+    await _reconcile(client, user, session, now_ms)
+
+    args: list[int | str] = [now_ms, member]
+    for limit, window in quotas:
+        args.extend([limit, window * 1000])
+    script = client.register_script(_ACQUIRE_LUA)
+    exceeded = await script(
+        keys=[_window_key(user.id, window) for _, window in quotas], args=args
+    )
+    if exceeded:
+        limit, window = quotas[int(exceeded) - 1]
+        raise QuotaExceededError(user.tier, limit, window)
+    return member
+
+
+async def release(client: aioredis.Redis, user: User, member: str) -> None:
+    """Возвращает генерацию в квоту, если задачу так и не удалось создать."""
+    assert user.id is not None
+    async with client.pipeline(transaction=False) as pipe:
+        for _, window in tier_quotas(user.tier):
+            pipe.zrem(_window_key(user.id, window), member)
+        await pipe.execute()
+
+
+async def check_in_db(user: User, session: AsyncSession) -> None:
+    """Запасная проверка суточного лимита по БД, когда Redis недоступен."""
+    for limit, window in tier_quotas(user.tier):
+        if window < 24 * 3600:
+            continue
+        since = datetime.utcnow() - timedelta(seconds=window)
+        result = await session.exec(
+            select(func.count())
+            .select_from(GenerationTask)
+            .where(GenerationTask.user_id == user.id)
+            .where(col(GenerationTask.created_at) > since)
+        )
+        count: int = result.one()
+        if count >= limit:
+            raise QuotaExceededError(user.tier, limit, window)
@@ -0,0 +1,164 @@
+"""
+Каскад моделей: сначала дешёвая и быстрая модель, при неудаче — сильнее.
+
+Модели в MODEL_CASCADE перечислены от самой дешёвой к самой сильной. Исход
+каждой попытки (успех и задержка LLM + песочницы) записывается в Redis в
+скользящее окно для пары (категория промпта, модель). Стартовая модель для
+model="auto" выбирается так, чтобы ожидаемое время до успешного результата
+с учётом эскалации было минимальным. Модели без достаточной статистики
+считаются успешными, поэтому дешёвая модель сначала пробуется. Небольшая
+доля запросов (ROUTING_EXPLORE) всегда начинается с начала каскада, чтобы
+статистика дешёвых моделей не устаревала.
+"""
+
+import os
+import random
+import re
+from typing import Any
+
+import redis
+
+from core import CANDIDATE_REJECTED, SPECULATION_CANCELLED
+from task_queue import REDIS_URL
+
+AUTO_MODEL = "auto"
+MODEL_CASCADE = [
+    model.strip()
+    for model in os.getenv(
+        "MODEL_CASCADE", "gemini-2.5-flash-lite,gemini-2.5-flash"
+    ).split(",")
+    if model.strip()
+]
+# сколько последних попыток учитывается и сколько нужно, чтобы им доверять
+ROUTING_WINDOW = int(os.getenv("ROUTING_WINDOW", 200))
+ROUTING_MIN_SAMPLES = int(os.getenv("ROUTING_MIN_SAMPLES", 20))
+ROUTING_EXPLORE = float(os.getenv("ROUTING_EXPLORE", 0.05))
+
+# попытки из кэша не обращаются к LLM и в статистику не идут
+_LLM_KINDS = ("generate", "speculate", "modify", "delta", "fix", "optimize")
+
+# fmt: off
+CATEGORIES: dict[str, tuple[str, ...]] = {
+    "people": ("клиент", "сотрудник", "пользовател", "фио", "пациент", "студент",
+               "customer", "employee", "person"),
+    "finance": ("транзакц", "платеж", "платёж", "счет", "счёт", "банк", "кредит",
+                "зарплат", "transaction", "payment", "bank", "salary"),
+    "commerce": ("заказ", "товар", "продаж", "магазин", "корзин", "order",
+                 "product", "sales", "shop"),
+    "timeseries": ("временн", "датчик", "сенсор", "метрик", "time series",
+                   "sensor", "metric"),
+}
+# fmt: on
+
+_client: redis.Redis | None = None
+
+
+def _get_client() -> redis.Redis:
+    global _client
+    if _client is None:
+        _client = redis.from_url(REDIS_URL, decode_responses=True)
+    return _client
+
+
+def category(prompt: str) -> str:
+    text = re.sub(r"\s+", " ", prompt.lower())
+    for name, keywords in CATEGORIES.items():
+        if any(keyword in text for keyword in keywords):
+            return name
+    return "general"
+
+
+def _stats_key(prompt_category: str, model: str) -> str:
+    return f"routing:{prompt_category}:{model}"
+
+
+def model_stats(prompt_category: str) -> dict[str, dict[str, Any]]:
+    """Доля успехов, средняя задержка и число попыток каждой модели каскада."""
+    try:
+        with _get_client().pipeline(transaction=False) as pipe:
+            for model in MODEL_CASCADE:
+                pipe.lrange(_stats_key(prompt_category, model), 0, -1)
+            windows = pipe.execute()
+    except redis.RedisError as e:
+        print(f"Статистика моделей недоступна: {e}")
+        windows = [[] for _ in MODEL_CASCADE]
+
+    stats = {}
+    for model, window in zip(MODEL_CASCADE, windows, strict=True):
+        outcomes = [item.split(":") for item in window]
+        samples = len(outcomes)
+        successes = sum(ok == "1" for ok, _ in outcomes)
+        latency = sum(int(ms) for _, ms in outcomes) / samples if samples else None
+        stats[model] = {
+            "samples": samples,
+            "success_rate": successes / samples if samples else None,
+            "latency_ms": latency,
+        }
+    return stats
+
+
+def _expected_latency(models: list[str], stats: dict[str, dict[str, Any]]) -> float:
+    """Ожидаемая задержка каскада: L1 + (1 - p1) * (L2 + (1 - p2) * ...)."""
+    expected = 0.0
+    for model in reversed(models):
+        model_stat = stats.get(model, {})
+        if model_stat.get("samples", 0) < ROUTING_MIN_SAMPLES:
+            # мало данных — модель пробуется, будто она всегда успешна
+            success_rate, latency = 1.0, model_stat.get("latency_ms") or 0.0
+        else:
+            success_rate = model_stat["success_rate"]
+            latency = model_stat["latency_ms"]
+        expected = latency + (1 - success_rate) * expected
+    return expected
+
+
+def cascade(model: str, prompt: str) -> list[str]:
+    """Модели для попыток генерации по порядку эскалации.
+
+    auto — старт с модели, выгоднее всего по статистике категории;
+    модель из каскада — старт с неё; прочие модели используются без эскалации.
+    """
+    if model == AUTO_MODEL:
+        if random.random() < ROUTING_EXPLORE:
+            return list(MODEL_CASCADE)
+        stats = model_stats(category(prompt))
+        costs = [
+            _expected_latency(MODEL_CASCADE[i:], stats)
+            for i in range(len(MODEL_CASCADE))
+        ]
+        # при равенстве выбирается более дешёвая модель
+        return MODEL_CASCADE[costs.index(min(costs)) :]
+    if model in MODEL_CASCADE:
+        return MODEL_CASCADE[MODEL_CASCADE.index(model) :]
+    return [model]
+
+
+def _scored(attempt: dict[str, Any]) -> bool:
+    """Отменённый черновик и непринятая ускоренная версия — не ошибки модели:
+    их просто обогнал другой вариант."""
+    error = attempt.get("error") or ""
+    return (
+        attempt.get("kind") in _LLM_KINDS
+        and error != SPECULATION_CANCELLED
+        and not error.startswith(CANDIDATE_REJECTED)
+    )
+
+
+def record(prompt: str, attempts: list[dict[str, Any]]) -> None:
+    """Добавляет исходы попыток генерации в скользящие окна моделей."""
+    prompt_category = category(prompt)
+    try:
+        with _get_client().pipeline(transaction=False) as pipe:
+            for attempt in attempts:
+                if not _scored(attempt):
+                    continue
+                latency = (attempt.get("llm_latency_ms") or 0) + (
+                    attempt.get("sandbox_wall_ms") or 0
+                )
+                key = _stats_key(prompt_category, attempt["model"])
+                pipe.lpush(key, f"{int(bool(attempt.get('success')))}:{latency}")
+                pipe.ltrim(key, 0, ROUTING_WINDOW - 1)
+            pipe.execute()
+    except redis.RedisError as e:
+        # статистика не критична, генерация уже завершена
+        print(f"Ошибка записи статистики моделей: {e}")
@@ -0,0 +1,573 @@
+"""
+Бэкенды песочницы для сгенерированных скриптов.
+
+SANDBOX_BACKEND выбирает реализацию SandboxBackend:
+
+- docker (по умолчанию) — отдельный контейнер synthgen-env на запуск или,
+  при SANDBOX_POOL_SIZE > 0, пул заранее запущенных контейнеров;
+- local — пул процессов sandbox_runner.py на самом хосте, без Docker. Каждое
+  задание исполнитель изолирует средствами Linux (пространства имён без сети,
+  файловая система только для чтения, кроме storage и временного каталога,
+  rlimits), поэтому запуск занимает десятки миллисекунд.
+
+Тёплый исполнитель держит уже импортированные pandas и Faker. Задача берёт
+его из пула, исполняет скрипт в отдельном дочернем процессе и возвращает
+обратно. Исполнители проверяются пингом и пересоздаются после
+SANDBOX_POOL_MAX_USES запусков.
+"""
+
+import asyncio
+import atexit
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections.abc import Callable
+from typing import Any
+
+SANDBOX_IMAGE = "synthgen-env"
+SANDBOX_TIMEOUT = 120
+RUNNER_PATH = "/opt/synthgen/sandbox_runner.py"
+LOCAL_RUNNER_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "sandbox_runner.py"
+)
+# единственный каталог рабочей директории, доступный скрипту на запись
+SCRATCH_DIR = "storage"
+
+SANDBOX_BACKEND = os.getenv("SANDBOX_BACKEND", "docker")
+SANDBOX_MEMORY_MB = int(os.getenv("SANDBOX_MEMORY_MB", 2048))
+SANDBOX_POOL_SIZE = int(os.getenv("SANDBOX_POOL_SIZE", 0))
+SANDBOX_POOL_MAX_USES = int(os.getenv("SANDBOX_POOL_MAX_USES", 50))
+SANDBOX_HEALTHCHECK_INTERVAL = float(os.getenv("SANDBOX_HEALTHCHECK_INTERVAL", 30))
+SANDBOX_STARTUP_TIMEOUT = float(os.getenv("SANDBOX_STARTUP_TIMEOUT", 60))
+# сэмплирующее профилирование скриптов (горячие строки попадают в отчёт)
+SANDBOX_PROFILE = os.getenv("SANDBOX_PROFILE", "0") == "1"
+
+# запас сверх таймаута скрипта на ответ самого исполнителя
+RESPONSE_GRACE = 10
+
+
+class SandboxUnavailableError(RuntimeError):
+    pass
+
+
+def _docker_isolation(
+    workdir: str, memory_mb: int, readonly: list[str] | None = None
+) -> list[str]:
+    """Без сети, корень только для чтения, на запись — storage и /tmp (tmpfs).
+
+    Рабочая директория не монтируется: код приходит через stdin, а в /app
+    виден только каталог с результатами. Файлы readonly (пути относительно
+    workdir) поверх него монтируются только для чтения.
+    """
+    inputs = []
+    for path in readonly or []:
+        inputs += ["-v", f"{os.path.join(workdir, path)}:/app/{path}:ro"]
+    return [
+        "--network",
+        "none",
+        "--memory",
+        f"{memory_mb}m",
+        "--pids-limit",
+        "256",
+        "--read-only",
+        "--tmpfs",
+        "/tmp",
+        "-v",
+        f"{os.path.join(workdir, SCRATCH_DIR)}:/app/{SCRATCH_DIR}",
+        *inputs,
+    ]
+
+
+def _docker_command(
+    container_name: str,
+    workdir: str,
+    timeout: float,
+    profile: bool = False,
+    memory_mb: int = SANDBOX_MEMORY_MB,
+    readonly: list[str] | None = None,
+    summary: str | None = None,
+) -> list[str]:
+    command = [
+        "docker",
+        "run",
+        "-i",
+        "--rm",
+        "--name",
+        container_name,
+        *_docker_isolation(workdir, memory_mb, readonly),
+        SANDBOX_IMAGE,
+        "python",
+        RUNNER_PATH,
+        "--once",
+        "-",
+        "--timeout",
+        str(timeout),
+    ]
+    if summary:
+        command += ["--summary", summary]
+    return command + ["--profile"] if profile else command
+
+
+def _remove_container(container_name: str) -> None:
+    # при таймауте убит только клиент docker, сам контейнер нужно остановить явно
+    subprocess.run(["docker", "rm", "-f", container_name], capture_output=True)
+
+
+def _timed_out(stdout: str) -> bool:
+    """Сообщил ли исполнитель (последняя строка stdout) о таймауте скрипта."""
+    try:
+        report = json.loads(stdout.strip().splitlines()[-1])
+    except (AttributeError, IndexError, TypeError, ValueError):
+        return False
+    return isinstance(report, dict) and bool(report.get("timed_out"))
+
+
+class SandboxBackend:
+    """Способ исполнить код скрипта в изоляции.
+
+    Скрипт пишет результат в storage/ относительно рабочей директории. run
+    возвращает CompletedProcess, где stdout — отчёт sandbox_runner с
+    метриками, и бросает TimeoutExpired (отчёт в output), если скрипт не
+    уложился в timeout, или SandboxUnavailableError, если песочница не ответила.
+    readonly — файлы рабочей директории (входные данные), которые скрипт
+    может читать, но не изменять. summary — путь в storage/, куда после
+    скрипта пишется профиль его DataFrame df (см. dataprofile).
+    """
+
+    # можно ли прервать запуск: cancel и отмена arun останавливают скрипт
+    interruptible = False
+    # сколько запусков идёт одновременно без ожидания (None — без ограничения)
+    capacity: int | None = None
+
+    def warm(self) -> None:
+        pass
+
+    def run(
+        self,
+        code: str,
+        timeout: float = SANDBOX_TIMEOUT,
+        profile: bool = SANDBOX_PROFILE,
+        name: str | None = None,
+        readonly: list[str] | None = None,
+        summary: str | None = None,
+    ) -> subprocess.CompletedProcess[str]:
+        raise NotImplementedError
+
+    async def arun(
+        self,
+        code: str,
+        timeout: float = SANDBOX_TIMEOUT,
+        profile: bool = SANDBOX_PROFILE,
+        name: str | None = None,
+        readonly: list[str] | None = None,
+        summary: str | None = None,
+    ) -> subprocess.CompletedProcess[str]:
+        return await asyncio.to_thread(
+            self.run, code, timeout, profile, name, readonly, summary
+        )
+
+    def cancel(self, name: str) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class DockerBackend(SandboxBackend):
+    """Отдельный контейнер synthgen-env на каждый запуск."""
+
+    interruptible = True
+
+    def __init__(
+        self, workdir: str | None = None, memory_mb: int = SANDBOX_MEMORY_MB
+    ) -> None:
+        self.workdir = workdir
+        self.memory_mb = memory_mb
+
+    def _command(
+        self,
+        timeout: float,
+        profile: bool,
+        name: str,
+        readonly: list[str] | None,
+        summary: str | None,
+    ) -> list[str]:
+        workdir = self.workdir or os.getcwd()
+        return _docker_command(
+            name, workdir, timeout, profile, self.memory_mb, readonly, summary
+        )
+
+    def run(
+        self,
+        code: str,
+        timeout: float = SANDBOX_TIMEOUT,
+        profile: bool = SANDBOX_PROFILE,
+        name: str | None = None,
+        readonly: list[str] | None = None,
+        summary: str | None = None,
+    ) -> subprocess.CompletedProcess[str]:
+        name = name or f"synthgen-run-{uuid.uuid4().hex[:12]}"
+        try:
+            # таймаут скрипта соблюдает исполнитель, здесь — только страховка
+            res = subprocess.run(
+                self._command(timeout, profile, name, readonly, summary),
+                input=code,
+                capture_output=True,
+                text=True,
+                encoding="utf-8",
+                timeout=timeout + RESPONSE_GRACE,
+            )
+        except subprocess.TimeoutExpired:
+            self.cancel(name)
+            raise
+        if _timed_out(res.stdout):
+            raise subprocess.TimeoutExpired(name, timeout, output=res.stdout)
+        return res
+
+    async def arun(
+        self,
+        code: str,
+        timeout: float = SANDBOX_TIMEOUT,
+        profile: bool = SANDBOX_PROFILE,
+        name: str | None = None,
+        readonly: list[str] | None = None,
+        summary: str | None = None,
+    ) -> subprocess.CompletedProcess[str]:
+        name = name or f"synthgen-run-{uuid.uuid4().hex[:12]}"
+        command = self._command(timeout, profile, name, readonly, summary)
+        proc = await asyncio.create_subprocess_exec(
+            *command,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            out, err = await asyncio.wait_for(
+                proc.communicate(code.encode("utf-8")), timeout=timeout + RESPONSE_GRACE
+            )
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            await asyncio.to_thread(self.cancel, name)
+            raise subprocess.TimeoutExpired(name, timeout) from None
+        except asyncio.CancelledError:
+            # проигравший спекулятивный вариант: контейнер больше не нужен
+            proc.kill()
+            await proc.wait()
+            await asyncio.to_thread(self.cancel, name)
+            raise
+        stdout = out.decode("utf-8", "replace")
+        if _timed_out(stdout):
+            raise subprocess.TimeoutExpired(name, timeout, output=stdout)
+        return subprocess.CompletedProcess(
+            args=command,
+            returncode=proc.returncode if proc.returncode is not None else -1,
+            stdout=stdout,
+            stderr=err.decode("utf-8", "replace"),
+        )
+
+    def cancel(self, name: str) -> None:
+        _remove_container(name)
+
+
+class SandboxContainer:
+    """Один тёплый контейнер с запущенным исполнителем."""
+
+    prefix = "synthgen-pool"
+
+    def __init__(self, workdir: str) -> None:
+        self.name = f"{self.prefix}-{uuid.uuid4().hex[:12]}"
+        self.uses = 0
+        self.last_check = 0.0
+        self._responses: queue.Queue[str | None] = queue.Queue()
+        self.proc = self._start(workdir)
+        threading.Thread(target=self._read_responses, daemon=True).start()
+
+    def options(self, readonly: list[str] | None = None) -> dict[str, Any]:
+        """Дополнительные поля запроса к исполнителю.
+
+        Тома контейнера после запуска не меняются, поэтому readonly здесь не
+        применяется: входные файлы видны в storage как есть.
+        """
+        return {}
+
+    def _start(self, workdir: str) -> subprocess.Popen[str]:
+        return subprocess.Popen(
+            [
+                "docker",
+                "run",
+                "-i",
+                "--rm",
+                "--name",
+                self.name,
+                *_docker_isolation(workdir, SANDBOX_MEMORY_MB),
+                SANDBOX_IMAGE,
+                "python",
+                "-u",
+                RUNNER_PATH,
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding="utf-8",
+            bufsize=1,
+        )
+
+    def _read_responses(self) -> None:
+        if self.proc.stdout is None:
+            return
+        for line in self.proc.stdout:
+            self._responses.put(line)
+        self._responses.put(None)
+
+    def is_alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def request(self, payload: dict[str, Any], timeout: float) -> dict[str, Any] | None:
+        if not self.is_alive() or self.proc.stdin is None:
+            return None
+        try:
+            self.proc.stdin.write(json.dumps(payload) + "\n")
+            self.proc.stdin.flush()
+            line = self._responses.get(timeout=timeout)
+        except (OSError, queue.Empty):
+            return None
+        if line is None:
+            return None
+        try:
+            response: dict[str, Any] = json.loads(line)
+        except ValueError:
+            return None
+        return response
+
+    def ping(self, timeout: float = 5.0) -> bool:
+        response = self.request({"op": "ping", **self.options()}, timeout)
+        if response and response.get("pong"):
+            self.last_check = time.monotonic()
+            return True
+        return False
+
+    def close(self) -> None:
+        if self.proc.stdin is not None:
+            try:
+                self.proc.stdin.close()
+            except OSError:
+                pass
+        threading.Thread(
+            target=_remove_container, args=(self.name,), daemon=True
+        ).start()
+
+
+def _local_env() -> dict[str, str]:
+    """Окружение локального исполнителя: без секретов API."""
+    return {
+        "PATH": os.environ.get("PATH", "/usr/bin:/bin"),
+        "LANG": "C.UTF-8",
+        # synthdata импортируется из сгенерированных скриптов
+        "PYTHONPATH": os.path.dirname(LOCAL_RUNNER_PATH),
+        # файловая система песочницы доступна только для чтения
+        "PYTHONDONTWRITEBYTECODE": "1",
+    }
+
+
+class LocalRunner(SandboxContainer):
+    """Тёплый sandbox_runner.py на хосте; задания изолирует сам исполнитель."""
+
+    prefix = "synthgen-local"
+
+    def __init__(self, workdir: str, memory_mb: int = SANDBOX_MEMORY_MB) -> None:
+        super().__init__(workdir)
+        self.workdir = workdir
+        self.memory_mb = memory_mb
+
+    def options(self, readonly: list[str] | None = None) -> dict[str, Any]:
+        return {
+            "isolate": {
+                "writable": [os.path.join(self.workdir, SCRATCH_DIR)],
+                "readonly": [os.path.join(self.workdir, p) for p in readonly or []],
+                "memory_mb": self.memory_mb,
+            }
+        }
+
+    def _start(self, workdir: str) -> subprocess.Popen[str]:
+        return subprocess.Popen(
+            [sys.executable, "-u", LOCAL_RUNNER_PATH],
+            cwd=workdir,
+            env=_local_env(),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding="utf-8",
+            bufsize=1,
+        )
+
+    def close(self) -> None:
+        # без задания исполнитель сам завершается, когда закрыт stdin
+        if self.proc.stdin is not None:
+            try:
+                self.proc.stdin.close()
+            except OSError:
+                pass
+
+
+class SandboxPool(SandboxBackend):
+    def __init__(
+        self,
+        size: int,
+        max_uses: int = SANDBOX_POOL_MAX_USES,
+        healthcheck_interval: float = SANDBOX_HEALTHCHECK_INTERVAL,
+        workdir: str | None = None,
+        factory: Callable[[str], SandboxContainer] | None = None,
+    ) -> None:
+        self.size = size
+        self.capacity = size
+        self.max_uses = max_uses
+        self.healthcheck_interval = healthcheck_interval
+        self.workdir = os.path.abspath(workdir or os.getcwd())
+        self.factory = factory
+        self._idle: queue.Queue[SandboxContainer] = queue.Queue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+
+    def _spawn(self) -> SandboxContainer:
+        factory = self.factory or SandboxContainer
+        container = factory(self.workdir)
+        self._created += 1
+        return container
+
+    def _discard(self, container: SandboxContainer) -> None:
+        container.close()
+        with self._lock:
+            self._created -= 1
+
+    def _is_ready(self, container: SandboxContainer) -> bool:
+        if not container.is_alive():
+            return False
+        if container.last_check == 0.0:
+            return container.ping(SANDBOX_STARTUP_TIMEOUT)
+        if time.monotonic() - container.last_check > self.healthcheck_interval:
+            return container.ping()
+        return True
+
+    def warm(self) -> None:
+        """Поднимает недостающие контейнеры и дожидается их готовности."""
+        with self._lock:
+            fresh = [self._spawn() for _ in range(self.size - self._created)]
+        for container in fresh:
+            if container.ping(SANDBOX_STARTUP_TIMEOUT):
+                self._idle.put(container)
+            else:
+                self._discard(container)
+
+    def acquire(self, timeout: float = SANDBOX_TIMEOUT) -> SandboxContainer:
+        deadline = time.monotonic() + timeout
+        while True:
+            if self._closed:
+                raise SandboxUnavailableError("Пул песочниц остановлен.")
+
+            container: SandboxContainer | None = None
+            with self._lock:
+                if self._idle.empty() and self._created < self.size:
+                    container = self._spawn()
+            if container is None:
+                remaining = deadline - time.monotonic()
+                try:
+                    container = self._idle.get(timeout=max(remaining, 0))
+                except queue.Empty as e:
+                    raise SandboxUnavailableError(
+                        "Нет свободных песочниц, попробуйте позже."
+                    ) from e
+
+            if self._is_ready(container):
+                return container
+            self._discard(container)
+
+    def release(self, container: SandboxContainer, broken: bool = False) -> None:
+        container.uses += 1
+        if broken or self._closed or container.uses >= self.max_uses:
+            self._discard(container)
+        else:
+            self._idle.put(container)
+
+    def run(
+        self,
+        code: str,
+        timeout: float = SANDBOX_TIMEOUT,
+        profile: bool = SANDBOX_PROFILE,
+        name: str | None = None,
+        readonly: list[str] | None = None,
+        summary: str | None = None,
+    ) -> subprocess.CompletedProcess[str]:
+        """Аналог subprocess.run: код уходит исполнителю в самом задании."""
+        container = self.acquire()
+        response = container.request(
+            {
+                "op": "run",
+                "code": code,
+                "timeout": timeout,
+                "profile": profile,
+                "summary": summary,
+                **container.options(readonly),
+            },
+            timeout + RESPONSE_GRACE,
+        )
+        self.release(container, broken=response is None)
+
+        if response is None or not response.get("ok"):
+            raise SandboxUnavailableError("Песочница не ответила на запрос.")
+
+        # stdout несёт отчёт исполнителя с метриками, как в режиме --once
+        report = {k: v for k, v in response.items() if k not in ("ok", "stderr")}
+        if response.get("timed_out"):
+            # отчёт (и профиль зависшего скрипта) остаётся в output исключения
+            raise subprocess.TimeoutExpired(
+                container.name, timeout, output=json.dumps(report)
+            )
+        return subprocess.CompletedProcess(
+            args=[container.name],
+            returncode=response["returncode"],
+            stdout=json.dumps(report),
+            stderr=response.get("stderr", ""),
+        )
+
+    def close(self) -> None:
+        self._closed = True
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+
+def create_backend(name: str = SANDBOX_BACKEND) -> SandboxBackend:
+    if name == "local":
+        # процессы дешёвые, поэтому локальный бэкенд всегда работает пулом
+        size = SANDBOX_POOL_SIZE or os.cpu_count() or 1
+        return SandboxPool(size, factory=LocalRunner)
+    if name != "docker":
+        raise ValueError(f"Неизвестный бэкенд песочницы: {name}")
+    if SANDBOX_POOL_SIZE > 0:
+        return SandboxPool(SANDBOX_POOL_SIZE)
+    return DockerBackend()
+
+
+_backend: SandboxBackend | None = None
+_backend_lock = threading.Lock()
+
+
+def get_sandbox_backend() -> SandboxBackend:
+    """Общий бэкенд песочницы, выбранный SANDBOX_BACKEND и SANDBOX_POOL_SIZE."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = create_backend()
+            atexit.register(_backend.close)
+    return _backend
@@ -0,0 +1,600 @@
+"""
+Исполнитель скриптов для пула тёплых контейнеров synthgen-env.
+
+Запускается один раз на контейнер, заранее импортирует pandas, Faker и synthdata и
+принимает задания построчно (JSON) через stdin. Каждый скрипт исполняется в
+отдельном дочернем процессе (fork), поэтому состояние интерпретатора между
+задачами не переносится. Генераторы random, NumPy и Faker после fork
+пересидируются из os.urandom: иначе все задания исполнителя начинали бы с
+одного состояния и получали одинаковые "случайные" данные. Ответы пишутся
+построчно (JSON) в stdout.
+
+Код скрипта передаётся прямо в задании (поле "code", в режиме --once - через
+stdin) и записывается во временный каталог задания, а не в рабочую
+директорию: в песочнице на запись доступен только каталог с результатами.
+
+В режиме --once SCRIPT исполняет один скрипт (для запуска без пула): stderr
+скрипта идёт в stderr, отчёт с метриками — одной строкой JSON в stdout.
+
+Задание с полем "isolate" (локальный бэкенд без Docker) перед запуском
+изолируется средствами Linux: новые user/mount/pid/net/ipc-пространства имён
+(сети нет) и собственный корень на tmpfs (pivot_root). В нём есть только
+интерпретатор, пакеты и системные библиотеки (только для чтения), каталоги
+writable и временный каталог задания (файлы readonly внутри них защищены от
+записи); рабочий каталог API и остальной хост не видны. Далее сбрасываются
+capabilities, ставятся no_new_privs и rlimits на память и процессорное время.
+
+С полем "summary" (--summary PATH) после успешного скрипта по его DataFrame
+df строится профиль набора (dataprofile.compute) и записывается в PATH.
+
+С профилированием (--profile или "profile": true) скрипт раз в
+PROFILE_INTERVAL прерывается по SIGPROF, и строка скрипта, исполняемая в этот
+момент, получает выборку. По таймауту скрипт сначала получает SIGTERM, чтобы
+успеть сохранить профиль.
+"""
+
+import argparse
+import ctypes
+import errno
+import json
+import os
+import platform
+import random
+import resource
+import runpy
+import shutil
+import signal
+import sys
+import tempfile
+import time
+import traceback
+from typing import Any
+
+import faker
+import numpy
+import pandas
+import pyarrow.parquet  # noqa: F401  # прогрев импорта
+
+import dataprofile
+import synthdata  # noqa: F401  # прогрев импорта
+
+POLL_INTERVAL = 0.01
+PROFILE_INTERVAL = 0.005
+PROFILE_TOP_LINES = 10
+# сколько ждать сохранения профиля после SIGTERM
+PROFILE_GRACE = 1.0
+SCRIPT_NAME = "script.py"
+# код возврата, если изоляцию не удалось применить
+ISOLATION_FAILED = 125
+# каталоги и файлы хоста, без которых не работают интерпретатор и библиотеки
+SYSTEM_PATHS = [
+    "/usr",
+    "/bin",
+    "/sbin",
+    "/lib",
+    "/lib32",
+    "/lib64",
+    "/etc/ld.so.cache",
+    "/etc/localtime",
+]
+DEVICES = ["/dev/null", "/dev/zero", "/dev/random", "/dev/urandom"]
+# точка монтирования нового корня внутри временного каталога задания
+ROOT_DIR = ".root"
+_PACKAGE_DIRS = ("site-packages", "dist-packages")
+
+
+CLONE_NEWNS = 0x00020000
+CLONE_NEWIPC = 0x08000000
+CLONE_NEWUSER = 0x10000000
+CLONE_NEWPID = 0x20000000
+CLONE_NEWNET = 0x40000000
+MS_RDONLY = 0x1
+MS_NOSUID = 0x2
+MS_NODEV = 0x4
+MS_NOEXEC = 0x8
+MS_REMOUNT = 0x20
+MS_NOATIME = 0x400
+MS_NODIRATIME = 0x800
+MS_BIND = 0x1000
+MS_REC = 0x4000
+MS_PRIVATE = 0x40000
+MS_RELATIME = 0x200000
+MS_STRICTATIME = 0x1000000
+MNT_DETACH = 0x2
+PR_SET_NO_NEW_PRIVS = 38
+_LINUX_CAPABILITY_VERSION_3 = 0x20080522
+# номер системного вызова pivot_root (в glibc нет обёртки)
+_SYS_PIVOT_ROOT = {"x86_64": 155, "aarch64": 41}
+
+# флаги, которые нельзя снять при перемонтировании в user namespace
+_LOCKED_FLAGS = {
+    "nosuid": MS_NOSUID,
+    "nodev": MS_NODEV,
+    "noexec": MS_NOEXEC,
+    "noatime": MS_NOATIME,
+    "nodiratime": MS_NODIRATIME,
+    "relatime": MS_RELATIME,
+    "strictatime": MS_STRICTATIME,
+}
+
+
+class _Terminated(BaseException):
+    pass
+
+
+class _CapHeader(ctypes.Structure):
+    _fields_ = [("version", ctypes.c_uint32), ("pid", ctypes.c_int)]
+
+
+class _CapData(ctypes.Structure):
+    _fields_ = [
+        ("effective", ctypes.c_uint32),
+        ("permitted", ctypes.c_uint32),
+        ("inheritable", ctypes.c_uint32),
+    ]
+
+
+_libc = ctypes.CDLL(None, use_errno=True)
+
+
+def _check(result: int, what: str) -> None:
+    if result != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, f"{what}: {os.strerror(errno)}")
+
+
+def _mount(source: str | None, target: str, fstype: str | None, flags: int) -> None:
+    _check(
+        _libc.mount(
+            source.encode() if source else None,
+            target.encode(),
+            fstype.encode() if fstype else None,
+            ctypes.c_ulong(flags),
+            None,
+        ),
+        f"mount {target}",
+    )
+
+
+def _write_file(path: str, data: str) -> None:
+    with open(path, "w", encoding="ascii") as f:
+        f.write(data)
+
+
+def _mounts() -> list[tuple[str, int]]:
+    """Точки монтирования (от корня вглубь) и их флаги из /proc/self/mountinfo."""
+    result = []
+    with open("/proc/self/mountinfo", encoding="utf-8") as f:
+        for line in f:
+            fields = line.split()
+            # пробелы и прочие спецсимволы в пути экранированы как \ooo
+            point = fields[4].encode().decode("unicode_escape")
+            flags = 0
+            for option in fields[5].split(","):
+                flags |= _LOCKED_FLAGS.get(option, 0)
+            result.append((point, flags))
+    return sorted(result, key=lambda item: item[0].count("/"))
+
+
+def _inside(path: str, roots: list[str]) -> bool:
+    return any(
+        path == root or path.startswith(root.rstrip("/") + "/") for root in roots
+    )
+
+
+def _unshare() -> None:
+    uid, gid = os.getuid(), os.getgid()
+    flags = CLONE_NEWUSER | CLONE_NEWNS | CLONE_NEWPID | CLONE_NEWNET | CLONE_NEWIPC
+    _check(_libc.unshare(flags), "unshare")
+    _write_file("/proc/self/setgroups", "deny")
+    _write_file("/proc/self/uid_map", f"{uid} {uid} 1")
+    _write_file("/proc/self/gid_map", f"{gid} {gid} 1")
+
+
+def _locked_flags(path: str, mounts: list[tuple[str, int]]) -> int:
+    """Неснимаемые флаги точки монтирования, в которой лежит path."""
+    flags = 0
+    for point, point_flags in mounts:
+        if _inside(path, [point]):
+            flags = point_flags
+    return flags
+
+
+def _runtime_paths() -> list[str]:
+    """Что нужно интерпретатору: Python с пакетами и системные библиотеки."""
+    paths = [
+        *SYSTEM_PATHS,
+        sys.prefix,
+        sys.base_prefix,
+        sys.exec_prefix,
+        sys.base_exec_prefix,
+        *(p for p in sys.path if os.path.basename(p) in _PACKAGE_DIRS),
+    ]
+    result: list[str] = []
+    for path in sorted(set(map(os.path.abspath, paths)), key=len):
+        if path == "/" or not os.path.lexists(path) or _inside(path, result):
+            continue
+        result.append(path)
+        if os.path.islink(path):
+            result.append(os.path.realpath(path))
+    return result
+
+
+def _mount_point(source: str, target: str) -> None:
+    if os.path.lexists(target):
+        return
+    if os.path.isdir(source):
+        os.makedirs(target, exist_ok=True)
+    else:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        open(target, "a").close()
+
+
+def _bind(source: str, root: str, flags: int, mounts: list[tuple[str, int]]) -> None:
+    """Монтирует source хоста по тому же пути внутри root; без MS_REC — только
+    для чтения."""
+    target = root + source
+    if os.path.islink(source):
+        # /bin -> usr/bin и т. п.: ссылка повторяется, цель монтируется отдельно
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.symlink(os.readlink(source), target)
+        return
+    _mount_point(source, target)
+    _mount(source, target, None, MS_BIND | flags)
+    if not flags & MS_REC:
+        locked = _locked_flags(source, mounts)
+        _mount(None, target, None, MS_REMOUNT | MS_BIND | MS_RDONLY | locked)
+
+
+def _pivot_root(root: str) -> None:
+    number = _SYS_PIVOT_ROOT.get(platform.machine())
+    if number is None:
+        raise OSError(errno.ENOSYS, f"pivot_root: архитектура {platform.machine()}")
+    os.chdir(root)
+    # старый корень монтируется поверх нового и сразу отсоединяется
+    _check(_libc.syscall(number, b".", b"."), "pivot_root")
+    _check(_libc.umount2(b".", MNT_DETACH), "umount")
+    os.chdir("/")
+
+
+def _minimal_root(root: str, writable: list[str], readonly: list[str]) -> None:
+    """Новый корень на tmpfs: интерпретатор и пакеты только для чтения, каталоги
+    writable на запись, файлы readonly поверх них только для чтения. Остальной
+    хост (рабочий каталог API с .env, домашние каталоги, /etc) не виден."""
+    cwd = os.getcwd()
+    mounts = _mounts()
+    _mount(None, "/", None, MS_REC | MS_PRIVATE)
+    os.makedirs(root, exist_ok=True)
+    _mount("tmpfs", root, "tmpfs", MS_NOSUID | MS_NODEV)
+
+    runtime = _runtime_paths()
+    for path in runtime:
+        _bind(path, root, 0, mounts)
+    for path in DEVICES:
+        if os.path.exists(path):
+            _bind(path, root, 0, mounts)
+    if _inside(cwd, runtime):
+        # рабочий каталог внутри системного: его содержимое тоже скрывается
+        _mount("tmpfs", root + cwd, "tmpfs", MS_NOSUID | MS_NODEV)
+    for path in writable:
+        _mount_point(path, root + path)
+        _mount(path, root + path, None, MS_BIND | MS_REC)
+    for path in readonly:
+        _bind(path, root, 0, mounts)
+    os.makedirs(root + cwd, exist_ok=True)
+    # свой /proc: процессы и окружение API из песочницы не видны
+    os.makedirs(root + "/proc", exist_ok=True)
+    _mount("proc", root + "/proc", "proc", MS_NOSUID | MS_NODEV | MS_NOEXEC)
+
+    _pivot_root(root)
+    _mount(None, "/", None, MS_REMOUNT | MS_RDONLY | MS_NOSUID | MS_NODEV)
+    os.chdir(cwd)
+
+
+def _drop_privileges() -> None:
+    header = _CapHeader(_LINUX_CAPABILITY_VERSION_3, 0)
+    data = (_CapData * 2)()
+    _check(_libc.capset(ctypes.byref(header), data), "capset")
+    _check(_libc.prctl(PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0), "prctl")
+
+
+def _address_space() -> int:
+    with open("/proc/self/statm", encoding="ascii") as f:
+        return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def _apply_limits(isolation: dict[str, Any]) -> None:
+    memory = int(isolation.get("memory_mb", 0)) * 1024 * 1024
+    if memory:
+        # лимит — сверх уже импортированных исполнителем pandas и Faker
+        limit = _address_space() + memory
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    cpu = int(isolation.get("cpu_seconds", 0))
+    if cpu:
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+    resource.setrlimit(resource.RLIMIT_NOFILE, (1024, 1024))
+
+
+def _reap(pid: int) -> None:
+    """Промежуточный процесс: ждёт скрипт (PID 1 нового пространства) и
+    завершается с его кодом или сигналом."""
+    signal.signal(signal.SIGTERM, lambda signum, frame: os.kill(pid, signum))
+    while True:
+        try:
+            _, status = os.waitpid(pid, 0)
+            break
+        except InterruptedError:
+            continue
+    if os.WIFSIGNALED(status):
+        sig = os.WTERMSIG(status)
+        signal.signal(sig, signal.SIG_DFL)
+        os.kill(os.getpid(), sig)
+    os._exit(os.waitstatus_to_exitcode(status))
+
+
+def _isolate(isolation: dict[str, Any], scratch: str) -> None:
+    """Изолирует текущий (дочерний) процесс; сам скрипт выполняется во внуке."""
+    _unshare()
+    pid = os.fork()
+    if pid:
+        _reap(pid)
+    _minimal_root(
+        os.path.join(scratch, ROOT_DIR),
+        [scratch, *isolation.get("writable", [])],
+        isolation.get("readonly", []),
+    )
+    _drop_privileges()
+    _apply_limits(isolation)
+    os.environ["TMPDIR"] = scratch
+    tempfile.tempdir = scratch
+
+
+def _start_profiler(script: str) -> dict[int, int]:
+    """Считает выборки по строкам скрипта (учитывается ближайший кадр скрипта)."""
+    counts: dict[int, int] = {}
+
+    def sample(signum: int, frame: Any) -> None:
+        while frame is not None:
+            if frame.f_code.co_filename == script:
+                counts[frame.f_lineno] = counts.get(frame.f_lineno, 0) + 1
+                return
+            frame = frame.f_back
+
+    def terminate(signum: int, frame: Any) -> None:
+        raise _Terminated()
+
+    signal.signal(signal.SIGPROF, sample)
+    signal.signal(signal.SIGTERM, terminate)
+    signal.setitimer(signal.ITIMER_PROF, PROFILE_INTERVAL, PROFILE_INTERVAL)
+    return counts
+
+
+def _dump_profile(counts: dict[int, int], profile_path: str) -> None:
+    signal.setitimer(signal.ITIMER_PROF, 0)
+    top = sorted(counts.items(), key=lambda item: -item[1])[:PROFILE_TOP_LINES]
+    with open(profile_path, "w", encoding="utf-8") as f:
+        json.dump({"samples": sum(counts.values()), "lines": top}, f)
+
+
+def _write_summary(df: Any, summary_path: str) -> None:
+    """Профиль итогового df; ошибка профиля не делает запуск неудачным."""
+    if not isinstance(df, pandas.DataFrame):
+        return
+    try:
+        summary = dataprofile.compute(df)
+        with open(summary_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False)
+    except Exception as e:
+        print(f"Не удалось построить профиль набора: {e}", file=sys.stderr)
+
+
+def _reseed() -> None:
+    """Свои seed для random, NumPy и Faker в дочернем процессе."""
+    random.seed(os.urandom(32))
+    numpy.random.seed(int.from_bytes(os.urandom(4), "little"))
+    faker.Faker.seed(int.from_bytes(os.urandom(8), "little"))
+
+
+def _exec_script(
+    script: str,
+    scratch: str,
+    profile_path: str | None,
+    isolation: dict[str, Any] | None,
+    summary_path: str | None = None,
+) -> None:
+    """Выполняется в дочернем процессе и никогда не возвращает управление."""
+    os.setsid()
+    err_fd = os.open(
+        os.path.join(scratch, "stderr.log"), os.O_WRONLY | os.O_CREAT, 0o600
+    )
+    devnull = os.open(os.devnull, os.O_RDWR)
+    # stdin исполнителя — канал заданий, скрипту он недоступен
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    os.dup2(err_fd, 2)
+    os.closerange(3, os.sysconf("SC_OPEN_MAX"))
+
+    if isolation is not None:
+        try:
+            _isolate(isolation, scratch)
+        except OSError as e:
+            print(f"Не удалось изолировать песочницу: {e}", file=sys.stderr)
+            os._exit(ISOLATION_FAILED)
+
+    sys.argv = [script]
+    sys.path.insert(0, os.path.dirname(script))
+
+    counts = _start_profiler(script) if profile_path else None
+    code = 0
+    try:
+        namespace = runpy.run_path(script, run_name="__main__")
+        if summary_path:
+            # DataFrame ещё в памяти: профиль не требует перечитывать файл
+            _write_summary(namespace.get("df"), summary_path)
+    except SystemExit as e:
+        if isinstance(e.code, int):
+            code = e.code
+        elif e.code is not None:
+            print(e.code, file=sys.stderr)
+            code = 1
+    except _Terminated:
+        code = 128 + signal.SIGTERM
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        if counts is not None and profile_path:
+            _dump_profile(counts, profile_path)
+        sys.stdout.flush()
+        sys.stderr.flush()
+    os._exit(code)
+
+
+def _wait(pid: int, deadline: float) -> tuple[int, int, Any] | None:
+    while time.monotonic() < deadline:
+        wpid, status, usage = os.wait4(pid, os.WNOHANG)
+        if wpid:
+            return wpid, status, usage
+        time.sleep(POLL_INTERVAL)
+    return None
+
+
+def _read_profile(profile_path: str | None) -> dict[str, Any] | None:
+    if not profile_path:
+        return None
+    try:
+        with open(profile_path, encoding="utf-8") as f:
+            profile: dict[str, Any] = json.load(f)
+    except (OSError, ValueError):
+        return None
+    finally:
+        if os.path.exists(profile_path):
+            os.remove(profile_path)
+    return profile
+
+
+def run_job(job: dict[str, Any]) -> dict[str, Any]:
+    """Исполняет скрипт и возвращает код возврата, stderr и потреблённые ресурсы."""
+    timeout = float(job.get("timeout", 120))
+    isolation = job.get("isolate")
+    if isolation is not None:
+        isolation = {"cpu_seconds": int(timeout) + 1, **isolation}
+
+    # свой временный каталог на задание: код, stderr, профиль и TMPDIR скрипта
+    scratch = tempfile.mkdtemp(prefix="job_")
+    script = job.get("script")
+    if script is None:
+        script = os.path.join(scratch, job.get("name", SCRIPT_NAME))
+        with open(script, "w", encoding="utf-8") as f:
+            f.write(job.get("code", ""))
+    profile_path = os.path.join(scratch, "profile.json") if job.get("profile") else None
+
+    started = time.monotonic()
+    pid = os.fork()
+    if pid == 0:
+        _reseed()
+        _exec_script(script, scratch, profile_path, isolation, job.get("summary"))
+
+    timed_out = False
+    finished = _wait(pid, started + timeout)
+    if finished is None:
+        timed_out = True
+        if profile_path:
+            # даём скрипту сохранить профиль перед принудительным завершением
+            os.kill(pid, signal.SIGTERM)
+            finished = _wait(pid, time.monotonic() + PROFILE_GRACE)
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    if finished is None:
+        finished = os.wait4(pid, 0)
+    _, status, usage = finished
+    wall_ms = int((time.monotonic() - started) * 1000)
+
+    try:
+        with open(
+            os.path.join(scratch, "stderr.log"), encoding="utf-8", errors="replace"
+        ) as f:
+            stderr = f.read()
+    except OSError:
+        stderr = ""
+    profile = _read_profile(profile_path)
+    shutil.rmtree(scratch, ignore_errors=True)
+
+    return {
+        "returncode": os.waitstatus_to_exitcode(status),
+        "stderr": stderr,
+        "timed_out": timed_out,
+        "wall_ms": wall_ms,
+        "cpu_ms": int((usage.ru_utime + usage.ru_stime) * 1000),
+        # в Linux ru_maxrss уже в килобайтах
+        "peak_rss_kb": usage.ru_maxrss,
+        "profile": profile,
+    }
+
+
+def handle(line: str) -> dict[str, Any]:
+    try:
+        job = json.loads(line)
+    except ValueError:
+        return {"ok": False, "error": "Некорректный запрос"}
+
+    op = job.get("op")
+    if op == "ping":
+        if job.get("isolate") is not None:
+            # проверяем, что ядро разрешает изоляцию, до первого задания
+            probe = run_job(
+                {"script": os.devnull, "timeout": 10, "isolate": job["isolate"]}
+            )
+            if probe["returncode"] != 0:
+                return {"ok": False, "error": probe["stderr"].strip()}
+        return {"ok": True, "pong": True}
+    if op == "run":
+        return {"ok": True, **run_job(job)}
+    return {"ok": False, "error": f"Неизвестная операция: {op}"}
+
+
+def run_once(
+    script: str, timeout: float, profile: bool = False, summary: str | None = None
+) -> int:
+    """Исполняет скрипт по пути или, если script равен "-", код из stdin."""
+    job: dict[str, Any] = {"timeout": timeout, "profile": profile, "summary": summary}
+    if script == "-":
+        job["code"] = sys.stdin.read()
+    else:
+        job["script"] = script
+    result = run_job(job)
+    sys.stderr.write(result.pop("stderr"))
+    sys.stdout.write(json.dumps(result) + "\n")
+    return int(result["returncode"])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--once", metavar="SCRIPT", help="путь или - (stdin)")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--profile", action="store_true")
+    parser.add_argument("--summary", metavar="PATH", help="куда записать профиль df")
+    args = parser.parse_args()
+    if args.once:
+        sys.exit(run_once(args.once, args.timeout, args.profile, args.summary))
+
+    # stdout зарезервирован под протокол, случайный print уходит в stderr
+    protocol = os.fdopen(os.dup(1), "w", encoding="utf-8", buffering=1)
+    os.dup2(2, 1)
+
+    while True:
+        line = sys.stdin.readline()
+        if not line:
+            break
+        line = line.strip()
+        if not line:
+            continue
+        protocol.write(json.dumps(handle(line), ensure_ascii=False) + "\n")
+        protocol.flush()
+
+
+if __name__ == "__main__":
+    main()
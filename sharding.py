@@ -0,0 +1,158 @@
+"""
+Шардирование генерации больших наборов данных.
+
+Если скрипт задаёт размер константой N_ROWS и он больше SHARD_ROWS, один и
+тот же проверенный код запускается параллельно в нескольких песочницах. Каждый
+шард получает свою долю строк, свой seed для random/NumPy/Faker/synthdata и
+свой выходной файл, после чего шарды склеиваются в один Parquet. Целочисленные
+колонки-счётчики (1..N в каждом шарде) сдвигаются, чтобы ID остались уникальными.
+"""
+
+import ast
+import math
+import os
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+ROWS_CONSTANT = "N_ROWS"
+# сколько строк примерно приходится на один шард
+SHARD_ROWS = int(os.getenv("SHARD_ROWS", 1_000_000))
+SHARD_MAX = int(os.getenv("SHARD_MAX", os.cpu_count() or 1))
+# с какого размера шарда подряд идущие числа считаются счётчиком ID
+ID_MIN_ROWS = int(os.getenv("ID_MIN_ROWS", 3))
+
+_PRELUDE = """\
+SHARD_INDEX = {index}
+SHARD_OFFSET = {offset}
+import random as _shard_random
+import numpy as _shard_np
+from faker import Faker as _ShardFaker
+import synthdata as _shard_sd
+_shard_random.seed({seed})
+_shard_np.random.seed({seed})
+_ShardFaker.seed({seed})
+_shard_sd.seed({seed})
+"""
+
+
+def _rows_assignment(tree: ast.Module) -> tuple[ast.Assign, int] | None:
+    for node in tree.body:
+        if (
+            isinstance(node, ast.Assign)
+            and len(node.targets) == 1
+            and isinstance(node.targets[0], ast.Name)
+            and node.targets[0].id == ROWS_CONSTANT
+            and isinstance(node.value, ast.Constant)
+            and type(node.value.value) is int
+        ):
+            return node, node.value.value
+    return None
+
+
+def requested_rows(code: str) -> int | None:
+    """Значение N_ROWS = <число> на верхнем уровне скрипта."""
+    try:
+        found = _rows_assignment(ast.parse(code))
+    except SyntaxError:
+        return None
+    return found[1] if found else None
+
+
+def plan(total_rows: int) -> list[tuple[int, int]]:
+    """(смещение, число строк) для каждого шарда. Один шард — без шардирования."""
+    count = max(1, min(SHARD_MAX, math.ceil(total_rows / SHARD_ROWS)))
+    base, extra = divmod(total_rows, count)
+    shards = []
+    offset = 0
+    for i in range(count):
+        rows = base + (1 if i < extra else 0)
+        shards.append((offset, rows))
+        offset += rows
+    return shards
+
+
+def shard_seed(task_id: int, index: int) -> int:
+    return (task_id * 1_000_003 + index) % 2**32
+
+
+def shard_code(
+    code: str,
+    index: int,
+    offset: int,
+    rows: int,
+    seed: int,
+    result_path: str,
+    shard_path: str,
+) -> str:
+    """Код шарда: свой seed, своя доля строк и свой выходной файл."""
+    found = _rows_assignment(ast.parse(code))
+    if found is None:
+        raise ValueError(f"В коде нет константы {ROWS_CONSTANT}")
+    node = found[0]
+
+    lines = code.splitlines()
+    assert node.end_lineno is not None
+    lines[node.lineno - 1 : node.end_lineno] = [f"{ROWS_CONSTANT} = {rows}"]
+    body = "\n".join(lines).replace(result_path, shard_path)
+    return _PRELUDE.format(index=index, offset=offset, seed=seed) + body + "\n"
+
+
+def _counter_start(path: str, names: list[str]) -> dict[str, int]:
+    """Начало каждой колонки из names, которая в файле идёт подряд: start, start+1, ..."""
+    table = pq.read_table(path, columns=names)
+    starts = {}
+    for name in names:
+        column = table.column(name).combine_chunks()
+        if column.null_count:
+            continue
+        start = column[0].as_py()
+        expected = pa.array(range(start, start + len(column)), type=column.type)
+        if column.equals(expected):
+            starts[name] = start
+    return starts
+
+
+def _sequential_columns(paths: list[str]) -> list[str]:
+    """Целочисленные колонки-счётчики, которые в каждом шарде идут с одного и
+    того же start: start, start+1, ..., start+n-1.
+
+    Короткие шарды не позволяют отличить счётчик от случайных чисел, поэтому
+    при шарде короче ID_MIN_ROWS строк ничего не сдвигается.
+    """
+    schema = pq.read_schema(paths[0])
+    names = [field.name for field in schema if pa.types.is_integer(field.type)]
+    starts: dict[str, int] | None = None
+    for path in paths:
+        if not names:
+            return []
+        if pq.ParquetFile(path).metadata.num_rows < ID_MIN_ROWS:
+            return []
+        found = _counter_start(path, names)
+        if starts is None:
+            starts = found
+        names = [n for n in names if n in found and found[n] == starts.get(n)]
+    return names
+
+
+def merge(shard_paths: list[str], offsets: list[int], target_path: str) -> list[str]:
+    """Склеивает шарды по порядку в один Parquet, сдвигая ID-счётчики.
+
+    Возвращает сдвинутые колонки.
+    """
+    schema = pq.read_schema(shard_paths[0])
+    id_columns = _sequential_columns(shard_paths)
+
+    with pq.ParquetWriter(target_path, schema) as writer:
+        for path, offset in zip(shard_paths, offsets, strict=True):
+            for batch in pq.ParquetFile(path).iter_batches():
+                table = pa.Table.from_batches([batch])
+                for name in id_columns:
+                    i = table.schema.get_field_index(name)
+                    shifted = pc.add(table.column(name), offset).cast(
+                        table.schema.field(name).type
+                    )
+                    table = table.set_column(i, name, shifted)
+                writer.write_table(table.cast(schema))
+    return id_columns
@@ -0,0 +1,326 @@
+"""
+Векторная генерация синтетических данных на NumPy.
+
+Модуль предустановлен в образе synthgen-env и нужен для больших наборов:
+каждая функция возвращает сразу массив из n значений, без построчных циклов
+Faker. Если rng не передан, генератор берёт энтропию ОС, и каждый запуск
+даёт новые данные. sd.seed(...) делает вызовы без rng воспроизводимыми (так
+сидируются шарды).
+
+Пример:
+    import synthdata as sd
+    df = pd.DataFrame({
+        "id": sd.ids(N_ROWS),
+        "name": sd.names(N_ROWS),
+        "salary": sd.amounts(N_ROWS, mean=80_000, sigma=0.4),
+    })
+"""
+
+from collections.abc import Sequence
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+# fmt: off
+MALE_FIRST = np.array(
+    [
+        "Александр", "Алексей", "Андрей", "Антон", "Артём", "Борис", "Вадим",
+        "Виктор", "Владимир", "Дмитрий", "Евгений", "Егор", "Иван", "Игорь",
+        "Илья", "Кирилл", "Константин", "Максим", "Михаил", "Никита", "Николай",
+        "Олег", "Павел", "Роман", "Сергей", "Степан", "Тимофей", "Юрий",
+    ]
+)
+FEMALE_FIRST = np.array(
+    [
+        "Александра", "Алина", "Анастасия", "Анна", "Валентина", "Валерия",
+        "Вера", "Виктория", "Дарья", "Евгения", "Екатерина", "Елена", "Ирина",
+        "Ксения", "Лариса", "Любовь", "Марина", "Мария", "Надежда", "Наталья",
+        "Ольга", "Полина", "Светлана", "София", "Татьяна", "Юлия",
+    ]
+)
+# мужская форма; женская получается добавлением "а"
+LAST_NAMES = np.array(
+    [
+        "Иванов", "Смирнов", "Кузнецов", "Попов", "Васильев", "Петров",
+        "Соколов", "Михайлов", "Новиков", "Фёдоров", "Морозов", "Волков",
+        "Алексеев", "Лебедев", "Семёнов", "Егоров", "Павлов", "Козлов",
+        "Степанов", "Николаев", "Орлов", "Андреев", "Макаров", "Никитин",
+        "Захаров", "Зайцев", "Соловьёв", "Борисов", "Яковлев", "Григорьев",
+    ]
+)
+# основы отчеств: + "ич" для мужчин, + "на" для женщин
+PATRONYMIC_STEMS = np.array(
+    [
+        "Александров", "Алексеев", "Андреев", "Борисов", "Викторов",
+        "Владимиров", "Дмитриев", "Евгеньев", "Иванов", "Игорев", "Максимов",
+        "Михайлов", "Николаев", "Олегов", "Павлов", "Петров", "Романов",
+        "Сергеев", "Юрьев",
+    ]
+)
+CITIES = np.array(
+    [
+        "Москва", "Санкт-Петербург", "Новосибирск", "Екатеринбург", "Казань",
+        "Нижний Новгород", "Челябинск", "Самара", "Омск", "Ростов-на-Дону",
+        "Уфа", "Красноярск", "Воронеж", "Пермь", "Волгоград",
+    ]
+)
+EMAIL_DOMAINS = ("mail.ru", "yandex.ru", "gmail.com", "bk.ru", "rambler.ru")
+
+_TRANSLIT = str.maketrans(
+    {
+        "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e",
+        "ж": "zh", "з": "z", "и": "i", "й": "y", "к": "k", "л": "l", "м": "m",
+        "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t", "у": "u",
+        "ф": "f", "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "shch",
+        "ъ": "", "ы": "y", "ь": "", "э": "e", "ю": "yu", "я": "ya", " ": ".",
+        "-": "",
+    }
+)
+# fmt: on
+
+
+_DIGITS_2 = np.array([f"{i:02d}" for i in range(100)])
+_DIGITS_3 = np.array([f"{i:03d}" for i in range(1000)])
+_DIGITS_4 = np.array([str(i) for i in range(10_000)])
+
+
+def transliterate(values: Sequence[str] | np.ndarray) -> np.ndarray:
+    series = pd.Series(values, dtype=object).str.lower().str.translate(_TRANSLIT)
+    result: np.ndarray = series.to_numpy(dtype=object)
+    return result
+
+
+_LATIN_LAST = transliterate(LAST_NAMES).astype(str)
+
+
+# общий генератор после seed(); без него каждый вызов берёт энтропию ОС
+_seeded: np.random.Generator | None = None
+
+
+def seed(value: int | None) -> None:
+    """Фиксирует генератор для вызовов без rng; None возвращает энтропию ОС."""
+    global _seeded
+    _seeded = None if value is None else np.random.default_rng(value)
+
+
+def _rng(rng: np.random.Generator | None) -> np.random.Generator:
+    if rng is not None:
+        return rng
+    if _seeded is not None:
+        return _seeded
+    return np.random.default_rng()
+
+
+def _genders(n: int, gender: str | None, rng: np.random.Generator) -> np.ndarray:
+    if gender in ("male", "female"):
+        return np.full(n, gender == "male")
+    return rng.random(n) < 0.5
+
+
+def ids(n: int, start: int = 1) -> np.ndarray:
+    return np.arange(start, start + n, dtype=np.int64)
+
+
+def genders(
+    n: int, male_share: float = 0.5, rng: np.random.Generator | None = None
+) -> np.ndarray:
+    """Массив "М"/"Ж"."""
+    return np.where(_rng(rng).random(n) < male_share, "М", "Ж")
+
+
+def names(
+    n: int,
+    gender: str | Sequence[str] | np.ndarray | None = None,
+    patronymic: bool = True,
+    rng: np.random.Generator | None = None,
+) -> np.ndarray:
+    """ФИО с согласованием по полу.
+
+    gender: "male", "female", None (случайно) или массив "М"/"Ж" той же длины.
+    """
+    rng = _rng(rng)
+    if gender is None or isinstance(gender, str):
+        male = _genders(n, gender, rng)
+    else:
+        male = np.asarray(gender) == "М"
+
+    first = np.where(
+        male,
+        MALE_FIRST[rng.integers(0, len(MALE_FIRST), n)],
+        FEMALE_FIRST[rng.integers(0, len(FEMALE_FIRST), n)],
+    )
+    last = LAST_NAMES[rng.integers(0, len(LAST_NAMES), n)]
+    last = np.where(male, last, np.char.add(last, "а"))
+    result = np.char.add(np.char.add(last, " "), first)
+    if patronymic:
+        stems = PATRONYMIC_STEMS[rng.integers(0, len(PATRONYMIC_STEMS), n)]
+        middle = np.char.add(stems, np.where(male, "ич", "на"))
+        result = np.char.add(np.char.add(result, " "), middle)
+    return result.astype(object)
+
+
+def _concat(*parts: Any) -> np.ndarray:
+    result = parts[0]
+    for part in parts[1:]:
+        result = np.char.add(result, part)
+    return np.asarray(result)
+
+
+def emails(
+    n: int,
+    names: Sequence[str] | np.ndarray | None = None,
+    domains: Sequence[str] = EMAIL_DOMAINS,
+    rng: np.random.Generator | None = None,
+) -> np.ndarray:
+    """Email-адреса. Если переданы ФИО, адрес строится из имени и фамилии."""
+    rng = _rng(rng)
+    if names is None:
+        local = _LATIN_LAST[rng.integers(0, len(LAST_NAMES), n)]
+    else:
+        # транслитерируем только уникальные ФИО: их намного меньше, чем строк
+        codes, uniques = pd.factorize(pd.Series(names, dtype=object))
+        parts = pd.Series(uniques, dtype=object).str.split(" ", n=2, expand=True)
+        latin = transliterate(
+            (parts[1].fillna("") + " " + parts[0].fillna("")).to_numpy()
+        ).astype(str)
+        local = latin[codes]
+    suffix = _DIGITS_4[rng.integers(1, 10_000, n)]
+    domain = np.asarray(domains)[rng.integers(0, len(domains), n)]
+    return _concat(local, suffix, "@", domain).astype(object)
+
+
+def phones(n: int, rng: np.random.Generator | None = None) -> np.ndarray:
+    """Мобильные номера в формате +7 9XX XXX-XX-XX."""
+    rng = _rng(rng)
+    return _concat(
+        "+7 9",
+        _DIGITS_2[rng.integers(0, 100, n)],
+        " ",
+        _DIGITS_3[rng.integers(0, 1000, n)],
+        "-",
+        _DIGITS_2[rng.integers(0, 100, n)],
+        "-",
+        _DIGITS_2[rng.integers(0, 100, n)],
+    ).astype(object)
+
+
+def cities(
+    n: int,
+    weights: Sequence[float] | None = None,
+    rng: np.random.Generator | None = None,
+) -> np.ndarray:
+    return categorical(n, list(CITIES), weights, rng)
+
+
+def dates(
+    n: int,
+    start: str = "2020-01-01",
+    end: str = "2024-12-31",
+    with_time: bool = False,
+    rng: np.random.Generator | None = None,
+) -> np.ndarray:
+    """Равномерно распределённые даты (datetime64) в [start, end]."""
+    unit = "s" if with_time else "D"
+    dtype = f"datetime64[{unit}]"
+    lo, hi = np.array([start, end], dtype=dtype).astype(np.int64)
+    values = _rng(rng).integers(lo, hi + 1, n)
+    return values.astype(dtype)
+
+
+def amounts(
+    n: int,
+    mean: float = 1000.0,
+    sigma: float = 0.5,
+    distribution: str = "lognormal",
+    low: float | None = None,
+    high: float | None = None,
+    decimals: int = 2,
+    rng: np.random.Generator | None = None,
+) -> np.ndarray:
+    """Денежные суммы.
+
+    lognormal: медиана около mean, sigma — разброс в логарифмах;
+    normal: среднее mean, стандартное отклонение sigma * mean;
+    uniform: равномерно в [low, high].
+    """
+    rng = _rng(rng)
+    if distribution == "lognormal":
+        values = rng.lognormal(np.log(mean), sigma, n)
+    elif distribution == "normal":
+        values = rng.normal(mean, sigma * mean, n)
+    elif distribution == "uniform":
+        values = rng.uniform(low if low is not None else 0, high or mean * 2, n)
+    else:
+        raise ValueError(f"Неизвестное распределение: {distribution}")
+    if low is not None or high is not None:
+        values = np.clip(values, low, high)
+    return np.round(values, decimals)
+
+
+def integers(
+    n: int, low: int, high: int, rng: np.random.Generator | None = None
+) -> np.ndarray:
+    """Целые числа в [low, high] включительно."""
+    return _rng(rng).integers(low, high + 1, n)
+
+
+def categorical(
+    n: int,
+    categories: Sequence[Any],
+    weights: Sequence[float] | None = None,
+    rng: np.random.Generator | None = None,
+) -> np.ndarray:
+    """Выбор из категорий с заданными весами (нормируются автоматически)."""
+    p = None
+    if weights is not None:
+        w = np.asarray(weights, dtype=float)
+        p = w / w.sum()
+    index = _rng(rng).choice(len(categories), size=n, p=p)
+    return np.asarray(categories, dtype=object)[index]
+
+
+def booleans(
+    n: int, true_share: float = 0.5, rng: np.random.Generator | None = None
+) -> np.ndarray:
+    return _rng(rng).random(n) < true_share
+
+
+def correlated(
+    base: Sequence[float] | np.ndarray,
+    corr: float,
+    mean: float = 0.0,
+    std: float = 1.0,
+    rng: np.random.Generator | None = None,
+) -> np.ndarray:
+    """Нормальная колонка с корреляцией Пирсона около corr к base."""
+    x = np.asarray(base, dtype=float)
+    z = (x - x.mean()) / (x.std() or 1.0)
+    noise = _rng(rng).standard_normal(len(x))
+    result: np.ndarray = mean + std * (corr * z + np.sqrt(1 - corr**2) * noise)
+    return result
+
+
+def inject_outliers(
+    values: Sequence[float] | np.ndarray,
+    fraction: float = 0.01,
+    factor: float = 10.0,
+    rng: np.random.Generator | None = None,
+) -> np.ndarray:
+    """Копия values, где доля fraction значений умножена на factor."""
+    result = np.array(values, dtype=float)
+    mask = _rng(rng).random(len(result)) < fraction
+    result[mask] *= factor
+    return result
+
+
+def inject_missing(
+    values: Sequence[Any] | np.ndarray,
+    fraction: float = 0.1,
+    rng: np.random.Generator | None = None,
+) -> np.ndarray:
+    """Копия values, где доля fraction значений заменена на пропуски."""
+    result = np.array(values, dtype=object)
+    mask = _rng(rng).random(len(result)) < fraction
+    result[mask] = None
+    return result
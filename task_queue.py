@@ -0,0 +1,125 @@
+"""
+Надёжная очередь задач генерации поверх Redis.
+
+Задача лежит в списке pending, её полезная нагрузка — в хэше payloads.
+Воркер забирает задачу атомарно (Lua) и получает аренду (lease) на
+TASK_VISIBILITY_TIMEOUT секунд, которую продлевает, пока работает.
+Подтверждённая (ack) задача удаляется. Если воркер упал и аренда истекла,
+задача возвращается в очередь, а после TASK_MAX_DELIVERIES попыток
+считается «мёртвой».
+"""
+
+import json
+import os
+from typing import Any
+
+import redis
+import redis.asyncio as aioredis
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+QUEUE_NAME = os.getenv("TASK_QUEUE_NAME", "generation")
+VISIBILITY_TIMEOUT = int(os.getenv("TASK_VISIBILITY_TIMEOUT", 300))
+MAX_DELIVERIES = int(os.getenv("TASK_MAX_DELIVERIES", 3))
+
+PENDING_KEY = f"queue:{QUEUE_NAME}:pending"
+LEASES_KEY = f"queue:{QUEUE_NAME}:leases"
+PAYLOADS_KEY = f"queue:{QUEUE_NAME}:payloads"
+DELIVERIES_KEY = f"queue:{QUEUE_NAME}:deliveries"
+
+_RESERVE_LUA = """
+local job_id = redis.call('RPOP', KEYS[1])
+if not job_id then
+    return nil
+end
+local now = redis.call('TIME')
+redis.call('ZADD', KEYS[2], tonumber(now[1]) + tonumber(ARGV[1]), job_id)
+local deliveries = redis.call('HINCRBY', KEYS[4], job_id, 1)
+local payload = redis.call('HGET', KEYS[3], job_id)
+return {job_id, payload or '{}', deliveries}
+"""
+
+_EXTEND_LUA = """
+if redis.call('ZSCORE', KEYS[1], ARGV[1]) then
+    local now = redis.call('TIME')
+    redis.call('ZADD', KEYS[1], tonumber(now[1]) + tonumber(ARGV[2]), ARGV[1])
+    return 1
+end
+return 0
+"""
+
+_REQUEUE_LUA = """
+local now = redis.call('TIME')
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now[1])
+local dead = {}
+for _, job_id in ipairs(expired) do
+    redis.call('ZREM', KEYS[2], job_id)
+    local deliveries = tonumber(redis.call('HGET', KEYS[4], job_id) or '0')
+    if deliveries >= tonumber(ARGV[1]) then
+        redis.call('HDEL', KEYS[3], job_id)
+        redis.call('HDEL', KEYS[4], job_id)
+        table.insert(dead, job_id)
+    else
+        redis.call('RPUSH', KEYS[1], job_id)
+    end
+end
+return {#expired - #dead, dead}
+"""
+
+_KEYS = [PENDING_KEY, LEASES_KEY, PAYLOADS_KEY, DELIVERIES_KEY]
+
+
+async def enqueue(
+    client: aioredis.Redis, task_id: int, payload: dict[str, Any]
+) -> None:
+    """Ставит задачу в очередь (вызывается из API)."""
+    async with client.pipeline(transaction=True) as pipe:
+        pipe.hset(PAYLOADS_KEY, str(task_id), json.dumps(payload))
+        pipe.lpush(PENDING_KEY, str(task_id))
+        await pipe.execute()
+
+
+class TaskQueue:
+    """Сторона воркера: резервирование, продление аренды и подтверждение."""
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        visibility_timeout: int = VISIBILITY_TIMEOUT,
+        max_deliveries: int = MAX_DELIVERIES,
+    ) -> None:
+        self.client = client
+        self.visibility_timeout = visibility_timeout
+        self.max_deliveries = max_deliveries
+        self._reserve = client.register_script(_RESERVE_LUA)
+        self._extend = client.register_script(_EXTEND_LUA)
+        self._requeue = client.register_script(_REQUEUE_LUA)
+
+    def reserve(self) -> dict[str, Any] | None:
+        res = self._reserve(keys=_KEYS, args=[self.visibility_timeout])
+        if not res:
+            return None
+        job_id, payload, deliveries = res
+        return {
+            "task_id": int(job_id),
+            "payload": json.loads(payload),
+            "deliveries": int(deliveries),
+        }
+
+    def extend(self, task_id: int) -> bool:
+        return bool(
+            self._extend(
+                keys=[LEASES_KEY], args=[str(task_id), self.visibility_timeout]
+            )
+        )
+
+    def ack(self, task_id: int) -> None:
+        with self.client.pipeline(transaction=True) as pipe:
+            pipe.zrem(LEASES_KEY, str(task_id))
+            pipe.hdel(PAYLOADS_KEY, str(task_id))
+            pipe.hdel(DELIVERIES_KEY, str(task_id))
+            pipe.execute()
+
+    def requeue_expired(self) -> tuple[int, list[int]]:
+        """Возвращает (сколько задач вернулось в очередь, id «мёртвых» задач)."""
+        requeued, dead = self._requeue(keys=_KEYS, args=[self.max_deliveries])
+        return int(requeued), [int(job_id) for job_id in dead]
@@ -2,38 +2,70 @@ import os
 import sys
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("TASK_QUEUE", "background")
 from unittest.mock import AsyncMock, patch
 
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
 from sqlmodel import Session, SQLModel, create_engine
-from sqlmodel.pool import StaticPool
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from database import get_session
+from auth import clear_auth_cache
+from database import get_async_session, get_session
 from main import app
 
-sqlite_file_name = "database.db"
-sqlite_url = "sqlite:///:memory:"
 
-engine = create_engine(
-    sqlite_url, connect_args={"check_same_thread": False}, poolclass=StaticPool
-)
+@pytest.fixture(name="db_path")
+def db_path_fixture(tmp_path):
+    # файловая БД: её видят и синхронная, и асинхронная сессии
+    return tmp_path / "database.db"
 
 
 @pytest.fixture(name="session")
-def session_fixture():
+def session_fixture(db_path):
+    engine = create_engine(
+        f"sqlite:///{db_path}", connect_args={"check_same_thread": False}
+    )
     SQLModel.metadata.create_all(engine)
     with Session(engine) as session:
         yield session
     SQLModel.metadata.drop_all(engine)
+    engine.dispose()
+
+
+@pytest.fixture(name="async_engine")
+def async_engine_fixture(db_path, session):
+    # NullPool: TestClient открывает свой event loop на каждый запрос
+    return create_async_engine(f"sqlite+aiosqlite:///{db_path}", poolclass=NullPool)
+
+
+@pytest.fixture(name="async_session")
+async def async_session_fixture(async_engine):
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+    await async_engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def reset_auth_cache():
+    clear_auth_cache()
+    yield
+    clear_auth_cache()
 
 
 @pytest.fixture(name="client")
-def client_fixture(session: Session):
+def client_fixture(session: Session, async_engine):
     def get_session_override():
         return session
 
+    async def get_async_session_override():
+        async with AsyncSession(async_engine, expire_on_commit=False) as s:
+            yield s
+
     app.dependency_overrides[get_session] = get_session_override
+    app.dependency_overrides[get_async_session] = get_async_session_override
     client = TestClient(app)
     yield client
     app.dependency_overrides.clear()
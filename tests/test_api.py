@@ -1,7 +1,43 @@
+import asyncio
+import codecs
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
 from unittest.mock import patch
 
+import fakeredis
+import pandas as pd
 import pytest
 from fastapi.testclient import TestClient
+from sqlmodel import select
+
+import auth
+import exports
+import routing
+from main import app
+from models import APIKey, Conversation, GenerationAttempt, GenerationTask, User
+
+ROOT = Path(__file__).resolve().parent.parent
+# второй процесс API: на каждую строку stdin проверяет ключ и печатает 1 или 0
+OTHER_WORKER = """
+import asyncio, sys
+from sqlmodel.ext.asyncio.session import AsyncSession
+import auth
+from database import async_engine
+
+async def main():
+    for _ in sys.stdin:
+        async with AsyncSession(async_engine) as session:
+            user = await auth.resolve_user_by_api_key(sys.argv[1], session)
+        print(int(user is not None), flush=True)
+
+asyncio.run(main())
+"""
 
 
 def test_register_user(client: TestClient):
@@ -46,3 +82,341 @@ def test_create_generation_task(client: TestClient):
 def test_history_protected(client: TestClient):
     response = client.get("/conversations")
     assert response.status_code == 401
+
+
+def test_download_streams_and_caches(client: TestClient, session, tmp_path):
+    token = test_login_user(client)
+    user = session.exec(select(User)).first()
+    source = tmp_path / "result_1.parquet"
+    pd.DataFrame({"name": ["Иван", "Анна"]}).to_parquet(source)
+    task = GenerationTask(
+        prompt="p", file_format="parquet", user_id=user.id, file_path=str(source)
+    )
+    session.add(task)
+    session.commit()
+
+    headers = {"Authorization": f"Bearer {token}"}
+    with patch.object(exports, "STORAGE_DIR", str(tmp_path)):
+        first = client.get(f"/download/{task.id}?format=csv", headers=headers)
+        second = client.get(f"/download/{task.id}?format=csv", headers=headers)
+        bad = client.get(f"/download/{task.id}?format=xml", headers=headers)
+
+    assert first.status_code == 200
+    assert first.content == second.content
+    assert first.content.startswith(codecs.BOM_UTF8 + b"name")
+    assert (tmp_path / f"result_{task.id}.csv").exists()
+    assert bad.status_code == 400
+
+
+def test_task_rows_endpoint(client: TestClient, session, tmp_path):
+    token = test_login_user(client)
+    user = session.exec(select(User)).first()
+    source = tmp_path / "result_1.parquet"
+    pd.DataFrame({"id": range(10), "city": ["Омск", "Уфа"] * 5}).to_parquet(source)
+    task = GenerationTask(
+        prompt="p", file_format="parquet", user_id=user.id, file_path=str(source)
+    )
+    session.add(task)
+    session.commit()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    page = client.get(
+        f"/tasks/{task.id}/rows",
+        params={"offset": 1, "limit": 2, "filter": ["city==Уфа", "id<9"]},
+        headers=headers,
+    ).json()
+    sorted_page = client.get(
+        f"/tasks/{task.id}/rows?limit=2&columns=id&sort=-id", headers=headers
+    ).json()
+    bad = client.get(f"/tasks/{task.id}/rows?columns=age", headers=headers)
+
+    assert (page["total"], page["columns"]) == (4, ["id", "city"])
+    assert page["rows"] == [{"id": 3, "city": "Уфа"}, {"id": 5, "city": "Уфа"}]
+    assert sorted_page["rows"] == [{"id": 9}, {"id": 8}]
+    assert bad.status_code == 400
+
+
+def test_download_validators_and_ranges(client: TestClient, session, tmp_path):
+    token = test_login_user(client)
+    user = session.exec(select(User)).first()
+    source = tmp_path / "result_1.parquet"
+    pd.DataFrame({"id": range(100)}).to_parquet(source)
+    task = GenerationTask(
+        prompt="p", file_format="parquet", user_id=user.id, file_path=str(source)
+    )
+    session.add(task)
+    session.commit()
+    url = f"/download/{task.id}?format=csv"
+    headers = {"Authorization": f"Bearer {token}"}
+
+    with patch.object(exports, "STORAGE_DIR", str(tmp_path)):
+        resumed = client.get(url, headers={**headers, "Range": "bytes=10-"})
+        full = client.get(url, headers=headers)
+        etag = full.headers["etag"]
+        cached = client.get(url, headers={**headers, "If-None-Match": f"W/{etag}"})
+        part = client.get(
+            url, headers={**headers, "Range": "bytes=0-9", "If-Range": etag}
+        )
+        stale = client.get(
+            url, headers={**headers, "Range": "bytes=0-9", "If-Range": '"old"'}
+        )
+        xlsx = client.get(f"/download/{task.id}?format=xlsx", headers=headers)
+
+    assert resumed.status_code == 206
+    assert resumed.content == full.content[10:]
+    assert resumed.headers["etag"] == etag
+    assert full.headers["content-length"] == str(len(full.content))
+    assert (cached.status_code, cached.content) == (304, b"")
+    assert part.status_code == 206
+    assert part.headers["content-range"] == f"bytes 0-9/{len(full.content)}"
+    assert part.content == full.content[:10]
+    assert (stale.status_code, stale.content) == (200, full.content)
+    assert xlsx.headers["etag"] != etag
+
+
+def test_api_key_cached_and_invalidated_on_delete(client: TestClient):
+    token = test_login_user(client)
+    jwt_headers = {"Authorization": f"Bearer {token}"}
+    key = client.post("/api-keys", params={"name": "ci"}, headers=jwt_headers).json()
+    key_headers = {"Authorization": f"Bearer {key['key']}"}
+
+    assert client.get("/tasks/999", headers=key_headers).status_code == 404
+    with patch("auth.AsyncSession.exec") as mock_exec:
+        assert client.get("/tasks/999", headers=key_headers).status_code == 404
+        mock_exec.assert_not_called()
+
+    client.delete(f"/api-keys/{key['id']}", headers=jwt_headers)
+
+    assert client.get("/tasks/999", headers=key_headers).status_code == 401
+
+
+def test_api_key_revoked_in_other_processes(session, db_path):
+    user = User(email="a@b.c", hashed_password="")
+    session.add(user)
+    session.commit()
+    api_key = APIKey(name="ci", key="sk-relav-test", user_id=user.id)
+    session.add(api_key)
+    session.commit()
+
+    server = fakeredis.TcpFakeServer(("127.0.0.1", 0))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    redis_url = f"redis://127.0.0.1:{server.server_address[1]}"
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{db_path}",
+        "REDIS_URL": redis_url,
+        "AUTH_REVOCATION_INTERVAL": "0.2",
+    }
+    worker = subprocess.Popen(
+        [sys.executable, "-c", OTHER_WORKER, api_key.key],
+        cwd=ROOT,
+        env=env,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+
+    def resolved() -> str:
+        assert worker.stdin and worker.stdout
+        worker.stdin.write("\n")
+        worker.stdin.flush()
+        line: str = worker.stdout.readline()
+        return line.strip()
+
+    try:
+        assert resolved() == "1"
+        # ключ удалён в БД, но другой процесс пока отвечает из своего кэша
+        session.delete(api_key)
+        session.commit()
+        assert resolved() == "1"
+
+        with (
+            patch.object(auth, "REDIS_URL", redis_url),
+            patch.object(auth, "_redis", None),
+        ):
+            asyncio.run(auth.invalidate_api_key("sk-relav-test"))
+        time.sleep(0.3)
+        assert resolved() == "0"
+    finally:
+        worker.kill()
+        worker.wait()
+        server.shutdown()
+        server.server_close()
+
+
+def test_jwt_skips_api_key_lookup(client: TestClient):
+    token = test_login_user(client)
+
+    with patch("auth.resolve_user_by_api_key") as mock_key_lookup:
+        response = client.get(
+            "/tasks/999", headers={"Authorization": f"Bearer {token}"}
+        )
+
+    assert response.status_code == 404
+    mock_key_lookup.assert_not_called()
+
+
+def test_conversation_endpoints_use_async_session(client: TestClient, session):
+    token = test_login_user(client)
+    user = session.exec(select(User)).first()
+    chat = Conversation(title="chat", user_id=user.id)
+    session.add(chat)
+    session.commit()
+    session.add(
+        GenerationTask(prompt="p", file_format="parquet", conversation_id=chat.id)
+    )
+    session.commit()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    chats = client.get("/conversations", headers=headers).json()
+    history = client.get(f"/conversations/{chat.id}", headers=headers).json()
+    deleted = client.delete(f"/history/{chat.id}", headers=headers)
+
+    assert [c["title"] for c in chats] == ["chat"]
+    assert [t["prompt"] for t in history] == ["p"]
+    assert deleted.status_code == 200
+    assert client.get("/conversations", headers=headers).json() == []
+
+
+def test_conversations_keyset_pagination(client: TestClient, session):
+    token = test_login_user(client)
+    user = session.exec(select(User)).first()
+    same_time = datetime(2024, 1, 1)
+    for i in range(5):
+        session.add(Conversation(title=f"c{i}", user_id=user.id, created_at=same_time))
+    session.commit()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    titles, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/conversations", params=params, headers=headers)
+        titles += [c["title"] for c in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    assert titles == ["c4", "c3", "c2", "c1", "c0"]
+    bad = client.get("/conversations", params={"cursor": "???"}, headers=headers)
+    assert bad.status_code == 400
+
+
+def test_history_is_summary_and_code_on_demand(client: TestClient, session):
+    token = test_login_user(client)
+    user = session.exec(select(User)).first()
+    chat = Conversation(title="chat", user_id=user.id)
+    session.add(chat)
+    session.commit()
+    task = GenerationTask(
+        prompt="p",
+        file_format="parquet",
+        conversation_id=chat.id,
+        user_id=user.id,
+        generated_code="print(1)",
+        preview_data=[{"a": 1}],
+    )
+    session.add(task)
+    session.commit()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    history = client.get(f"/conversations/{chat.id}", headers=headers).json()
+    code = client.get(f"/tasks/{task.id}/code", headers=headers).json()
+
+    assert history[0]["id"] == task.id
+    assert "generated_code" not in history[0]
+    assert "preview_data" not in history[0]
+    assert code == {"id": task.id, "generated_code": "print(1)"}
+
+
+def test_task_status_reads_progress_snapshot(client: TestClient, session):
+    token = test_login_user(client)
+    user = session.exec(select(User)).first()
+    task = GenerationTask(
+        prompt="p", file_format="parquet", user_id=user.id, status="processing"
+    )
+    session.add(task)
+    session.commit()
+    server = fakeredis.FakeServer()
+    redis_client = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    event = {
+        "task_id": task.id,
+        "status": "processing",
+        "progress": 70,
+        "message": "run",
+    }
+
+    with patch.object(app.state, "redis", redis_client, create=True):
+        fakeredis.FakeRedis(server=server).set(
+            f"progress:last:{task.id}", json.dumps(event)
+        )
+        response = client.get(
+            f"/tasks/{task.id}", headers={"Authorization": f"Bearer {token}"}
+        )
+
+    assert response.json()["progress"] == 70
+    assert response.json()["status_message"] == "run"
+
+
+def test_task_profile_endpoint(client: TestClient, session):
+    token = test_login_user(client)
+    user = session.exec(select(User)).first()
+    profile = {"rows": 2, "columns": [{"name": "a", "dtype": "int64", "nulls": 0}]}
+    task = GenerationTask(
+        prompt="p", file_format="parquet", user_id=user.id, data_profile=profile
+    )
+    empty = GenerationTask(prompt="p", file_format="parquet", user_id=user.id)
+    session.add_all([task, empty])
+    session.commit()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = client.get(f"/tasks/{task.id}/profile", headers=headers)
+    missing = client.get(f"/tasks/{empty.id}/profile", headers=headers)
+
+    assert response.status_code == 200
+    assert response.json() == {"id": task.id, **profile}
+    assert missing.status_code == 404
+
+
+def test_task_attempts_endpoint(client: TestClient, session):
+    token = test_login_user(client)
+    user = session.exec(select(User)).first()
+    task = GenerationTask(prompt="p", file_format="parquet", user_id=user.id)
+    session.add(task)
+    session.commit()
+    session.add(
+        GenerationAttempt(
+            task_id=task.id, attempt=1, kind="generate", model="m", peak_rss_kb=10
+        )
+    )
+    session.commit()
+
+    response = client.get(
+        f"/tasks/{task.id}/attempts", headers={"Authorization": f"Bearer {token}"}
+    )
+
+    assert response.status_code == 200
+    assert [(a["kind"], a["peak_rss_kb"]) for a in response.json()] == [
+        ("generate", 10)
+    ]
+
+
+def test_model_stats_endpoint(client: TestClient):
+    token = test_login_user(client)
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+
+    with patch("routing._get_client", return_value=redis_client):
+        attempt = {"kind": "generate", "success": True, "llm_latency_ms": 500}
+        model = routing.MODEL_CASCADE[0]
+        routing.record("Транзакции по картам", [{**attempt, "model": model}])
+        response = client.get(
+            "/models/stats", headers={"Authorization": f"Bearer {token}"}
+        )
+
+    assert response.status_code == 200
+    stats = response.json()["categories"]
+    assert stats["finance"][model] == {
+        "samples": 1,
+        "success_rate": 1.0,
+        "latency_ms": 500.0,
+    }
+    assert stats["people"][model]["samples"] == 0
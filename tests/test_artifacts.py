@@ -0,0 +1,61 @@
+from unittest.mock import patch
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+import artifacts
+
+
+@pytest.fixture
+def parquet_path(tmp_path):
+    path = tmp_path / "result_1.parquet"
+    df = pd.DataFrame({"id": range(12), "name": [f"user{i}" for i in range(12)]})
+    df.to_parquet(path, row_group_size=5)
+    return str(path)
+
+
+def test_metadata_without_full_read(parquet_path):
+    assert artifacts.row_count(parquet_path) == 12
+    assert artifacts.schema(parquet_path) == {"id": "int64", "name": "string"}
+
+
+def test_head_and_batches(parquet_path):
+    head = artifacts.head(parquet_path, 3)
+    frames = list(artifacts.iter_frames(parquet_path, batch_rows=5))
+
+    assert list(head["id"]) == [0, 1, 2]
+    assert [len(f) for f in frames] == [5, 5, 2]
+    assert pd.concat(frames, ignore_index=True).equals(artifacts.load(parquet_path))
+
+
+def test_read_rows_reads_only_covering_row_groups(parquet_path):
+    iter_batches = pq.ParquetFile.iter_batches
+    with patch.object(
+        pq.ParquetFile, "iter_batches", autospec=True, side_effect=iter_batches
+    ) as spy:
+        page, total = artifacts.read_rows(parquet_path, 4, 3, columns=["id"])
+
+    assert total == 12
+    assert artifacts.records(page) == [{"id": 4}, {"id": 5}, {"id": 6}]
+    assert spy.call_args.kwargs["row_groups"] == [0, 1]
+    assert artifacts.read_rows(parquet_path, 20, 5)[0].num_rows == 0
+
+
+@pytest.mark.parametrize("pickled", [False, True])
+def test_read_rows_filters_and_sorts(parquet_path, tmp_path, pickled):
+    path = parquet_path
+    if pickled:
+        path = str(tmp_path / "result_1.pkl")
+        artifacts.load(parquet_path).to_pickle(path)
+
+    page, total = artifacts.read_rows(
+        path, 1, 2, columns=["name"], filters=["id>=3", "id != 10"], sort="-id"
+    )
+
+    assert total == 8
+    assert artifacts.records(page) == [{"name": "user9"}, {"name": "user8"}]
+    with pytest.raises(ValueError):
+        artifacts.read_rows(path, 0, 5, filters=["age>3"])
+    with pytest.raises(ValueError):
+        artifacts.read_rows(path, 0, 5, filters=["id>abc"])
@@ -1,6 +1,21 @@
-from unittest.mock import MagicMock, patch
+import asyncio
+import json
+import re
+from unittest.mock import AsyncMock, MagicMock, patch
 
-from core import generate_and_run
+import pandas as pd
+import pytest
+
+import code_cache
+import core
+from core import CANDIDATE_REJECTED, agenerate_and_run, generate_and_run
+
+
+@pytest.fixture(autouse=True)
+def clear_code_cache():
+    code_cache.clear()
+    yield
+    code_cache.clear()
 
 
 @patch("core.client.models.generate_content")
@@ -27,7 +42,7 @@ def test_generate_and_run_success(
     )
 
     assert result["status"] == "success"
-    assert result["file"] == "storage/result_1.pkl"
+    assert result["file"] == "storage/result_1.parquet"
 
     mock_gemini.assert_called_once()
 
@@ -55,3 +70,382 @@ def test_generate_and_run_docker_fail(mock_subprocess, mock_gemini):
 
     assert mock_gemini.call_count == 3
     assert result["status"] == "error"
+
+
+@patch("core.client.aio.models.generate_content", new_callable=AsyncMock)
+@patch("core.asyncio.create_subprocess_exec", new_callable=AsyncMock)
+@patch("core.os.path.exists")
+@patch("core.os.path.getsize")
+async def test_agenerate_and_run_self_heals(
+    mock_getsize, mock_exists, mock_exec, mock_gemini
+):
+    mock_response = MagicMock()
+    mock_response.text = "import pandas as pd\n# code..."
+    mock_gemini.return_value = mock_response
+
+    failed = MagicMock(returncode=1)
+    failed.communicate = AsyncMock(return_value=(b"", b"NameError"))
+    succeeded = MagicMock(returncode=0)
+    succeeded.communicate = AsyncMock(return_value=(b"", b""))
+    mock_exec.side_effect = [failed, succeeded]
+
+    mock_exists.return_value = True
+    mock_getsize.return_value = 1000
+
+    progress = []
+
+    async def on_progress(msg, percent):
+        progress.append(percent)
+
+    result = await agenerate_and_run("Test query", 1, on_progress=on_progress)
+
+    assert result["status"] == "success"
+    assert mock_gemini.await_count == 2
+    assert "NameError" in mock_gemini.await_args.kwargs["contents"]
+    assert progress[-1] == 100
+    assert "synthgen-env" in mock_exec.call_args.args
+
+
+def fake_gemini(model, contents):
+    path = re.search(r"storage/result_\d+\.parquet", contents).group(0)
+    return MagicMock(text=f"import pandas as pd\ndf.to_parquet('{path}')")
+
+
+@patch("core.client.models.generate_content")
+@patch("core.subprocess.run")
+@patch("core.os.path.exists")
+@patch("core.os.path.getsize")
+def test_code_cache_skips_llm_for_same_prompt(
+    mock_getsize, mock_exists, mock_subprocess, mock_gemini
+):
+    mock_gemini.side_effect = fake_gemini
+    mock_subprocess.return_value = MagicMock(returncode=0)
+    mock_exists.return_value = True
+    mock_getsize.return_value = 1000
+
+    generate_and_run("500 bank transactions", task_id=1)
+    result = generate_and_run("  500 Bank   transactions. ", task_id=2)
+
+    assert mock_gemini.call_count == 1
+    assert result["status"] == "success"
+    assert "storage/result_2.parquet" in result["code"]
+    assert "storage/result_1.parquet" not in result["code"]
+    assert code_cache.stats()["hits"] == 1
+
+
+@patch("core.client.models.generate_content")
+@patch("core.subprocess.run")
+@patch("core.os.path.exists")
+@patch("core.os.path.getsize")
+def test_code_cache_shared_across_routed_models(
+    mock_getsize, mock_exists, mock_subprocess, mock_gemini
+):
+    mock_gemini.side_effect = fake_gemini
+    mock_subprocess.return_value = MagicMock(returncode=0)
+    mock_exists.return_value = True
+    mock_getsize.return_value = 1000
+
+    generate_and_run("query", 1, model_name="flash-lite", requested_model="auto")
+    result = generate_and_run("query", 2, model_name="pro", requested_model="auto")
+
+    assert mock_gemini.call_count == 1
+    assert result["model"] == "flash-lite"
+    assert result["attempts"][0]["kind"] == "cache"
+    assert result["attempts"][0]["model"] == "flash-lite"
+
+
+@patch("core.client.models.generate_content")
+@patch("core.subprocess.run")
+@patch("core.os.path.exists")
+@patch("core.os.path.getsize")
+def test_code_cache_invalidated_on_failure(
+    mock_getsize, mock_exists, mock_subprocess, mock_gemini
+):
+    mock_gemini.side_effect = fake_gemini
+    mock_exists.return_value = True
+    mock_getsize.return_value = 1000
+
+    mock_subprocess.return_value = MagicMock(returncode=0)
+    generate_and_run("query", task_id=1)
+
+    mock_subprocess.side_effect = [
+        MagicMock(returncode=1, stderr="boom"),
+        MagicMock(returncode=0),
+    ]
+    result = generate_and_run("query", task_id=2)
+
+    assert result["status"] == "success"
+    assert mock_gemini.call_count == 2
+    assert code_cache.stats()["size"] == 1
+
+
+@patch("core.client.models.generate_content")
+@patch("core.subprocess.run")
+@patch("core.os.path.exists")
+@patch("core.os.path.getsize")
+def test_attempt_telemetry_recorded(
+    mock_getsize, mock_exists, mock_subprocess, mock_gemini
+):
+    usage = MagicMock(prompt_token_count=120, candidates_token_count=80)
+    mock_gemini.return_value = MagicMock(
+        text="df.to_parquet('storage/result_1.parquet')", usage_metadata=usage
+    )
+    report = '{"returncode": 0, "cpu_ms": 250, "peak_rss_kb": 51200}'
+    mock_subprocess.side_effect = [
+        MagicMock(returncode=1, stderr="boom", stdout=""),
+        MagicMock(returncode=0, stdout=report),
+    ]
+    mock_exists.return_value = True
+    mock_getsize.return_value = 4096
+
+    result = generate_and_run("query", task_id=1)
+
+    first, second = result["attempts"]
+    assert (first["kind"], first["success"], first["error"]) == (
+        "generate",
+        False,
+        "boom",
+    )
+    assert second["kind"] == "fix" and second["success"]
+    assert second["prompt_tokens"] == 120 and second["output_tokens"] == 80
+    assert second["sandbox_cpu_ms"] == 250 and second["peak_rss_kb"] == 51200
+    assert second["output_bytes"] == 4096
+    assert second["llm_latency_ms"] >= 0 and second["sandbox_wall_ms"] >= 0
+
+
+SLOW_CODE = "df = slow()\ndf.to_parquet('storage/result_1.parquet')"
+FAST_CODE = "df = fast()\ndf.to_parquet('storage/result_1.parquet')"
+
+
+def fake_profiled_run(frames):
+    """subprocess.run, который пишет заданные DataFrame и отчёт с профилем."""
+    runs = iter(frames)
+
+    def run(command, **kwargs):
+        assert "--profile" in command
+        path, frame, wall_ms = next(runs)
+        frame.to_parquet(path, index=False)
+        report = {
+            "returncode": 0,
+            "wall_ms": wall_ms,
+            "profile": {"samples": 100, "lines": [[1, 90]]},
+        }
+        return MagicMock(returncode=0, stdout=json.dumps(report), stderr="")
+
+    return run
+
+
+@pytest.mark.parametrize(
+    "candidate, kept",
+    [
+        (pd.DataFrame({"a": [7, 8]}), FAST_CODE),
+        (pd.DataFrame({"a": ["7", "8"]}), SLOW_CODE),
+    ],
+)
+@patch("core.client.models.generate_content")
+def test_slow_script_optimized_by_profile(
+    mock_gemini, candidate, kept, tmp_path, monkeypatch
+):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "storage").mkdir()
+    mock_gemini.side_effect = [MagicMock(text=SLOW_CODE), MagicMock(text=FAST_CODE)]
+    frames = [
+        ("storage/result_1.parquet", pd.DataFrame({"a": [1, 2]}), 50_000),
+        ("storage/result_1.candidate.parquet", candidate, 1_000),
+    ]
+
+    with (
+        patch("core.SANDBOX_PROFILE", True),
+        patch("core.PERF_BUDGET_SECONDS", 10),
+        patch("core.subprocess.run", side_effect=fake_profiled_run(frames)),
+    ):
+        result = generate_and_run("query", task_id=1)
+
+    assert result["status"] == "success"
+    assert result["code"] == kept
+    generate, optimize = result["attempts"]
+    assert generate["kind"] == "generate" and "profile" not in generate
+    assert optimize["kind"] == "optimize"
+    assert optimize["success"] == (kept == FAST_CODE)
+    # отклонённая версия помечается, чтобы не портить статистику модели
+    assert optimize.get("error", "").startswith(CANDIDATE_REJECTED) == (
+        kept == SLOW_CODE
+    )
+    assert "строка 1 (90% времени): df = slow()" in str(mock_gemini.call_args)
+    assert not (tmp_path / "storage/result_1.candidate.parquet").exists()
+    stored = pd.read_parquet(tmp_path / "storage/result_1.parquet")
+    assert stored["a"].tolist() == ([7, 8] if kept == FAST_CODE else [1, 2])
+
+
+GOOD_CODE = "import pandas as pd\n# good\ndf.to_parquet('storage/result_1.parquet')"
+BAD_CODE = "import pandas as pd\n# bad\ndf.to_parquet('storage/result_1.parquet')"
+
+
+def run_script(code):
+    """Исполняет "скрипт" из stdin docker: хороший пишет Parquet, плохой падает."""
+    if "# good" not in code:
+        return False
+    path = re.search(r"to_parquet\('(.+?)'", code).group(1)
+    pd.DataFrame({"a": [1, 2]}).to_parquet(path, index=False)
+    return True
+
+
+@patch("core.client.models.generate_content")
+def test_speculative_candidates_first_success_wins(mock_gemini, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "storage").mkdir()
+    mock_gemini.side_effect = [MagicMock(text=BAD_CODE), MagicMock(text=GOOD_CODE)]
+
+    def run(command, **kwargs):
+        assert "--once" in command and "-" in command
+        ok = run_script(kwargs["input"])
+        return MagicMock(returncode=0 if ok else 1, stdout="", stderr="boom")
+
+    with patch("core.subprocess.run", side_effect=run):
+        result = generate_and_run("query", task_id=1, candidates=2)
+
+    assert result["status"] == "success"
+    assert result["code"] == GOOD_CODE
+    assert result["row_count"] == 2
+    assert [a["kind"] for a in result["attempts"]] == ["speculate", "speculate"]
+    assert sorted(a["success"] for a in result["attempts"]) == [False, True]
+    assert sorted(p.name for p in (tmp_path / "storage").iterdir()) == [
+        "result_1.parquet"
+    ]
+
+
+@patch("sandbox._remove_container")
+@patch("core.client.aio.models.generate_content", new_callable=AsyncMock)
+async def test_aspeculate_cancels_slower_candidates(
+    mock_gemini, mock_remove, tmp_path, monkeypatch
+):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "storage").mkdir()
+    mock_gemini.side_effect = [MagicMock(text=BAD_CODE), MagicMock(text=GOOD_CODE)]
+
+    async def create_process(*command, **kwargs):
+        proc = MagicMock(returncode=0, wait=AsyncMock())
+
+        async def communicate(code):
+            if not run_script(code.decode()):
+                await asyncio.sleep(30)
+            return b"", b""
+
+        proc.communicate = communicate
+        return proc
+
+    with patch("core.asyncio.create_subprocess_exec", side_effect=create_process):
+        result = await agenerate_and_run("query", task_id=1, candidates=2)
+
+    assert result["status"] == "success"
+    assert result["code"] == GOOD_CODE
+    loser = next(a for a in result["attempts"] if not a["success"])
+    assert loser["error"] == core.SPECULATION_CANCELLED
+    mock_remove.assert_called_once()
+    assert not (tmp_path / "storage/result_1.spec0.parquet").exists()
+
+
+DELTA_CODE = """import pandas as pd
+df = pd.read_parquet('storage/result_1.parquet')
+df['b'] = df['a'] * 2
+df.to_parquet('storage/result_2.parquet', index=False)"""
+
+
+@patch("core.client.models.generate_content")
+def test_modification_transforms_previous_result(mock_gemini, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "storage").mkdir()
+    pd.DataFrame({"a": [1, 2]}).to_parquet("storage/result_1.parquet", index=False)
+    mock_gemini.return_value = MagicMock(text=DELTA_CODE)
+
+    def run(command, **kwargs):
+        exec(kwargs["input"], {})
+        return MagicMock(returncode=0, stdout="", stderr="")
+
+    with patch("core.subprocess.run", side_effect=run) as mock_run:
+        result = generate_and_run(
+            "добавь колонку b",
+            task_id=2,
+            previous_code="old code",
+            previous_file="storage/result_1.parquet",
+        )
+
+    assert result["status"] == "success"
+    assert [a["kind"] for a in result["attempts"]] == ["delta"]
+    prompt = mock_gemini.call_args.kwargs["contents"]
+    assert "РЕЖИМ ПРЕОБРАЗОВАНИЯ" in prompt and "a (int64)" in prompt
+    mount = f"{tmp_path}/storage/result_1.parquet:/app/storage/result_1.parquet:ro"
+    assert mount in mock_run.call_args.args[0]
+    stored = pd.read_parquet(tmp_path / "storage/result_2.parquet")
+    assert stored["b"].tolist() == [2, 4]
+
+
+@patch("core.client.models.generate_content")
+def test_full_regeneration_after_delta_is_sharded(mock_gemini, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("sharding.SHARD_MAX", 4)
+    (tmp_path / "storage").mkdir()
+    pd.DataFrame({"a": [1, 2]}).to_parquet("storage/result_1.parquet", index=False)
+    mock_gemini.return_value = MagicMock(
+        text="import pandas as pd\nN_ROWS = 10_000_000\n"
+        "df = pd.DataFrame({'a': range(N_ROWS)})\n"
+        "df.to_parquet('storage/result_2.parquet', index=False)"
+    )
+
+    with patch("core.run_in_sandbox", return_value=(False, "boom")) as mock_run:
+        generate_and_run(
+            "сделай 10 миллионов строк",
+            task_id=2,
+            previous_code="old code",
+            previous_file="storage/result_1.parquet",
+        )
+
+    first_attempt = mock_run.call_args_list[:4]
+    assert [c.kwargs["shard"] for c in first_attempt] == [0, 1, 2, 3]
+    assert all(c.kwargs.get("inputs") is None for c in mock_run.call_args_list)
+
+
+@patch("core.client.models.generate_content")
+@patch("core.subprocess.run")
+@patch("core.os.path.exists")
+@patch("core.os.path.getsize")
+def test_failed_attempts_escalate_to_stronger_model(
+    mock_getsize, mock_exists, mock_subprocess, mock_gemini
+):
+    mock_gemini.return_value = MagicMock(text="import pandas as pd")
+    mock_subprocess.side_effect = [
+        MagicMock(returncode=1, stderr="boom", stdout=""),
+        MagicMock(returncode=0, stdout=""),
+    ]
+    mock_exists.return_value = True
+    mock_getsize.return_value = 1000
+
+    result = generate_and_run(
+        "query", task_id=1, model_name="lite", escalation=["flash"]
+    )
+
+    assert result["status"] == "success"
+    assert result["model"] == "flash"
+    assert [c.kwargs["model"] for c in mock_gemini.call_args_list] == [
+        "lite",
+        "flash",
+    ]
+    assert [a["model"] for a in result["attempts"]] == ["lite", "flash"]
+
+
+def test_collect_result_ignores_profile_that_disagrees_with_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "storage").mkdir()
+    path = core.result_path(3)
+    pd.DataFrame({"a": [1, 2, 3]}).to_parquet(path, index=False)
+    # скрипт отфильтровал df уже после сохранения
+    stale = {"rows": 1, "columns": [], "preview": [{"a": "1"}]}
+    with open(core.summary_path(path), "w", encoding="utf-8") as f:
+        json.dump(stale, f)
+
+    result = core.collect_result("code", 3)
+
+    assert result["row_count"] == 3
+    assert len(result["preview"]) == 3
+    assert result["dataset_profile"]["rows"] == 3
+    assert result["dataset_profile"]["columns"][0]["max"] == 3
@@ -0,0 +1,63 @@
+from sqlalchemy import inspect, text
+from sqlmodel import SQLModel, create_engine
+
+import models  # noqa: F401  (регистрирует таблицы в метаданных)
+from database import (
+    add_missing_columns,
+    add_missing_indexes,
+    async_database_url,
+    pool_options,
+)
+
+
+def test_async_database_url_swaps_driver():
+    assert (
+        async_database_url("postgresql://u:p@localhost:5432/db")
+        == "postgresql+asyncpg://u:p@localhost:5432/db"
+    )
+    assert async_database_url("sqlite:///./test.db") == "sqlite+aiosqlite:///./test.db"
+    assert (
+        async_database_url("postgresql+asyncpg://h/db") == "postgresql+asyncpg://h/db"
+    )
+
+
+def test_pool_options_skip_sqlite():
+    assert pool_options("sqlite:///./test.db") == {}
+    options = pool_options("postgresql://h/db")
+    assert options["pool_pre_ping"] is True
+    assert {"pool_size", "max_overflow", "pool_recycle"} <= options.keys()
+
+
+def test_add_missing_columns_upgrades_existing_table(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/old.db")
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE generationtask DROP COLUMN data_profile"))
+
+    assert add_missing_columns(engine) == ["generationtask.data_profile"]
+    columns = {c["name"] for c in inspect(engine).get_columns("generationtask")}
+    assert "data_profile" in columns
+    assert add_missing_columns(engine) == []
+
+
+def test_add_missing_indexes_upgrades_existing_tables(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/old.db")
+    SQLModel.metadata.create_all(engine)
+    # схема до составных индексов: таблицы есть, индексов пагинации нет
+    expected = [
+        "ix_conversation_user_created",
+        "ix_generationtask_user_created",
+        "ix_generationtask_conversation_created",
+    ]
+    with engine.begin() as conn:
+        for name in expected:
+            conn.execute(text(f"DROP INDEX {name}"))
+
+    assert sorted(add_missing_indexes(engine)) == sorted(expected)
+    indexes = {
+        i["name"]
+        for table in ("conversation", "generationtask")
+        for i in inspect(engine).get_indexes(table)
+    }
+    assert set(expected) <= indexes
+    assert add_missing_indexes(engine) == []
@@ -0,0 +1,57 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+import dataprofile
+
+
+def frame(start: int, n: int) -> pd.DataFrame:
+    rng = np.random.default_rng(start)
+    return pd.DataFrame(
+        {
+            "id": range(start, start + n),
+            "amount": rng.normal(100, 10, n),
+            "city": rng.choice(["Москва", "Казань", "Омск"], n),
+            "born": pd.date_range("2000-01-01", periods=n, freq="D"),
+            "score": [None if i % 4 == 0 else float(i) for i in range(n)],
+        }
+    )
+
+
+def test_compute_profile_is_compact_json():
+    profile = dataprofile.compute(frame(1, 40))
+    columns = {column["name"]: column for column in profile["columns"]}
+
+    assert profile["rows"] == 40
+    assert len(profile["preview"]) == dataprofile.PREVIEW_ROWS
+    assert profile["preview"][0]["score"] == ""
+    assert columns["id"]["min"] == 1 and columns["id"]["max"] == 40
+    assert sum(columns["amount"]["histogram"]["counts"]) == 40
+    assert columns["score"]["nulls"] == 10
+    assert columns["city"]["unique"] == 3
+    assert sum(count for _, count in columns["city"]["top"]) == 40
+    assert columns["born"]["min"] == "2000-01-01T00:00:00"
+    assert json.loads(json.dumps(profile)) == profile
+
+
+def test_merge_matches_profile_of_whole_dataset():
+    parts = [frame(1, 30), frame(1, 50)]
+    whole = pd.concat([parts[0], parts[1].assign(id=parts[1]["id"] + 30)])
+
+    merged = dataprofile.merge(
+        [dataprofile.compute(part) for part in parts], [0, 30], ["id"]
+    )
+    expected = dataprofile.compute(whole)
+
+    assert merged["rows"] == expected["rows"] == 80
+    for got, want in zip(merged["columns"], expected["columns"], strict=True):
+        assert got["nulls"] == want["nulls"]
+        if "mean" in want:
+            assert np.isclose(got["mean"], want["mean"])
+        assert (got.get("min"), got.get("max")) == (want.get("min"), want.get("max"))
+        if "histogram" in want:
+            assert sum(got["histogram"]["counts"]) == sum(want["histogram"]["counts"])
+    assert merged["columns"][0]["max"] == 80
+    # нижняя граница: в каждом шарде все три города
+    assert merged["columns"][2]["unique"] == 3
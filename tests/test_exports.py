@@ -0,0 +1,134 @@
+import os
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+import benchmarks
+import exports
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(exports, "STORAGE_DIR", str(tmp_path))
+    source = tmp_path / "result_1.parquet"
+    pd.DataFrame({"name": ["Иван", "Анна"], "amount": [10.5, None]}).to_parquet(source)
+    return tmp_path
+
+
+def test_export_is_built_once(storage):
+    source = str(storage / "result_1.parquet")
+    path = exports.get_export(1, source, "csv")
+
+    with patch("exports.artifacts.iter_frames") as mock_read:
+        assert exports.get_export(1, source, "csv") == path
+        mock_read.assert_not_called()
+
+    with open(path, encoding="utf-8-sig") as f:
+        assert f.readline().strip() == "name,amount"
+
+
+def test_export_rebuilt_when_source_changes(storage):
+    source = str(storage / "result_1.parquet")
+    path = exports.get_export(1, source, "json")
+    os.utime(path, (0, 0))
+
+    exports.get_export(1, source, "json")
+
+    assert os.path.getmtime(path) > 0
+
+
+@pytest.mark.parametrize("fmt", ["csv", "json", "xlsx"])
+def test_export_formats(storage, fmt):
+    path = exports.get_export(1, str(storage / "result_1.parquet"), fmt)
+    assert path.endswith(f"result_1.{fmt}")
+    assert os.path.getsize(path) > 0
+
+
+def test_quota_evicts_least_recently_used(storage, monkeypatch):
+    source = str(storage / "result_1.parquet")
+    old = exports.get_export(1, source, "csv")
+    os.utime(old, (1, 1))
+    monkeypatch.setattr(exports, "EXPORT_CACHE_MAX_BYTES", os.path.getsize(old) + 1)
+
+    new = exports.get_export(1, source, "json")
+
+    assert os.path.exists(new)
+    assert not os.path.exists(old)
+
+
+def test_quota_keeps_dataset_profiles(storage, monkeypatch):
+    profile = storage / "result_1.parquet.summary.json"
+    profile.write_text("{}")
+    os.utime(profile, (1, 1))
+    monkeypatch.setattr(exports, "EXPORT_CACHE_MAX_BYTES", 0)
+
+    exports.get_export(1, str(storage / "result_1.parquet"), "csv")
+
+    assert profile.exists()
+
+
+def test_invalidate_removes_all_formats(storage):
+    source = str(storage / "result_1.parquet")
+    paths = [exports.get_export(1, source, fmt) for fmt in ("csv", "json")]
+
+    exports.invalidate(1)
+
+    assert not any(os.path.exists(p) for p in paths)
+    assert os.path.exists(source)
+
+
+def test_streamed_encoders_match_pandas_output():
+    df = pd.DataFrame({"name": ["Иван", "Анна", "Олег"], "amount": [1.5, None, 3.0]})
+
+    frames = [df.iloc[:2], df.iloc[2:]]
+    csv = b"".join(exports.iter_csv(frames))
+    json_ = b"".join(exports.iter_json(frames))
+
+    assert csv == df.to_csv(index=False).encode("utf-8-sig")
+    assert json_.decode("utf-8") == df.to_json(
+        orient="records", force_ascii=False, indent=4
+    )
+
+
+def test_stream_export_fills_cache(storage):
+    body = b"".join(exports.open_stream(1, str(storage / "result_1.parquet"), "csv"))
+
+    with open(exports.export_path(1, "csv"), "rb") as f:
+        assert f.read() == body
+
+
+def test_aborted_stream_is_not_cached(storage):
+    stream = exports.stream_export(1, str(storage / "result_1.parquet"), "csv")
+    next(stream)
+    stream.close()
+
+    assert not os.path.exists(exports.export_path(1, "csv"))
+    assert not [p for p in os.listdir(storage) if p.startswith(".tmp_")]
+
+
+def test_legacy_pickle_source_is_exported(storage):
+    source = storage / "result_2.pkl"
+    pd.DataFrame({"name": ["Иван"]}).to_pickle(source)
+
+    body = b"".join(exports.open_stream(2, str(source), "json"))
+
+    assert "Иван" in body.decode("utf-8")
+
+
+def test_empty_dataset_exports():
+    empty = pd.DataFrame({"name": pd.Series([], dtype=str)})
+
+    assert b"".join(exports.iter_json([empty])) == b"[]"
+    assert b"".join(exports.iter_csv([empty])).endswith(b"name\n")
+
+
+def test_benchmark_measures_streamed_xlsx(tmp_path):
+    source = str(tmp_path / "dataset.parquet")
+    benchmarks.make_dataset(source, 1000)
+
+    result = benchmarks.measure(source, "xlsx", str(tmp_path / "export.xlsx"))
+
+    assert result["format"] == "xlsx"
+    assert result["seconds"] >= 0 and result["peak_mb"] >= 0
+    assert len(pd.read_excel(tmp_path / "export.xlsx")) == 1000
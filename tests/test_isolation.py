@@ -0,0 +1,249 @@
+"""Общий набор проверок изоляции: его проходят все бэкенды песочницы."""
+
+import json
+import shutil
+import subprocess
+import textwrap
+import time
+from functools import partial
+
+import pytest
+
+import sandbox
+from sandbox import (
+    SANDBOX_IMAGE,
+    DockerBackend,
+    LocalRunner,
+    SandboxBackend,
+    SandboxPool,
+)
+
+MEMORY_MB = 256
+# случайные значения всех генераторов, которыми пользуются скрипты
+RANDOM_SCRIPT = """
+import json, random
+import numpy as np
+import synthdata as sd
+from faker import Faker
+fake = Faker("ru_RU")
+values = [random.random(), np.random.rand(), fake.name(), list(sd.names(3))]
+open("storage/{name}.json", "w").write(json.dumps(values))
+"""
+
+
+def _docker_available() -> bool:
+    if shutil.which("docker") is None:
+        return False
+    res = subprocess.run(
+        ["docker", "image", "inspect", SANDBOX_IMAGE], capture_output=True
+    )
+    return res.returncode == 0
+
+
+def _docker(workdir: str) -> DockerBackend:
+    if not _docker_available():
+        pytest.skip(f"Нет Docker или образа {SANDBOX_IMAGE}")
+    return DockerBackend(workdir, memory_mb=MEMORY_MB)
+
+
+def _require_namespaces(workdir: str) -> None:
+    # пинг с изоляцией проверяет, что ядро разрешает пространства имён
+    probe = LocalRunner(workdir)
+    supported = probe.ping(60)
+    probe.close()
+    if not supported:
+        pytest.skip("Ядро не разрешает пространства имён без root")
+
+
+def _local(workdir: str) -> SandboxPool:
+    _require_namespaces(workdir)
+    pool = SandboxPool(
+        1, workdir=workdir, factory=partial(LocalRunner, memory_mb=MEMORY_MB)
+    )
+    pool.warm()
+    return pool
+
+
+@pytest.fixture(params=["docker", "local"])
+def backend(request, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "storage").mkdir()
+    backend = (
+        _docker(str(tmp_path)) if request.param == "docker" else _local(str(tmp_path))
+    )
+    yield backend
+    backend.close()
+
+
+def run(
+    backend: SandboxBackend, code: str, timeout: float = 30
+) -> subprocess.CompletedProcess:
+    return backend.run(textwrap.dedent(code), timeout=timeout, profile=False)
+
+
+def test_writes_only_to_storage(backend, tmp_path):
+    res = run(
+        backend,
+        """
+        import pandas as pd
+        pd.DataFrame({"a": [1]}).to_parquet("storage/out.parquet")
+        open("escape.txt", "w")
+        """,
+    )
+    assert res.returncode != 0
+    assert "Read-only file system" in res.stderr
+    assert list(tmp_path.iterdir()) == [tmp_path / "storage"]
+    assert (tmp_path / "storage/out.parquet").exists()
+    assert not (tmp_path / "escape.txt").exists()
+
+
+def test_readonly_input(backend, tmp_path):
+    (tmp_path / "storage/input.txt").write_text("old")
+    res = backend.run(
+        textwrap.dedent(
+            """
+            assert open("storage/input.txt").read() == "old"
+            open("storage/output.txt", "w").write("new")
+            open("storage/input.txt", "w").write("new")
+            """
+        ),
+        timeout=30,
+        profile=False,
+        readonly=["storage/input.txt"],
+    )
+    assert res.returncode != 0
+    assert "Read-only file system" in res.stderr
+    assert (tmp_path / "storage/output.txt").read_text() == "new"
+    assert (tmp_path / "storage/input.txt").read_text() == "old"
+
+
+def test_host_files_not_readable(backend, tmp_path, tmp_path_factory):
+    (tmp_path / ".env").write_text("SECRET_KEY=leak")
+    outside = tmp_path_factory.mktemp("host") / "secret.txt"
+    outside.write_text("leak")
+    res = run(
+        backend,
+        f"""
+        leaked = []
+        for path in (".env", "storage/../.env", "{tmp_path}/.env", "{outside}"):
+            try:
+                leaked.append(open(path).read())
+            except OSError:
+                pass
+        assert not leaked, leaked
+        """,
+    )
+    assert res.returncode == 0, res.stderr
+
+
+def _random_values(backend: SandboxBackend, tmp_path) -> list[list]:
+    outputs = []
+    for name in ("first", "second"):
+        res = run(backend, RANDOM_SCRIPT.format(name=name))
+        assert res.returncode == 0, res.stderr
+        outputs.append(json.loads((tmp_path / f"storage/{name}.json").read_text()))
+    return outputs
+
+
+def test_jobs_get_different_random_data(backend, tmp_path):
+    first, second = _random_values(backend, tmp_path)
+    assert all(a != b for a, b in zip(first, second, strict=True))
+
+
+def test_local_backend_jobs_get_different_random_data(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "storage").mkdir()
+    _require_namespaces(str(tmp_path))
+    # один исполнитель: оба задания ответвляются от одного процесса
+    monkeypatch.setattr(sandbox, "SANDBOX_POOL_SIZE", 1)
+    backend = sandbox.create_backend("local")
+    try:
+        first, second = _random_values(backend, tmp_path)
+    finally:
+        backend.close()
+    assert all(a != b for a, b in zip(first, second, strict=True))
+
+
+def test_dataset_summary(backend, tmp_path):
+    res = backend.run(
+        "import pandas as pd\ndf = pd.DataFrame({'a': [1, 2, 3]})\n",
+        timeout=30,
+        profile=False,
+        summary="storage/out.summary.json",
+    )
+    assert res.returncode == 0, res.stderr
+    summary = json.loads((tmp_path / "storage/out.summary.json").read_text())
+    assert summary["rows"] == 3
+
+
+def test_temp_files_allowed(backend):
+    res = run(
+        backend,
+        """
+        import tempfile
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(b"x")
+        """,
+    )
+    assert res.returncode == 0, res.stderr
+
+
+def test_no_network(backend):
+    res = run(
+        backend,
+        """
+        import socket
+        socket.create_connection(("1.1.1.1", 53), timeout=2)
+        """,
+    )
+    assert res.returncode != 0
+    assert "Network is unreachable" in res.stderr
+
+
+def test_cannot_remount_writable(backend, tmp_path):
+    res = run(
+        backend,
+        """
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        MS_REMOUNT, MS_BIND = 0x20, 0x1000
+        for target in (b"/", b"."):
+            libc.mount(None, target, None, ctypes.c_ulong(MS_REMOUNT | MS_BIND), None)
+        open("escape.txt", "w")
+        """,
+    )
+    assert res.returncode != 0
+    assert not (tmp_path / "escape.txt").exists()
+
+
+def test_memory_limit(backend, tmp_path):
+    res = run(
+        backend,
+        f"""
+        data = bytearray({MEMORY_MB * 2} * 1024 * 1024)
+        open("storage/allocated.txt", "w")
+        """,
+    )
+    assert res.returncode != 0
+    assert not (tmp_path / "storage/allocated.txt").exists()
+
+
+def test_timeout(backend):
+    with pytest.raises(subprocess.TimeoutExpired) as e:
+        run(backend, "while True:\n    pass\n", timeout=1)
+    assert json.loads(e.value.output)["timed_out"] is True
+
+
+def test_local_startup_is_fast(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "storage").mkdir()
+    pool = _local(str(tmp_path))
+    try:
+        run(pool, "pass\n")
+        started = time.monotonic()
+        res = run(pool, "import pandas\n")
+        elapsed = time.monotonic() - started
+    finally:
+        pool.close()
+    assert res.returncode == 0, res.stderr
+    assert elapsed < 0.5
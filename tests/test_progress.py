@@ -0,0 +1,62 @@
+import json
+from unittest.mock import AsyncMock, MagicMock
+
+import fakeredis
+
+import progress
+
+
+def make_pubsub(events):
+    messages = [None] + [{"data": json.dumps(e)} for e in events]
+    pubsub = MagicMock()
+    pubsub.get_message = AsyncMock(side_effect=messages)
+    pubsub.unsubscribe = AsyncMock()
+    pubsub.aclose = AsyncMock()
+    return pubsub
+
+
+async def test_sse_stream_stops_after_final_event():
+    pubsub = make_pubsub(
+        [
+            {"task_id": 1, "status": "processing", "progress": 70, "message": "run"},
+            {"task_id": 1, "status": "completed", "progress": 100, "message": "ok"},
+        ]
+    )
+    initial = [{"task_id": 1, "status": "processing", "progress": 10, "message": ""}]
+
+    chunks = [c async for c in progress.sse_stream(pubsub, initial, until_final=True)]
+
+    assert chunks[1] == ": ping\n\n"
+    events = [json.loads(c.split("data: ")[1]) for c in chunks if "data" in c]
+    assert [e["progress"] for e in events] == [10, 70, 100]
+    pubsub.aclose.assert_awaited_once()
+
+
+async def test_sse_stream_finished_task_needs_no_subscription_messages():
+    pubsub = make_pubsub([])
+    initial = [{"task_id": 1, "status": "failed", "progress": 0, "message": "boom"}]
+
+    chunks = [c async for c in progress.sse_stream(pubsub, initial, until_final=True)]
+
+    assert len(chunks) == 1
+    pubsub.get_message.assert_not_called()
+
+
+async def test_alatest_reads_snapshots_in_one_round_trip():
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    event = {"task_id": 1, "status": "processing", "progress": 70, "message": "run"}
+    await client.set("progress:last:1", json.dumps(event))
+    requests = []
+    mget = client.mget
+
+    async def spy(keys):
+        requests.append(keys)
+        return await mget(keys)
+
+    client.mget = spy
+
+    snapshots = await progress.alatest(client, [1, 2])
+
+    assert snapshots == {1: event}
+    assert requests == [["progress:last:1", "progress:last:2"]]
+    assert await progress.alatest(client, []) == {}
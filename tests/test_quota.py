@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+
+import fakeredis
+import pytest
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import quota
+from models import GenerationTask, User
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeAsyncRedis(decode_responses=True)
+
+
+def make_user(session: Session, tier: str = "free") -> User:
+    user = User(email=f"{tier}@example.com", hashed_password="x", tier=tier)
+    session.add(user)
+    session.commit()
+    session.refresh(user)
+    return user
+
+
+async def test_free_tier_minute_window(
+    session: Session, async_session: AsyncSession, redis_client
+):
+    user = make_user(session)
+
+    for _ in range(10):
+        await quota.acquire(redis_client, user, async_session)
+
+    with pytest.raises(quota.QuotaExceededError) as exc:
+        await quota.acquire(redis_client, user, async_session)
+    assert exc.value.limit == 10
+
+
+async def test_daily_window_reconciled_from_db(
+    session: Session, async_session: AsyncSession, redis_client
+):
+    user = make_user(session)
+    hour_ago = datetime.utcnow() - timedelta(hours=1)
+    for i in range(10):
+        session.add(
+            GenerationTask(
+                prompt=str(i),
+                file_format="parquet",
+                user_id=user.id,
+                created_at=hour_ago,
+            )
+        )
+    session.commit()
+
+    with pytest.raises(quota.QuotaExceededError) as exc:
+        await quota.acquire(redis_client, user, async_session)
+    assert exc.value.window == 24 * 3600
+
+
+async def test_late_reconcile_keeps_recorded_generations(
+    session: Session, async_session: AsyncSession, redis_client
+):
+    user = make_user(session)
+    for _ in range(10):
+        await quota.acquire(redis_client, user, async_session)
+
+    # запрос, который проверил метку до первой синхронизации
+    with patch.object(redis_client, "exists", AsyncMock(return_value=0)):
+        with pytest.raises(quota.QuotaExceededError):
+            await quota.acquire(redis_client, user, async_session)
+
+
+async def test_release_returns_slot(
+    session: Session, async_session: AsyncSession, redis_client
+):
+    user = make_user(session, tier="pro")
+    members = [
+        await quota.acquire(redis_client, user, async_session) for _ in range(50)
+    ]
+
+    await quota.release(redis_client, user, members[0])
+
+    await quota.acquire(redis_client, user, async_session)
+    with pytest.raises(quota.QuotaExceededError):
+        await quota.acquire(redis_client, user, async_session)
+
+
+async def test_db_fallback_checks_daily_limit(
+    session: Session, async_session: AsyncSession
+):
+    user = make_user(session)
+    for i in range(10):
+        session.add(
+            GenerationTask(prompt=str(i), file_format="parquet", user_id=user.id)
+        )
+    session.commit()
+
+    with pytest.raises(quota.QuotaExceededError):
+        await quota.check_in_db(user, async_session)
+    await quota.check_in_db(make_user(session, tier="enterprise"), async_session)
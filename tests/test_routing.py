@@ -0,0 +1,95 @@
+from unittest.mock import patch
+
+import fakeredis
+import pytest
+
+import routing
+from core import CANDIDATE_REJECTED, SPECULATION_CANCELLED
+
+LITE, FLASH = "gemini-2.5-flash-lite", "gemini-2.5-flash"
+
+
+@pytest.fixture(autouse=True)
+def redis_client():
+    client = fakeredis.FakeRedis(decode_responses=True)
+    with (
+        patch.object(routing, "_get_client", return_value=client),
+        patch.object(routing, "MODEL_CASCADE", [LITE, FLASH]),
+        patch.object(routing, "ROUTING_MIN_SAMPLES", 5),
+        patch.object(routing, "ROUTING_EXPLORE", 0),
+    ):
+        yield client
+
+
+def attempts(model: str, success: bool, count: int, latency: int) -> list[dict]:
+    return [
+        {
+            "kind": "generate",
+            "model": model,
+            "success": success,
+            "llm_latency_ms": latency,
+            "sandbox_wall_ms": 1000,
+        }
+        for _ in range(count)
+    ]
+
+
+def test_category():
+    assert routing.category("Таблица клиентов банка с ФИО") == "people"
+    assert routing.category("Транзакции по картам") == "finance"
+    assert routing.category("Показания датчиков температуры") == "timeseries"
+    assert routing.category("Случайные числа") == "general"
+
+
+def test_record_keeps_rolling_window():
+    prompt = "Заказы интернет-магазина"
+    routing.record(prompt, [{"kind": "cache", "model": LITE, "success": True}])
+    routing.record(prompt, attempts(LITE, False, 3, 1000))
+    with patch.object(routing, "ROUTING_WINDOW", 4):
+        routing.record(prompt, attempts(LITE, True, 2, 3000))
+
+    stats = routing.model_stats("commerce")
+    assert stats[LITE]["samples"] == 4
+    assert stats[LITE]["success_rate"] == 0.5
+    assert stats[LITE]["latency_ms"] == 3000
+    assert stats[FLASH]["samples"] == 0
+
+
+def test_record_skips_cancelled_and_rejected_candidates():
+    prompt = "Заказы интернет-магазина"
+    routing.record(prompt, attempts(LITE, True, 1, 1000))
+    routing.record(
+        prompt,
+        [
+            {"kind": "speculate", "model": LITE, "error": SPECULATION_CANCELLED},
+            {
+                "kind": "optimize",
+                "model": LITE,
+                "error": CANDIDATE_REJECTED + "Новая версия не быстрее исходной.",
+            },
+        ],
+    )
+
+    stats = routing.model_stats("commerce")
+    assert stats[LITE]["samples"] == 1
+    assert stats[LITE]["success_rate"] == 1.0
+
+
+def test_cascade_starts_cheap_and_adapts():
+    prompt = "Заказы интернет-магазина"
+    assert routing.cascade("auto", prompt) == [LITE, FLASH]
+
+    # дешёвая модель часто ошибается: быстрее сразу начать с сильной
+    routing.record(prompt, attempts(LITE, False, 8, 4000))
+    routing.record(prompt, attempts(LITE, True, 2, 4000))
+    routing.record(prompt, attempts(FLASH, True, 10, 7000))
+    assert routing.cascade("auto", prompt) == [FLASH]
+
+    # в другой категории статистики нет — снова старт с дешёвой
+    assert routing.cascade("auto", "Случайные числа") == [LITE, FLASH]
+
+
+def test_cascade_explicit_models():
+    assert routing.cascade(LITE, "x") == [LITE, FLASH]
+    assert routing.cascade(FLASH, "x") == [FLASH]
+    assert routing.cascade("gemini-2.0-flash", "x") == ["gemini-2.0-flash"]
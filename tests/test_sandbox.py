@@ -0,0 +1,235 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+import sandbox
+from sandbox import SandboxPool, SandboxUnavailableError
+
+RUNNER = Path(__file__).resolve().parent.parent / "sandbox_runner.py"
+
+
+class FakeContainer:
+    def __init__(self, workdir: str) -> None:
+        self.name = "fake"
+        self.uses = 0
+        self.last_check = 0.0
+        self.alive = True
+        self.closed = False
+        self.response: dict | None = {"ok": True, "returncode": 0, "stderr": ""}
+
+    def options(self, readonly: list | None = None) -> dict:
+        return {}
+
+    def is_alive(self) -> bool:
+        return self.alive
+
+    def ping(self, timeout: float = 5.0) -> bool:
+        self.last_check = 1.0
+        return self.alive
+
+    def request(self, payload: dict, timeout: float) -> dict | None:
+        return self.response
+
+    def close(self) -> None:
+        self.closed = True
+
+
+@pytest.fixture
+def fake_containers():
+    with patch.object(sandbox, "SandboxContainer", FakeContainer):
+        yield
+
+
+def test_pool_reuses_container(fake_containers):
+    pool = SandboxPool(size=1, max_uses=10)
+    res = pool.run("temp_script_1.py")
+    first = pool.acquire()
+    pool.release(first)
+
+    assert res.returncode == 0
+    assert pool.acquire() is first
+
+
+def test_pool_recycles_after_max_uses(fake_containers):
+    pool = SandboxPool(size=1, max_uses=2)
+    first = pool.acquire()
+    pool.release(first)
+    pool.release(pool.acquire())
+
+    assert first.closed
+    assert pool.acquire() is not first
+
+
+def test_pool_replaces_dead_container(fake_containers):
+    pool = SandboxPool(size=1)
+    first = pool.acquire()
+    pool.release(first)
+    first.alive = False
+
+    assert pool.acquire() is not first
+    assert first.closed
+
+
+def test_pool_timeout_and_broken_container(fake_containers):
+    pool = SandboxPool(size=1)
+    container = pool.acquire()
+    container.response = {"ok": True, "returncode": -9, "timed_out": True}
+    pool.release(container)
+    with pytest.raises(subprocess.TimeoutExpired):
+        pool.run("temp_script_1.py", timeout=1)
+
+    container = pool.acquire()
+    container.response = None
+    pool.release(container)
+    with pytest.raises(SandboxUnavailableError):
+        pool.run("temp_script_1.py")
+    assert container.closed
+
+
+def test_runner_isolates_jobs(tmp_path):
+    ok_script = tmp_path / "ok.py"
+    ok_script.write_text("import pandas as pd\nLEAK = 1\nprint('noise')\n")
+    check_script = tmp_path / "check.py"
+    check_script.write_text("assert 'LEAK' not in globals()\n")
+    bad_script = tmp_path / "bad.py"
+    bad_script.write_text("raise ValueError('boom')\n")
+    slow_script = tmp_path / "slow.py"
+    slow_script.write_text("import time\ntime.sleep(5)\n")
+
+    jobs = [
+        {"op": "ping"},
+        {"op": "run", "script": str(ok_script)},
+        {"op": "run", "script": str(check_script)},
+        {"op": "run", "script": str(bad_script)},
+        {"op": "run", "script": str(slow_script), "timeout": 0.2},
+    ]
+    proc = subprocess.run(
+        [sys.executable, str(RUNNER)],
+        input="\n".join(json.dumps(job) for job in jobs) + "\n",
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    ping, ok, check, bad, slow = (
+        json.loads(line) for line in proc.stdout.split("\n")[:5]
+    )
+
+    assert ping["pong"]
+    assert ok["returncode"] == 0
+    assert check["returncode"] == 0
+    assert bad["returncode"] == 1
+    assert "ValueError: boom" in bad["stderr"]
+    assert slow["timed_out"]
+    assert ok["peak_rss_kb"] > 0
+    assert isinstance(ok["cpu_ms"], int) and ok["wall_ms"] >= 0
+
+
+def test_runner_reseeds_each_job(tmp_path):
+    code = (
+        "import json\n"
+        "import numpy as np\n"
+        "from faker import Faker\n"
+        "fake = Faker('ru_RU')\n"
+        "values = [np.random.rand(), [fake.name() for _ in range(3)]]\n"
+        "open({path!r}, 'w').write(json.dumps(values))\n"
+    )
+    outputs = [tmp_path / "first.json", tmp_path / "second.json"]
+    jobs = [{"op": "run", "code": code.format(path=str(p))} for p in outputs]
+    proc = subprocess.run(
+        [sys.executable, str(RUNNER)],
+        input="\n".join(json.dumps(job) for job in jobs) + "\n",
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert all(json.loads(line)["returncode"] == 0 for line in proc.stdout.splitlines())
+
+    first, second = (json.loads(p.read_text()) for p in outputs)
+    assert first[0] != second[0]
+    assert first[1] != second[1]
+
+
+def test_runner_once_reports_metrics(tmp_path):
+    script = tmp_path / "fail.py"
+    script.write_text("x = [0] * 10**6\nraise ValueError('boom')\n")
+
+    proc = subprocess.run(
+        [sys.executable, str(RUNNER), "--once", str(script), "--timeout", "10"],
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    report = json.loads(proc.stdout)
+
+    assert proc.returncode == 1
+    assert "ValueError: boom" in proc.stderr
+    assert report["returncode"] == 1 and not report["timed_out"]
+    assert report["peak_rss_kb"] > 0
+
+
+def test_runner_profiles_hot_lines_on_timeout(tmp_path):
+    script = tmp_path / "loop.py"
+    script.write_text("total = 0\nwhile True:\n    total += 1\n")
+
+    proc = subprocess.run(
+        [sys.executable, str(RUNNER), "--once", str(script)]
+        + ["--timeout", "0.5", "--profile"],
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    report = json.loads(proc.stdout)
+
+    assert report["timed_out"]
+    assert report["profile"]["samples"] > 0
+    hot_lines = {lineno for lineno, _ in report["profile"]["lines"]}
+    assert hot_lines <= {2, 3} and hot_lines
+    assert "Traceback" not in proc.stderr
+
+
+def test_runner_once_reads_code_from_stdin(tmp_path):
+    (tmp_path / "storage").mkdir()
+
+    proc = subprocess.run(
+        [sys.executable, str(RUNNER), "--once", "-", "--timeout", "10"],
+        input="open('storage/out.txt', 'w').write('ok')\n",
+        cwd=tmp_path,
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+
+    assert json.loads(proc.stdout)["returncode"] == 0, proc.stderr
+    assert (tmp_path / "storage/out.txt").read_text() == "ok"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["storage"]
+
+
+def test_runner_once_writes_dataset_summary(tmp_path):
+    (tmp_path / "storage").mkdir()
+
+    proc = subprocess.run(
+        [sys.executable, str(RUNNER), "--once", "-", "--timeout", "10"]
+        + ["--summary", "storage/out.summary.json"],
+        input="import pandas as pd\ndf = pd.DataFrame({'a': [1, 2, None]})\n",
+        cwd=tmp_path,
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+
+    assert json.loads(proc.stdout)["returncode"] == 0, proc.stderr
+    summary = json.loads((tmp_path / "storage/out.summary.json").read_text())
+    assert summary["rows"] == 3
+    assert summary["columns"][0] | {"histogram": None} == {
+        "name": "a",
+        "dtype": "float64",
+        "nulls": 1,
+        "min": 1.0,
+        "max": 2.0,
+        "mean": 1.5,
+        "histogram": None,
+    }
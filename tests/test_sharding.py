@@ -0,0 +1,197 @@
+import asyncio
+import json
+import runpy
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pandas as pd
+
+import core
+import dataprofile
+import sharding
+
+SCRIPT = """import pandas as pd
+from faker import Faker
+
+fake = Faker('ru_RU')
+N_ROWS = 10
+df = pd.DataFrame({{
+    "id": range(1, N_ROWS + 1),
+    "name": [fake.name() for _ in range(N_ROWS)],
+    "age": [fake.random_int(18, 90) for _ in range(N_ROWS)],
+}})
+df.to_parquet('{path}', index=False)
+"""
+
+
+def test_requested_rows_and_plan():
+    assert sharding.requested_rows("N_ROWS = 2_500_000\n") == 2_500_000
+    assert sharding.requested_rows("n = 10\n") is None
+
+    with (
+        patch.object(sharding, "SHARD_ROWS", 1000),
+        patch.object(sharding, "SHARD_MAX", 4),
+    ):
+        assert sharding.plan(500) == [(0, 500)]
+        assert sharding.plan(2500) == [(0, 834), (834, 833), (1667, 833)]
+        assert len(sharding.plan(10**6)) == 4
+
+
+def test_shard_code_rewrites_rows_seed_and_path():
+    code = SCRIPT.format(path="storage/result_7.parquet")
+    shard = sharding.shard_code(
+        code, 1, 5, 3, 42, "storage/result_7.parquet", "storage/s1.parquet"
+    )
+
+    assert "N_ROWS = 3\n" in shard
+    assert "N_ROWS = 10" not in shard
+    assert "_shard_random.seed(42)" in shard
+    assert "_shard_sd.seed(42)" in shard
+    assert "storage/s1.parquet" in shard
+    assert "result_7" not in shard
+    assert core.is_code_safe_and_valid(shard)[0]
+
+
+def run_locally(code: str, task_id: int, shard: int | None = None, stats=None):
+    script = core.STORAGE_DIR + f"/test_shard_{task_id}_{shard}.py"
+    with open(script, "w", encoding="utf-8") as f:
+        f.write(code)
+    df = runpy.run_path(script)["df"]
+    assert shard is not None
+    # как исполнитель песочницы: профиль df рядом с файлом шарда
+    summary = core.summary_path(core.shard_path(task_id, shard))
+    with open(summary, "w", encoding="utf-8") as f:
+        json.dump(dataprofile.compute(df), f)
+    return True, None
+
+
+def test_execute_merges_shards_with_unique_ids(tmp_path):
+    path = f"{tmp_path}/result_5.parquet"
+    code = SCRIPT.format(path=path)
+
+    with (
+        patch.object(core, "STORAGE_DIR", str(tmp_path)),
+        patch.object(sharding, "SHARD_ROWS", 4),
+        patch.object(sharding, "SHARD_MAX", 8),
+        patch.object(core, "run_in_sandbox", side_effect=run_locally) as mock_run,
+    ):
+        success, error = core.execute(code, 5)
+
+    assert (success, error) == (True, None)
+    assert mock_run.call_count == 3
+    df = pd.read_parquet(path)
+    assert list(df["id"]) == list(range(1, 11))
+    assert df["name"].nunique() > 3
+    assert not list(tmp_path.glob("*.shard*"))
+    with open(core.summary_path(path), encoding="utf-8") as f:
+        summary = json.load(f)
+    ids = summary["columns"][0]
+    assert summary["rows"] == 10
+    assert (ids["name"], ids["min"], ids["max"], ids["mean"]) == ("id", 1, 10, 5.5)
+    assert sum(ids["histogram"]["counts"]) == 10
+
+
+def test_execute_reports_failed_shard(tmp_path):
+    code = SCRIPT.format(path=f"{tmp_path}/result_6.parquet")
+
+    with (
+        patch.object(core, "STORAGE_DIR", str(tmp_path)),
+        patch.object(sharding, "SHARD_ROWS", 5),
+        patch.object(
+            core, "run_in_sandbox", side_effect=[(True, None), (False, "boom")]
+        ),
+        patch.object(sharding, "SHARD_MAX", 2),
+    ):
+        success, error = core.execute(code, 6)
+
+    assert not success
+    assert error == "Шард 2/2: boom"
+
+
+class Concurrency:
+    """Считает, сколько шардов исполняется одновременно."""
+
+    def __init__(self) -> None:
+        self.running = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def enter(self) -> None:
+        with self._lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+
+    def leave(self) -> None:
+        with self._lock:
+            self.running -= 1
+
+
+def test_execute_runs_no_more_shards_than_pool_slots(tmp_path):
+    code = SCRIPT.format(path=f"{tmp_path}/result_8.parquet")
+    concurrency = Concurrency()
+
+    def run(code: str, task_id: int, shard=None, stats=None):
+        concurrency.enter()
+        time.sleep(0.05)
+        concurrency.leave()
+        return run_locally(code, task_id, shard, stats)
+
+    async def arun(code: str, task_id: int, shard=None, stats=None):
+        concurrency.enter()
+        await asyncio.sleep(0.05)
+        concurrency.leave()
+        return run_locally(code, task_id, shard, stats)
+
+    with (
+        patch.object(core, "STORAGE_DIR", str(tmp_path)),
+        patch.object(sharding, "SHARD_ROWS", 2),
+        patch.object(sharding, "SHARD_MAX", 5),
+        patch.object(core, "get_sandbox_backend", return_value=MagicMock(capacity=2)),
+        patch.object(core, "run_in_sandbox", side_effect=run) as mock_run,
+        patch.object(core, "arun_in_sandbox", side_effect=arun) as mock_arun,
+    ):
+        assert core.execute(code, 8) == (True, None)
+        sync_peak, concurrency.peak = concurrency.peak, 0
+        assert asyncio.run(core.aexecute(code, 8)) == (True, None)
+
+    assert mock_run.call_count == mock_arun.call_count == 5
+    assert sync_peak == concurrency.peak == 2
+    assert len(pd.read_parquet(tmp_path / "result_8.parquet")) == 10
+
+
+def write_shards(tmp_path, frames):
+    paths = []
+    for i, frame in enumerate(frames):
+        paths.append(str(tmp_path / f"s{i}.parquet"))
+        frame.to_parquet(paths[-1], index=False)
+    return paths
+
+
+def test_merge_shifts_only_counters_of_every_shard(tmp_path):
+    # score случайно идёт подряд в первом шарде, flag — константа
+    paths = write_shards(
+        tmp_path,
+        [
+            pd.DataFrame({"id": [1, 2, 3], "flag": [1, 1, 1], "score": [5, 6, 7]}),
+            pd.DataFrame({"id": [1, 2, 3], "flag": [1, 1, 1], "score": [40, 2, 9]}),
+        ],
+    )
+    target = str(tmp_path / "merged.parquet")
+
+    assert sharding.merge(paths, [0, 3], target) == ["id"]
+
+    df = pd.read_parquet(target)
+    assert list(df["id"]) == list(range(1, 7))
+    assert list(df["flag"]) == [1] * 6
+    assert list(df["score"]) == [5, 6, 7, 40, 2, 9]
+
+
+def test_merge_does_not_shift_short_shards(tmp_path):
+    paths = write_shards(
+        tmp_path, [pd.DataFrame({"level": [3, 4, 5]}), pd.DataFrame({"level": [3]})]
+    )
+    target = str(tmp_path / "merged.parquet")
+
+    assert sharding.merge(paths, [0, 3], target) == []
+    assert list(pd.read_parquet(target)["level"]) == [3, 4, 5, 3]
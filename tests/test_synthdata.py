@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+import synthdata as sd
+
+
+def test_names_agree_with_gender():
+    genders = np.array(["М", "Ж"] * 50)
+    names = sd.names(100, gender=genders, rng=np.random.default_rng(1))
+
+    male, female = names[genders == "М"], names[genders == "Ж"]
+    assert all(n.endswith("ич") for n in male)
+    assert all(n.endswith("на") and n.split()[0].endswith("а") for n in female)
+
+
+def test_emails_built_from_names():
+    emails = sd.emails(2, names=["Иванова Мария Петровна", "Орлов Юрий Олегович"])
+
+    assert emails[0].startswith("mariya.ivanova")
+    assert emails[1].startswith("yuriy.orlov")
+    assert all("@" in e for e in emails)
+
+
+def test_shapes_and_ranges():
+    n = 10_000
+    rng = np.random.default_rng(0)
+
+    dates = sd.dates(n, "2023-01-01", "2023-12-31", rng=rng)
+    amounts = sd.amounts(n, mean=100, low=10, high=500, rng=rng)
+    phones = sd.phones(n, rng=rng)
+    categories = sd.categorical(n, ["a", "b"], weights=[9, 1], rng=rng)
+
+    assert dates.min() >= np.datetime64("2023-01-01")
+    assert dates.max() <= np.datetime64("2023-12-31")
+    assert 10 <= amounts.min() and amounts.max() <= 500
+    assert pd.Series(phones).str.fullmatch(r"\+7 9\d\d \d{3}-\d\d-\d\d").all()
+    assert 0.85 < (categories == "a").mean() < 0.95
+
+
+def test_correlation_outliers_and_missing():
+    rng = np.random.default_rng(0)
+    base = rng.normal(size=50_000)
+
+    assert abs(np.corrcoef(base, sd.correlated(base, 0.7, rng=rng))[0, 1] - 0.7) < 0.02
+    outliers = sd.inject_outliers(np.ones(10_000), 0.05, factor=100, rng=rng)
+    assert 0.04 < (outliers == 100).mean() < 0.06
+    missing = sd.inject_missing(np.arange(10_000), 0.1, rng=rng)
+    assert 0.08 < pd.isna(missing).mean() < 0.12
+
+
+def test_seed_makes_output_reproducible():
+    sd.seed(7)
+    first = sd.names(5)
+    sd.seed(7)
+    second = sd.names(5)
+    sd.seed(None)
+    assert list(second) == list(first)
+
+
+def test_unseeded_output_ignores_numpy_global_state():
+    np.random.seed(7)
+    first = sd.amounts(5)
+    np.random.seed(7)
+    assert list(sd.amounts(5)) != list(first)
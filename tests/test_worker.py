@@ -0,0 +1,119 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+from sqlmodel import Session, select
+
+import worker
+from models import GenerationAttempt, GenerationTask
+
+
+@pytest.fixture(autouse=True)
+def no_redis_progress():
+    with patch("worker.progress.publish"):
+        yield
+
+
+def make_task(session: Session, status: str = "pending") -> int:
+    task = GenerationTask(prompt="p", file_format="pkl", status=status)
+    session.add(task)
+    session.commit()
+    session.refresh(task)
+    assert task.id is not None
+    return task.id
+
+
+def test_process_job_runs_and_acks(session: Session):
+    task_id = make_task(session)
+    queue = MagicMock(visibility_timeout=300)
+    job = {
+        "task_id": task_id,
+        "payload": {"previous_code": "old", "model_name": "m"},
+        "deliveries": 1,
+    }
+
+    with patch.object(worker, "engine", session.get_bind()):
+        with patch.object(worker, "run_generation_wrapper") as mock_run:
+            worker.process_job(queue, job)
+
+    mock_run.assert_called_once_with(task_id, "old", "m", 1, None)
+    queue.ack.assert_called_once_with(task_id)
+
+
+def test_process_job_skips_finished_task(session: Session):
+    task_id = make_task(session, status="completed")
+    queue = MagicMock(visibility_timeout=300)
+
+    with patch.object(worker, "engine", session.get_bind()):
+        with patch.object(worker, "run_generation_wrapper") as mock_run:
+            worker.process_job(queue, {"task_id": task_id, "payload": {}})
+
+    mock_run.assert_not_called()
+    queue.ack.assert_called_once_with(task_id)
+
+
+def test_mark_dead_fails_unfinished_tasks(session: Session):
+    stuck = make_task(session, status="processing")
+    done = make_task(session, status="completed")
+
+    with patch.object(worker, "engine", session.get_bind()):
+        worker.mark_dead([stuck, done])
+
+    session.expire_all()
+    stuck_task = session.get(GenerationTask, stuck)
+    done_task = session.get(GenerationTask, done)
+    assert stuck_task and stuck_task.status == "failed"
+    assert done_task and done_task.status == "completed"
+
+
+def test_progress_goes_to_redis_and_db_only_on_transitions(session: Session):
+    task_id = make_task(session)
+
+    def fake_generate(on_progress, **kwargs):
+        for percent in (10, 30, 50, 70, 90):
+            on_progress("step", percent)
+        return {"status": "success", "file": "f.parquet", "code": "c"}
+
+    with patch.object(worker, "engine", session.get_bind()):
+        with patch.object(worker, "generate_and_run", side_effect=fake_generate):
+            with patch("worker.progress.publish") as mock_publish:
+                with patch.object(
+                    Session, "commit", autospec=True, side_effect=Session.commit
+                ) as mock_commit:
+                    worker.run_generation_wrapper(task_id)
+
+    statuses = [c.args[2] for c in mock_publish.call_args_list]
+    assert statuses == ["processing"] * 6 + ["completed"]
+    assert mock_commit.call_count == 2
+
+    session.expire_all()
+    task = session.get(GenerationTask, task_id)
+    assert task and task.status == "completed" and task.progress == 100
+
+
+def test_attempts_persisted(session: Session):
+    task_id = make_task(session)
+    attempts = [
+        {"attempt": 1, "kind": "generate", "model": "m", "error": "boom"},
+        {"attempt": 2, "kind": "fix", "model": "m", "success": True, "shards": 2},
+    ]
+    result = {
+        "status": "success",
+        "file": "f",
+        "code": "c",
+        "model": "m2",
+        "attempts": attempts,
+    }
+
+    with patch.object(worker, "engine", session.get_bind()):
+        with patch.object(worker, "generate_and_run", return_value=result):
+            worker.run_generation_wrapper(task_id)
+
+    rows = session.exec(
+        select(GenerationAttempt).where(GenerationAttempt.task_id == task_id)
+    ).all()
+    assert [(r.kind, r.success, r.shards) for r in rows] == [
+        ("generate", False, None),
+        ("fix", True, 2),
+    ]
+    task = session.get(GenerationTask, task_id)
+    assert task and task.ai_model == "m2"
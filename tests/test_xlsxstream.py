@@ -0,0 +1,104 @@
+import io
+import zipfile
+from unittest.mock import patch
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+import xlsxstream
+
+
+def read_book(chunks):
+    return pd.read_excel(io.BytesIO(b"".join(chunks)), sheet_name=None)
+
+
+def test_stream_matches_dataframe():
+    df = pd.DataFrame(
+        {
+            "name": ["Иван", "<b>&</b>", None, " Анна "],
+            "amount": [1.5, None, np.inf, 3.0],
+            "count": [1, 2, 3, 4],
+            "active": [True, False, True, False],
+            "created_at": pd.to_datetime(
+                ["2020-01-01 10:30", None, "2021-05-06", "2022-01-01"], format="mixed"
+            ),
+        }
+    )
+
+    book = read_book(xlsxstream.iter_xlsx([df.iloc[:3], df.iloc[3:]]))
+
+    expected = df.assign(amount=[1.5, None, None, 3.0])
+    pd.testing.assert_frame_equal(book["Sheet1"], expected, check_dtype=False)
+
+
+def test_long_dataset_split_into_sheets():
+    df = pd.DataFrame({"id": range(7)})
+
+    book = read_book(xlsxstream.iter_xlsx([df.iloc[:4], df.iloc[4:]], sheet_rows=3))
+
+    assert list(book) == ["Sheet1", "Sheet2", "Sheet3"]
+    assert [list(sheet["id"]) for sheet in book.values()] == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_chunks_are_yielded_per_frame():
+    frames = [pd.DataFrame({"id": range(i, i + 1000)}) for i in range(0, 5000, 1000)]
+
+    chunks = list(xlsxstream.iter_xlsx(frames))
+
+    assert len(chunks) == len(frames) + 1
+    assert zipfile.ZipFile(io.BytesIO(b"".join(chunks))).testzip() is None
+
+
+def test_output_is_deterministic():
+    frames = [pd.DataFrame({"name": ["Иван", "Анна"]})]
+
+    first = b"".join(xlsxstream.iter_xlsx(frames))
+    with patch("zipfile.time.time", return_value=0):
+        second = b"".join(xlsxstream.iter_xlsx(frames))
+
+    assert second == first
+
+
+def test_empty_dataset_keeps_header():
+    empty = pd.DataFrame({"name": pd.Series([], dtype=str)})
+
+    book = read_book(xlsxstream.iter_xlsx([empty]))
+
+    assert list(book["Sheet1"].columns) == ["name"]
+    assert book["Sheet1"].empty
+
+
+def load_sheet(chunks):
+    return openpyxl.load_workbook(io.BytesIO(b"".join(chunks)))["Sheet1"]
+
+
+def test_control_characters_are_dropped():
+    df = pd.DataFrame(
+        {"note\x07": ["a\x00b", "tab\tok", "line\nbreak", "\x1fend\ufffe", None]}
+    )
+
+    sheet = load_sheet(xlsxstream.iter_xlsx([df]))
+
+    values = [row[0] for row in sheet.iter_rows(values_only=True)]
+    assert values == ["note", "ab", "tab\tok", "line\nbreak", "end", None]
+
+
+def test_datetime_columns_are_excel_dates():
+    moments = ["2020-01-01 10:30:15", None, "1970-01-01", "2099-12-31 23:59:59"]
+    df = pd.DataFrame(
+        {
+            "naive": pd.to_datetime(moments, format="mixed"),
+            "micro": pd.to_datetime(moments, format="mixed").astype("datetime64[us]"),
+            "moscow": pd.to_datetime(moments, format="mixed").tz_localize(
+                "Europe/Moscow"
+            ),
+        }
+    )
+
+    sheet = load_sheet(xlsxstream.iter_xlsx([df]))
+
+    expected = [None if m is None else pd.Timestamp(m) for m in moments]
+    for column in sheet.iter_cols(min_row=2):
+        assert [cell.value for cell in column] == expected
+        assert all(cell.is_date for cell in column if cell.value is not None)
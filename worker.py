@@ -0,0 +1,390 @@
+"""
+Воркер генерации: забирает задачи из очереди Redis и выполняет их.
+
+Запуск: python worker.py --concurrency 4
+С --async-slots N каждый процесс ведёт до N генераций одновременно в asyncio.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from typing import Any
+
+import redis
+from sqlmodel import Session
+
+import progress
+import routing
+from core import DEFAULT_MODEL, agenerate_and_run, generate_and_run
+from database import engine
+from models import GenerationAttempt, GenerationTask
+from sandbox import get_sandbox_backend
+from task_queue import REDIS_URL, TaskQueue
+
+WORKER_POLL_INTERVAL = 0.5
+REQUEUE_INTERVAL = 15
+
+
+def publish_task(task: GenerationTask) -> None:
+    if task.id is None:
+        return
+    message = task.error_log if task.status == "failed" else task.status_message
+    progress.publish(
+        task.id, task.conversation_id, task.status, task.progress, message or ""
+    )
+
+
+def attempt_rows(
+    task_id: int, attempts: list[dict[str, Any]]
+) -> list[GenerationAttempt]:
+    return [GenerationAttempt(task_id=task_id, **attempt) for attempt in attempts]
+
+
+def run_generation_wrapper(
+    task_id: int,
+    previous_code: str | None = None,
+    model_name: str = DEFAULT_MODEL,
+    candidates: int = 1,
+    previous_file: str | None = None,
+) -> None:
+    with Session(engine) as session:
+        task = session.get(GenerationTask, task_id)
+        if not task:
+            return
+
+        conversation_id = task.conversation_id
+
+        def update_progress(msg: str, percent: int) -> None:
+            # промежуточный прогресс идёт только в Redis, в БД — смена статуса
+            progress.publish(task_id, conversation_id, "processing", percent, msg)
+
+        try:
+            task.status = "processing"
+            session.add(task)
+            session.commit()
+            publish_task(task)
+
+            models = routing.cascade(model_name, task.prompt)
+            result = generate_and_run(
+                user_query=task.prompt,
+                task_id=task_id,
+                previous_code=previous_code,
+                on_progress=update_progress,
+                model_name=models[0],
+                candidates=candidates,
+                escalation=models[1:],
+                previous_file=previous_file,
+                requested_model=model_name,
+            )
+            routing.record(task.prompt, result.get("attempts", []))
+
+            if result["status"] == "success":
+                task.status = "completed"
+                task.status_message = "Данные успешно сгенерированы."
+                task.file_path = result["file"]
+                task.generated_code = result["code"]
+                task.preview_data = result.get("preview")
+                task.data_profile = result.get("dataset_profile")
+                task.file_size = result.get("file_size")
+                task.row_count = result.get("row_count")
+                task.ai_model = result.get("model", task.ai_model)
+                task.progress = 100
+            else:
+                task.status = "failed"
+                task.status_message = "Ошибка генерации"
+                task.error_log = result["message"]
+
+            session.add_all(attempt_rows(task_id, result.get("attempts", [])))
+            session.add(task)
+            session.commit()
+            publish_task(task)
+
+        except Exception as e:
+            session.rollback()
+            task = session.get(GenerationTask, task_id)
+            if task:
+                task.status = "failed"
+                task.status_message = "Ошибка генерации"
+                task.error_log = f"Critical Error: {str(e)}"
+                session.add(task)
+                session.commit()
+                publish_task(task)
+
+
+async def arun_generation_wrapper(
+    task_id: int,
+    previous_code: str | None = None,
+    model_name: str = DEFAULT_MODEL,
+    candidates: int = 1,
+    previous_file: str | None = None,
+) -> None:
+    """Асинхронный вариант run_generation_wrapper для agenerate_and_run.
+
+    Запросы к БД и Redis короткие и выполняются в пуле потоков,
+    чтобы не блокировать цикл.
+    """
+    with Session(engine) as session:
+        task = await asyncio.to_thread(session.get, GenerationTask, task_id)
+        if not task:
+            return
+
+        task_local: GenerationTask = task
+        conversation_id = task.conversation_id
+
+        def save(attempts: list[dict[str, Any]] | None = None, **fields: Any) -> None:
+            for name, value in fields.items():
+                setattr(task_local, name, value)
+            session.add_all(attempt_rows(task_id, attempts or []))
+            session.add(task_local)
+            session.commit()
+            publish_task(task_local)
+
+        async def update_progress(msg: str, percent: int) -> None:
+            await asyncio.to_thread(
+                progress.publish, task_id, conversation_id, "processing", percent, msg
+            )
+
+        try:
+            await asyncio.to_thread(save, status="processing")
+
+            models = await asyncio.to_thread(routing.cascade, model_name, task.prompt)
+            result = await agenerate_and_run(
+                user_query=task.prompt,
+                task_id=task_id,
+                previous_code=previous_code,
+                on_progress=update_progress,
+                model_name=models[0],
+                candidates=candidates,
+                escalation=models[1:],
+                previous_file=previous_file,
+                requested_model=model_name,
+            )
+            await asyncio.to_thread(
+                routing.record, task.prompt, result.get("attempts", [])
+            )
+
+            if result["status"] == "success":
+                await asyncio.to_thread(
+                    save,
+                    status="completed",
+                    status_message="Данные успешно сгенерированы.",
+                    file_path=result["file"],
+                    generated_code=result["code"],
+                    preview_data=result.get("preview"),
+                    data_profile=result.get("dataset_profile"),
+                    file_size=result.get("file_size"),
+                    row_count=result.get("row_count"),
+                    ai_model=result.get("model", task_local.ai_model),
+                    progress=100,
+                    attempts=result.get("attempts"),
+                )
+            else:
+                await asyncio.to_thread(
+                    save,
+                    status="failed",
+                    status_message="Ошибка генерации",
+                    error_log=result["message"],
+                    attempts=result.get("attempts"),
+                )
+
+        except Exception as e:
+            await asyncio.to_thread(session.rollback)
+            await asyncio.to_thread(
+                save,
+                status="failed",
+                status_message="Ошибка генерации",
+                error_log=f"Critical Error: {str(e)}",
+            )
+
+
+def mark_dead(task_ids: list[int]) -> None:
+    """Помечает задачи, исчерпавшие попытки доставки, как упавшие."""
+    with Session(engine) as session:
+        dead = []
+        for task_id in task_ids:
+            task = session.get(GenerationTask, task_id)
+            if task and task.status not in ("completed", "failed"):
+                task.status = "failed"
+                task.error_log = "Воркер аварийно завершился при обработке задачи."
+                session.add(task)
+                dead.append(task)
+        session.commit()
+        for task in dead:
+            publish_task(task)
+
+
+def is_task_finished(task_id: int) -> bool:
+    with Session(engine) as session:
+        task = session.get(GenerationTask, task_id)
+        return task is None or task.status in ("completed", "failed")
+
+
+def process_job(queue: TaskQueue, job: dict[str, Any]) -> None:
+    task_id = job["task_id"]
+    payload = job["payload"]
+
+    stop_heartbeat = threading.Event()
+
+    def heartbeat() -> None:
+        while not stop_heartbeat.wait(queue.visibility_timeout / 3):
+            queue.extend(task_id)
+
+    threading.Thread(target=heartbeat, daemon=True).start()
+    try:
+        if not is_task_finished(task_id):
+            run_generation_wrapper(
+                task_id,
+                payload.get("previous_code"),
+                payload.get("model_name", DEFAULT_MODEL),
+                payload.get("candidates", 1),
+                payload.get("previous_file"),
+            )
+    finally:
+        stop_heartbeat.set()
+    queue.ack(task_id)
+
+
+def worker_loop(stop: Any) -> None:
+    queue = TaskQueue(redis.from_url(REDIS_URL, decode_responses=True))
+    get_sandbox_backend().warm()
+
+    last_requeue = 0.0
+    while not stop.is_set():
+        if time.monotonic() - last_requeue > REQUEUE_INTERVAL:
+            requeued, dead = queue.requeue_expired()
+            if requeued:
+                print(f"Возвращено в очередь задач: {requeued}")
+            if dead:
+                mark_dead(dead)
+            last_requeue = time.monotonic()
+
+        job = queue.reserve()
+        if job is None:
+            stop.wait(WORKER_POLL_INTERVAL)
+            continue
+        process_job(queue, job)
+
+
+async def aprocess_job(queue: TaskQueue, job: dict[str, Any]) -> None:
+    task_id = job["task_id"]
+    payload = job["payload"]
+
+    async def heartbeat() -> None:
+        while True:
+            await asyncio.sleep(queue.visibility_timeout / 3)
+            await asyncio.to_thread(queue.extend, task_id)
+
+    beat = asyncio.create_task(heartbeat())
+    try:
+        if not await asyncio.to_thread(is_task_finished, task_id):
+            await arun_generation_wrapper(
+                task_id,
+                payload.get("previous_code"),
+                payload.get("model_name", DEFAULT_MODEL),
+                payload.get("candidates", 1),
+                payload.get("previous_file"),
+            )
+    finally:
+        beat.cancel()
+    await asyncio.to_thread(queue.ack, task_id)
+
+
+async def async_worker_loop(stop: Any, slots: int) -> None:
+    queue = TaskQueue(redis.from_url(REDIS_URL, decode_responses=True))
+    await asyncio.to_thread(get_sandbox_backend().warm)
+
+    semaphore = asyncio.Semaphore(slots)
+    running: set[asyncio.Task[None]] = set()
+
+    async def run(job: dict[str, Any]) -> None:
+        try:
+            await aprocess_job(queue, job)
+        finally:
+            semaphore.release()
+
+    last_requeue = 0.0
+    while not stop.is_set():
+        if time.monotonic() - last_requeue > REQUEUE_INTERVAL:
+            requeued, dead = await asyncio.to_thread(queue.requeue_expired)
+            if requeued:
+                print(f"Возвращено в очередь задач: {requeued}")
+            if dead:
+                await asyncio.to_thread(mark_dead, dead)
+            last_requeue = time.monotonic()
+
+        await semaphore.acquire()
+        job = await asyncio.to_thread(queue.reserve)
+        if job is None:
+            semaphore.release()
+            await asyncio.sleep(WORKER_POLL_INTERVAL)
+            continue
+        task = asyncio.create_task(run(job))
+        running.add(task)
+        task.add_done_callback(running.discard)
+
+    if running:
+        await asyncio.gather(*running, return_exceptions=True)
+
+
+def _child_main(stop: Any, slots: int) -> None:
+    # остановкой управляет родитель, текущие задачи дорабатывают до конца
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    if slots > 0:
+        asyncio.run(async_worker_loop(stop, slots))
+    else:
+        worker_loop(stop)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="AIrelav generation worker")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=int(os.getenv("WORKER_CONCURRENCY", 2)),
+        help="Количество процессов-воркеров",
+    )
+    parser.add_argument(
+        "--async-slots",
+        type=int,
+        default=int(os.getenv("WORKER_ASYNC_SLOTS", 0)),
+        help="Одновременных генераций на процесс (0 — синхронный режим)",
+    )
+    args = parser.parse_args()
+
+    stop = multiprocessing.Event()
+
+    def shutdown(signum: int, frame: Any) -> None:
+        print("Остановка воркеров после завершения текущих задач...")
+        stop.set()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    def spawn() -> multiprocessing.Process:
+        proc = multiprocessing.Process(
+            target=_child_main, args=(stop, args.async_slots)
+        )
+        proc.start()
+        return proc
+
+    processes = [spawn() for _ in range(args.concurrency)]
+    print(f"Запущено воркеров: {args.concurrency}")
+
+    # упавший процесс перезапускается, его задачу вернёт в очередь истёкшая аренда
+    while not stop.wait(1):
+        for i, proc in enumerate(processes):
+            if not proc.is_alive():
+                print(f"Воркер {proc.pid} завершился (код {proc.exitcode}), перезапуск")
+                processes[i] = spawn()
+
+    for proc in processes:
+        proc.join()
+
+
+if __name__ == "__main__":
+    main()